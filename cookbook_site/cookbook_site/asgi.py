@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cookbook_site.settings')
+os.environ.setdefault('RECIPES_SQLITE_WAL', '1')
+os.environ.setdefault('RECIPES_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
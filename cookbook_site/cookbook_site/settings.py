@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'recipes.middleware.StaticAssetMiddleware',
+    'recipes.middleware.PerformanceMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,7 +57,8 @@ ROOT_URLCONF = 'cookbook_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also reports render time to recipes.metrics.
+        'BACKEND': 'recipes.templating.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -69,6 +73,39 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'cookbook_site.wsgi.application'
 
+# Serve the read-only recipe views as native async views. asgi.py turns this
+# on; WSGI servers keep the sync implementations.
+RECIPES_ASYNC_VIEWS = os.environ.get('RECIPES_ASYNC_VIEWS', '0') == '1'
+
+# Log requests at least this slow (in milliseconds) with their slowest SQL
+# statements to the 'recipes.slow_requests' logger. None disables the log.
+RECIPES_SLOW_REQUEST_MS = None
+
+# Bearer token the Prometheus scraper sends for /metrics/, which answers
+# 404 while it is unset. The client address is not trusted: behind a local
+# reverse proxy every request comes from 127.0.0.1.
+RECIPES_METRICS_TOKEN = os.environ.get('RECIPES_METRICS_TOKEN') or None
+
+# How long shared caches (a CDN or reverse proxy) may serve a recipe page
+# without revalidating it. Browsers always revalidate.
+RECIPES_SHARED_CACHE_SECONDS = 60
+
+# Where workers share the memory-mapped ingredient knowledge base snapshots.
+# Keep it on a local disk, one directory per machine.
+RECIPES_SNAPSHOT_DIR = BASE_DIR / 'snapshots'
+
+# Put the database in WAL mode, so readers keep reading while a write
+# commits. The mode is stored in the database file and comes with -wal and
+# -shm files beside it, so only wsgi.py and asgi.py turn it on by default;
+# management commands leave the journal as they find it.
+RECIPES_SQLITE_WAL = os.environ.get('RECIPES_SQLITE_WAL', '0') == '1'
+
+# Compile templates and fill the page caches and indexes in a background
+# thread when each worker starts (see recipes.warmup). Set it for the web
+# server only; `manage.py warmup` runs the same steps in its own process
+# and reports their timings, without warming any worker.
+RECIPES_WARMUP_ON_START = os.environ.get('RECIPES_WARMUP_ON_START', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -77,6 +114,40 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests instead of reconnecting (and
+        # re-running the pragmas below) every time. Django advises against
+        # persistent connections under ASGI, where threads come and go.
+        'CONN_MAX_AGE': 0 if RECIPES_ASYNC_VIEWS else 300,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so writers wait
+            # on busy_timeout instead of failing when upgrading a read lock.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Applied to every new SQLite connection by recipes.db.configure_connection.
+RECIPES_SQLITE_PRAGMAS = {
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # In KiB when negative, so 64 MiB.
+    'busy_timeout': 5000,
+}
+if RECIPES_SQLITE_WAL:
+    # NORMAL only risks the last commits on power loss in WAL mode, not the file.
+    RECIPES_SQLITE_PRAGMAS = {'journal_mode': 'wal', 'synchronous': 'normal', **RECIPES_SQLITE_PRAGMAS}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The home page, counts and search caches only use the portable cache API, so
+# switching to 'django.core.cache.backends.filebased.FileBasedCache' (with a
+# LOCATION directory) shares them between worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cookbook-site',
     }
 }
 
@@ -116,6 +187,17 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# collectstatic fingerprints, minifies and precompresses into STATIC_ROOT,
+# which recipes.middleware.StaticAssetMiddleware serves.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'recipes.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -12,5 +12,6 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cookbook_site.settings')
+os.environ.setdefault('RECIPES_SQLITE_WAL', '1')
 
 application = get_wsgi_application()
@@ -1,10 +1,28 @@
 from django.contrib import admin
 
-from .models import Recipe
+from .models import IngredientInfo, Job, Recipe
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("title", "prep_time", "cook_time", "servings")
+    list_display = ("title", "prep_time", "cook_time", "servings", "view_count")
     prepopulated_fields = {"slug": ("title",)}
     search_fields = ("title", "subtitle", "short_description")
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.sync_ingredients()
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "attempts", "run_after", "created_at", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("task", "idempotency_key")
+    readonly_fields = ("lease", "last_error", "created_at", "finished_at")
+
+
+@admin.register(IngredientInfo)
+class IngredientInfoAdmin(admin.ModelAdmin):
+    list_display = ("name", "key", "updated_at")
+    search_fields = ("key", "name")
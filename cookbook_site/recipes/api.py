@@ -0,0 +1,147 @@
+"""Read-only JSON representation of recipes for ``/api/recipes/``.
+
+Rows are read with ``values()`` for just the columns the requested fields
+need and serialized straight from those dicts, so a response builds no
+model instances and renders no templates. Ingredients and directions come
+back as arrays of lines. Clients pick fields with ``?fields=a,b``; the list
+endpoint pages with the same opaque cursors as the HTML listings.
+"""
+
+from django.http import JsonResponse
+from django.templatetags.static import static
+from django.urls import reverse
+
+from .models import Recipe
+from .pagination import ORDERINGS, page_size
+
+# Part of every ETag, so a change to the representation invalidates copies.
+API_VERSION = 1
+
+DEFAULT_ORDERING = "newest"
+
+# field -> the columns it is built from
+COLUMNS = {
+    "id": ("id",),
+    "slug": ("slug",),
+    "title": ("title",),
+    "subtitle": ("subtitle",),
+    "short_description": ("short_description",),
+    "prep_time": ("prep_time",),
+    "cook_time": ("cook_time",),
+    "total_time": ("prep_time", "cook_time"),
+    "servings": ("servings",),
+    "ingredients": ("ingredients",),
+    "directions": ("directions",),
+    "image": ("hero_image", "uploaded_image", "image_variants"),
+    "url": ("slug",),
+    "created_at": ("created_at",),
+    "updated_at": ("updated_at",),
+}
+FIELDS = tuple(COLUMNS)
+LIST_FIELDS = (
+    "id", "slug", "title", "subtitle", "short_description", "prep_time", "cook_time", "total_time",
+    "servings", "image", "url",
+)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def error_response(message: str, status: int) -> JsonResponse:
+    return JsonResponse({"error": message}, status=status)
+
+
+def parse_fields(value, default=FIELDS) -> tuple:
+    """The field names asked for in ``value``, or ``default`` when there are none."""
+    names = [name.strip() for name in (value or "").split(",") if name.strip()]
+    if not names:
+        return default
+    unknown = [name for name in names if name not in COLUMNS]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(FIELDS)}.")
+    return tuple(dict.fromkeys(names))
+
+
+def list_params(request) -> tuple:
+    """``(fields, ordering, cursor, size)`` for the list endpoint."""
+    ordering = request.GET.get("sort", DEFAULT_ORDERING)
+    if ordering not in ORDERINGS:
+        raise BadRequest(f"Unknown sort: {ordering}. Choose from: {', '.join(ORDERINGS)}.")
+    fields = parse_fields(request.GET.get("fields"), LIST_FIELDS)
+    return fields, ordering, request.GET.get("cursor") or None, page_size(request.GET.get("per_page"))
+
+
+def columns(fields, *extra) -> list:
+    """The columns to select for ``fields``, plus ``extra`` ones."""
+    return list(dict.fromkeys([*(column for field in fields for column in COLUMNS[field]), *extra]))
+
+
+def list_queryset(fields, ordering: str):
+    # The cursor is built from the sort columns, so they are always read.
+    sort_columns = [name.lstrip("-") for name in ORDERINGS[ordering]]
+    return Recipe.objects.values(*columns(fields, *sort_columns))
+
+
+def detail_queryset(slug: str, fields):
+    return Recipe.objects.filter(slug=slug).values(*columns(fields, "id", "updated_at"))
+
+
+def _lines(text: str) -> list:
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def _image(row: dict, request) -> dict | None:
+    upload, variants = row["uploaded_image"], row["image_variants"] or {}
+    if upload and variants.get("source") == upload and variants.get("sizes"):
+        storage = Recipe._meta.get_field("uploaded_image").storage
+        sizes = {}
+        for entry in variants["sizes"].values():
+            sizes[entry["width"]] = {
+                "width": entry["width"],
+                "url": request.build_absolute_uri(storage.url(entry["src"])),
+                "webp_url": request.build_absolute_uri(storage.url(entry["webp"])),
+            }
+        ordered = [sizes[width] for width in sorted(sizes)]
+        return {"url": ordered[-1]["url"], "sizes": ordered}
+    if upload:
+        url = Recipe._meta.get_field("uploaded_image").storage.url(upload)
+    elif row["hero_image"]:
+        url = static(row["hero_image"])
+    else:
+        return None
+    return {"url": request.build_absolute_uri(url), "sizes": []}
+
+
+_SERIALIZERS = {
+    "total_time": lambda row, request: row["prep_time"] + row["cook_time"],
+    "ingredients": lambda row, request: _lines(row["ingredients"]),
+    "directions": lambda row, request: _lines(row["directions"]),
+    "image": _image,
+    "url": lambda row, request: request.build_absolute_uri(reverse("recipes:detail", args=[row["slug"]])),
+}
+
+
+def serialize(rows, fields, request) -> list:
+    """One dict per row holding ``fields``, in that order."""
+    plain = {field: COLUMNS[field][0] for field in fields if field not in _SERIALIZERS}
+    computed = {field: _SERIALIZERS[field] for field in fields if field in _SERIALIZERS}
+    results = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            if field in plain:
+                item[field] = row[plain[field]]
+            else:
+                item[field] = computed[field](row, request)
+        results.append(item)
+    return results
+
+
+def page_payload(page, fields, request) -> dict:
+    next_url = None
+    if page.next_cursor:
+        query = request.GET.copy()
+        query["cursor"] = page.next_cursor
+        next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+    return {"results": serialize(page.items, fields, request), "next": next_url}
@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from . import db, metrics, signals
+        from .models import IngredientInfo, Recipe
+
+        connection_created.connect(db.configure_connection)
+        connection_created.connect(metrics.install_query_wrapper)
+        post_migrate.connect(signals.restore_search_triggers, sender=self)
+        post_save.connect(signals.recipe_saved, sender=Recipe)
+        pre_delete.connect(signals.recipe_deleting, sender=Recipe)
+        post_delete.connect(signals.recipe_deleted, sender=Recipe)
+        post_save.connect(signals.knowledge_changed, sender=IngredientInfo)
+        post_delete.connect(signals.knowledge_changed, sender=IngredientInfo)
+        if settings.RECIPES_WARMUP_ON_START:
+            from . import warmup
+
+            warmup.start()
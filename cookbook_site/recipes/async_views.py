@@ -0,0 +1,176 @@
+"""Native async versions of the read-only recipe views.
+
+Served under ASGI (see ``RECIPES_ASYNC_VIEWS``) so requests run on the event
+loop instead of each taking a thread-pool hop; the ORM work goes through
+Django's async query API. ``recipes.views`` keeps the sync implementations
+that WSGI deployments use.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import aprefetch_related_objects
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_http_methods
+
+from . import api, conditional, detail_cache, home_cache, popularity, shopping, suggest, voice
+from .models import ChangeStamp, Recipe, RelatedRecipe
+from .pagination import InvalidCursor, apaginate, page_size
+from .views import (
+    batch_response,
+    detail_validators,
+    home_validators,
+    ndjson_line,
+    parse_shopping_request,
+    parse_voice_request,
+    recipe_list_validators,
+    recipe_validators,
+    search_context,
+    search_validators,
+    suggest_limit,
+    suggest_response,
+)
+
+
+async def home(request):
+    stamp = await ChangeStamp.acurrent(ChangeStamp.RECIPES)
+    trending = await ChangeStamp.acurrent(ChangeStamp.TRENDING)
+    page_validators = home_validators(stamp, trending)
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    cursor = request.GET.get("cursor")
+    size = page_size(request.GET.get("per_page"), default=home_cache.LATEST_PAGE_SIZE)
+    if cursor or size != home_cache.LATEST_PAGE_SIZE:
+        sections = await home_cache.aget_sections(("hero", "stats", "trending"), trending.version, stamp.version)
+        try:
+            sections["latest"] = home_cache.render_latest(await home_cache.alatest_page(cursor, size))
+        except InvalidCursor:
+            return redirect("recipes:home")
+    else:
+        sections = await home_cache.aget_sections(trending_version=trending.version, recipes_version=stamp.version)
+    response = render(
+        request,
+        "recipes/home.html",
+        {
+            "sections": sections,
+        },
+    )
+    return conditional.cacheable(response, page_validators)
+
+
+async def recipe_detail(request, slug: str):
+    recipe = await aget_object_or_404(Recipe, slug=slug)
+    popularity.record_view(recipe.pk)
+    page_validators = detail_validators(recipe)
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+
+    async def render_page():
+        await aprefetch_related_objects([recipe], "ingredient_items")
+        related = [item async for item in RelatedRecipe.objects.for_recipe(recipe)]
+        return render_to_string(
+            "recipes/recipe_detail.html",
+            {
+                "recipe": recipe,
+                "related": related,
+            },
+            request,
+        )
+
+    page = await detail_cache.aget_page(slug, page_validators, render_page)
+    return conditional.cacheable(HttpResponse(page["html"]), page["validators"])
+
+
+async def search_recipes(request):
+    page_validators = search_validators(
+        await ChangeStamp.acurrent(ChangeStamp.RECIPES), await ChangeStamp.acurrent(ChangeStamp.KNOWLEDGE)
+    )
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    # FTS5 queries are raw SQL with no async API, so the search itself runs
+    # in one sync hop rather than one per query.
+    context = await sync_to_async(search_context)(request)
+    response = render(request, "recipes/search_results.html", context)
+    return conditional.cacheable(response, page_validators)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def voice_assistant(request):
+    """Async variant of ``views.voice_assistant`` with the same contract."""
+    try:
+        query, queries, stream = parse_voice_request(request)
+    except ValueError as exc:
+        return JsonResponse(voice.error(str(exc)), status=400)
+
+    if queries is None:
+        return JsonResponse(await voice.aanswer(query))
+
+    if stream:
+        async def lines():
+            async for index, answer in voice.aanswer_many(queries):
+                yield ndjson_line(index, answer)
+
+        return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+    results = [None] * len(queries)
+    async for index, answer in voice.aanswer_many(queries):
+        results[index] = answer
+    return batch_response(results)
+
+
+@csrf_exempt
+@gzip_page
+@require_http_methods(["POST"])
+async def shopping_list(request):
+    try:
+        plan = parse_shopping_request(request)
+    except shopping.InvalidPlan as exc:
+        return api.error_response(str(exc), 400)
+    return JsonResponse(await shopping.ashopping_list(plan))
+
+
+@require_http_methods(["GET"])
+async def suggest_view(request):
+    query = request.GET.get("q", "")
+    return suggest_response(query, await suggest.asuggest(query, suggest_limit(request.GET.get("limit"))))
+
+
+@gzip_page
+@require_http_methods(["GET"])
+async def recipe_list_api(request):
+    try:
+        fields, ordering, cursor, size = api.list_params(request)
+    except api.BadRequest as exc:
+        return api.error_response(str(exc), 400)
+    page_validators = recipe_list_validators(request, await ChangeStamp.acurrent(ChangeStamp.RECIPES))
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    try:
+        page = await apaginate(api.list_queryset(fields, ordering), ordering, cursor, size)
+    except InvalidCursor:
+        return api.error_response("Invalid cursor.", 400)
+    return conditional.cacheable(JsonResponse(api.page_payload(page, fields, request)), page_validators)
+
+
+@gzip_page
+@require_http_methods(["GET"])
+async def recipe_api(request, slug: str):
+    try:
+        fields = api.parse_fields(request.GET.get("fields"))
+    except api.BadRequest as exc:
+        return api.error_response(str(exc), 400)
+    row = await api.detail_queryset(slug, fields).afirst()
+    if row is None:
+        return api.error_response("Recipe not found.", 404)
+    page_validators = recipe_validators(row, fields)
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    return conditional.cacheable(JsonResponse(api.serialize([row], fields, request)[0]), page_validators)
@@ -0,0 +1,60 @@
+"""Conditional GET support for the recipe pages.
+
+Each page's validators are computed from data that costs at most one small
+query: ``ChangeStamp`` for the pages that list recipes, ``updated_at`` for
+a single recipe. A request whose ``If-None-Match`` or ``If-Modified-Since``
+still matches gets a 304 before anything is rendered. The ``ETag`` also
+covers this app's templates and static files, so a deploy that changes the
+markup invalidates copies that browsers and shared caches hold.
+"""
+
+import functools
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+APP_DIR = Path(__file__).resolve().parent
+
+
+@functools.cache
+def fingerprint() -> str:
+    """A digest of the templates and static files that pages are built from."""
+    digest = hashlib.md5(usedforsecurity=False)
+    for folder in ("templates", "static"):
+        for path in sorted((APP_DIR / folder).rglob("*")):
+            if path.is_file():
+                stat = path.stat()
+                digest.update(f"{path.relative_to(APP_DIR)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def validators(last_modified, *parts) -> tuple:
+    """The ``(etag, last_modified)`` pair for a page that depends on ``parts``."""
+    key = ":".join(str(part) for part in (fingerprint(), last_modified.isoformat(), *parts))
+    return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()), last_modified
+
+
+def not_modified(request, page_validators):
+    """A 304 response when the client's copy is current, otherwise ``None``."""
+    etag, last_modified = page_validators
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if response is not None:
+        cacheable(response, page_validators)
+    return response
+
+
+def cacheable(response, page_validators):
+    """Add the validators and caching headers to ``response``."""
+    etag, last_modified = page_validators
+    if response.status_code in (200, 304):
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+        # Browsers revalidate every time, which is cheap; shared caches may
+        # serve a copy for a little while without asking.
+        patch_cache_control(
+            response, public=True, max_age=0, s_maxage=settings.RECIPES_SHARED_CACHE_SECONDS
+        )
+    return response
@@ -0,0 +1,72 @@
+"""SQLite connection setup and write retries.
+
+``configure_connection`` runs for every new connection and applies the
+pragmas in ``settings.RECIPES_SQLITE_PRAGMAS``. With the WAL journal the
+servers turn on (``RECIPES_SQLITE_WAL``), readers keep reading while a
+write commits; writers still take turns, so ``retry_on_locked`` gives short
+write transactions a few more chances when the database stays locked past
+``busy_timeout``.
+"""
+
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+WRITE_ATTEMPTS = 4
+RETRY_DELAY = 0.05
+
+
+def configure_connection(sender, connection, **kwargs):
+    """``connection_created`` receiver applying the configured pragmas."""
+    if connection.vendor != "sqlite":
+        return
+    # On the raw connection, so setup stays out of query logs and metrics.
+    for name, value in settings.RECIPES_SQLITE_PRAGMAS.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def pragmas(using: str = DEFAULT_DB_ALIAS) -> dict:
+    """The current values of the configured pragmas, for diagnostics."""
+    with connections[using].cursor() as cursor:
+        values = {}
+        for name in settings.RECIPES_SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+def is_locked_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+def retry_on_locked(func=None, *, attempts: int = WRITE_ATTEMPTS, delay: float = RETRY_DELAY, using: str = DEFAULT_DB_ALIAS):
+    """Retry ``func`` when SQLite reports the database as locked.
+
+    ``func`` should be one complete write transaction. Inside an outer
+    ``atomic()`` block a retry could not undo the failed statement, so
+    the error is raised straight away there.
+    """
+    if func is None:
+        return functools.partial(retry_on_locked, attempts=attempts, delay=delay, using=using)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if (
+                    attempt == attempts
+                    or not is_locked_error(exc)
+                    or connections[using].in_atomic_block
+                ):
+                    raise
+            # Jittered exponential backoff so competing writers spread out.
+            time.sleep(delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    return wrapper
@@ -0,0 +1,105 @@
+"""Rendered-page cache for the recipe detail view.
+
+Each entry holds a slug's HTML together with the validators it was rendered
+for. An entry is served while its ``ETag`` still matches the recipe and it
+is younger than ``FRESH_TIMEOUT``; otherwise one worker, the one that wins
+a ``cache.add`` lock, renders it again. While it does, the others keep
+serving the old copy, or wait up to ``LOCK_WAIT`` for the first copy when
+there is none yet, so a popular recipe is never rendered by every worker
+at once.
+
+Matching on the ``ETag`` rather than relying on signals alone keeps each
+process's local-memory cache correct when another process saves a recipe.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+FRESH_TIMEOUT = 10 * 60
+# How long a copy stays around to be served while a new one is rendered.
+STALE_TIMEOUT = 24 * 60 * 60
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+POLL_INTERVAL = 0.02
+
+_KEY_PREFIX = "recipes:detail:"
+
+
+def _key(slug: str) -> str:
+    return f"{_KEY_PREFIX}{slug}"
+
+
+def _lock_key(slug: str) -> str:
+    return f"{_KEY_PREFIX}{slug}:lock"
+
+
+def _attempt(slug: str, etag: str) -> tuple:
+    """``(entry, owner)``: a usable entry, and whether we hold the render lock."""
+    entry = cache.get(_key(slug))
+    if entry is not None and entry["validators"][0] == etag and entry["fresh_until"] > time.time():
+        return entry, False
+    if cache.add(_lock_key(slug), True, LOCK_TIMEOUT):
+        return entry, True
+    # Someone else is rendering; a stale copy will do meanwhile.
+    return entry, False
+
+
+def lookup(slug: str, etag: str) -> tuple:
+    entry, owner = _attempt(slug, etag)
+    deadline = time.monotonic() + LOCK_WAIT
+    while entry is None and not owner and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry, owner = _attempt(slug, etag)
+    return entry, owner
+
+
+async def alookup(slug: str, etag: str) -> tuple:
+    attempt = sync_to_async(_attempt)
+    entry, owner = await attempt(slug, etag)
+    deadline = time.monotonic() + LOCK_WAIT
+    while entry is None and not owner and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        entry, owner = await attempt(slug, etag)
+    return entry, owner
+
+
+def _store(slug: str, validators: tuple, html: str) -> dict:
+    entry = {"validators": validators, "html": html, "fresh_until": time.time() + FRESH_TIMEOUT}
+    cache.set(_key(slug), entry, STALE_TIMEOUT)
+    return entry
+
+
+def get_page(slug: str, validators: tuple, render) -> dict:
+    """The cached entry for ``slug``, calling ``render()`` to refresh it if needed.
+
+    The entry's ``validators`` are those of the HTML it holds, which are
+    older than ``validators`` when a stale copy is served.
+    """
+    entry, owner = lookup(slug, validators[0])
+    if entry is not None and not owner:
+        return entry
+    try:
+        return _store(slug, validators, render())
+    finally:
+        if owner:
+            cache.delete(_lock_key(slug))
+
+
+async def aget_page(slug: str, validators: tuple, render) -> dict:
+    """Async variant of ``get_page``; ``render`` is a coroutine function."""
+    entry, owner = await alookup(slug, validators[0])
+    if entry is not None and not owner:
+        return entry
+    try:
+        html = await render()
+        return await sync_to_async(_store)(slug, validators, html)
+    finally:
+        if owner:
+            await sync_to_async(cache.delete)(_lock_key(slug))
+
+
+def invalidate(*slugs: str) -> None:
+    cache.delete_many([_key(slug) for slug in slugs])
@@ -1,6 +1,6 @@
 from django import forms
 
-from .models import Recipe
+from .models import DEFAULT_HERO_IMAGE, Recipe
 
 
 class RecipeForm(forms.ModelForm):
@@ -37,11 +37,12 @@ class RecipeForm(forms.ModelForm):
         }
 
     def save(self, commit=True):
-        recipe = super().save(commit=False)
-        if not recipe.hero_image:
-            recipe.hero_image = "recipes/images/hearty_veggie_pasta.svg"
+        if not self.instance.hero_image:
+            self.instance.hero_image = DEFAULT_HERO_IMAGE
+        recipe = super().save(commit=commit)
         if commit:
-            recipe.save()
+            # With commit=False the caller saves the recipe, then syncs it.
+            recipe.sync_ingredients()
         return recipe
 
 
@@ -0,0 +1,198 @@
+"""Per-section fragment cache for the home page.
+
+Each home page section is rendered and cached on its own together with the
+ids of the recipes it shows. Sections are keyed on the recipes
+``ChangeStamp`` version, so a change made by any process, the job worker
+included, moves every process on to new keys. The process that makes the
+change copies the sections it does not touch over to the new version, so
+with a cache shared between processes only the sections that show (or
+would now show) the recipe are rendered again. The trending section is also
+tagged with the trending ``ChangeStamp`` version it was rendered at and is
+rendered again once view counts have reordered the ranking. Only the cache
+API is used, which keeps this working with the local-memory and file-based
+backends.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import ChangeStamp, Recipe
+from .pagination import apaginate, cached_count, paginate
+
+FEATURED_SIZE = 3
+TRENDING_SIZE = 8
+LATEST_PAGE_SIZE = 4
+
+SECTION_TIMEOUT = 60 * 60
+SECTIONS = ("hero", "stats", "trending", "latest")
+
+_KEY_PREFIX = "recipes:home:"
+
+
+def _key(name: str, version: int) -> str:
+    return f"{_KEY_PREFIX}{name}:{version}"
+
+
+# Sections that list the first N recipes in title order, with their N.
+_TITLE_RANGES = {"hero": FEATURED_SIZE}
+
+
+def _section_data(name: str, version: int):
+    if name == "stats":
+        return cached_count("all", Recipe.objects.count, version)
+    if name == "latest":
+        return latest_page()
+    if name == "trending":
+        return list(Recipe.objects.trending()[:TRENDING_SIZE])
+    return list(Recipe.objects.all()[: _TITLE_RANGES[name]])
+
+
+async def _asection_data(name: str, version: int):
+    if name == "stats":
+        return await sync_to_async(cached_count)("all", Recipe.objects.count, version)
+    if name == "latest":
+        return await alatest_page()
+    if name == "trending":
+        return [recipe async for recipe in Recipe.objects.trending()[:TRENDING_SIZE]]
+    return [recipe async for recipe in Recipe.objects.all()[: _TITLE_RANGES[name]]]
+
+
+def _render_section(name: str, data) -> dict:
+    """Render a section and record which recipes it shows."""
+    recipes = []
+    if name == "stats":
+        html = render_to_string(
+            "recipes/includes/home_stats.html",
+            {
+                "featured_count": min(data, FEATURED_SIZE),
+                "recipe_count": data,
+                "latest_count": min(data, LATEST_PAGE_SIZE),
+            },
+        )
+    elif name == "latest":
+        html = render_to_string("recipes/includes/home_latest.html", {"latest_recipes": data})
+        recipes = data.items
+    elif name == "hero":
+        html = render_to_string(
+            "recipes/includes/home_hero.html", {"hero_recipe": data[0] if data else None}
+        )
+        recipes = data
+    else:
+        html = render_to_string("recipes/includes/home_trending.html", {"trending": data})
+        recipes = data
+    return {
+        "html": html,
+        "ids": [recipe.pk for recipe in recipes],
+        "last_title": recipes[-1].title if recipes else None,
+    }
+
+
+def latest_page(cursor: str | None = None, size: int = LATEST_PAGE_SIZE):
+    return paginate(Recipe.objects.all(), "newest", cursor, size)
+
+
+async def alatest_page(cursor: str | None = None, size: int = LATEST_PAGE_SIZE):
+    return await apaginate(Recipe.objects.all(), "newest", cursor, size)
+
+
+def render_latest(page) -> str:
+    return mark_safe(render_to_string("recipes/includes/home_latest.html", {"latest_recipes": page}))
+
+
+def _usable(cached: dict, keys: dict, trending_version) -> dict:
+    """``cached`` less a trending entry rendered for another ranking."""
+    key = keys.get("trending")
+    if key in cached and cached[key].get("version") != trending_version:
+        return {other: entry for other, entry in cached.items() if other != key}
+    return cached
+
+
+def get_sections(names=SECTIONS, trending_version: int | None = None, recipes_version: int | None = None) -> dict:
+    """Return rendered HTML for each named section, filling cache misses.
+
+    ``trending_version`` and ``recipes_version`` are the trending and recipes
+    ``ChangeStamp`` versions, when the caller has read them already.
+    """
+    if recipes_version is None:
+        recipes_version = ChangeStamp.current(ChangeStamp.RECIPES).version
+    keys = {name: _key(name, recipes_version) for name in names}
+    if "trending" in keys and trending_version is None:
+        trending_version = ChangeStamp.current(ChangeStamp.TRENDING).version
+    cached = _usable(cache.get_many(keys.values()), keys, trending_version)
+    fresh = {
+        key: {**_render_section(name, _section_data(name, recipes_version)), "version": trending_version}
+        for name, key in keys.items()
+        if key not in cached
+    }
+    if fresh:
+        cache.set_many(fresh, SECTION_TIMEOUT)
+    return {name: mark_safe({**cached, **fresh}[key]["html"]) for name, key in keys.items()}
+
+
+async def aget_sections(
+    names=SECTIONS, trending_version: int | None = None, recipes_version: int | None = None
+) -> dict:
+    """Async variant of ``get_sections``; misses are filled via the async ORM."""
+    if recipes_version is None:
+        recipes_version = (await ChangeStamp.acurrent(ChangeStamp.RECIPES)).version
+    keys = {name: _key(name, recipes_version) for name in names}
+    if "trending" in keys and trending_version is None:
+        trending_version = (await ChangeStamp.acurrent(ChangeStamp.TRENDING)).version
+    # One hop for the whole lookup; BaseCache.aget_many hops once per key.
+    cached = _usable(await sync_to_async(cache.get_many)(keys.values()), keys, trending_version)
+    fresh = {
+        key: {**_render_section(name, await _asection_data(name, recipes_version)), "version": trending_version}
+        for name, key in keys.items()
+        if key not in cached
+    }
+    if fresh:
+        await sync_to_async(cache.set_many)(fresh, SECTION_TIMEOUT)
+    return {name: mark_safe({**cached, **fresh}[key]["html"]) for name, key in keys.items()}
+
+
+def _enters_title_range(entry: dict, size: int, title: str) -> bool:
+    if len(entry["ids"]) < size or entry["last_title"] is None:
+        return True
+    return title <= entry["last_title"]
+
+
+def affected_sections(entries: dict, recipe, created: bool = False, deleted: bool = False) -> list:
+    """Work out which of the cached section ``entries`` a saved or deleted recipe touches."""
+    affected = []
+    for name, entry in entries.items():
+        if recipe.pk in entry["ids"]:
+            affected.append(name)
+        elif name == "stats":
+            if created or deleted:
+                affected.append(name)
+        elif name == "latest":
+            if created:
+                affected.append(name)
+        elif name == "trending":
+            # A new recipe has no views and ranks last.
+            if created and len(entry["ids"]) < TRENDING_SIZE:
+                affected.append(name)
+        elif name in _TITLE_RANGES and not deleted:
+            if _enters_title_range(entry, _TITLE_RANGES[name], recipe.title):
+                affected.append(name)
+    return affected
+
+
+def invalidate(recipe, version: int, created: bool = False, deleted: bool = False) -> list:
+    """Carry the sections ``recipe``'s change leaves alone over to ``version``.
+
+    ``version`` is the recipes ``ChangeStamp`` version the change bumped to,
+    so the sections cached at the one before show everything else as it is.
+    Returns the names of the cached sections the change touches.
+    """
+    keys = {_key(name, version - 1): name for name in SECTIONS}
+    entries = {keys[key]: entry for key, entry in cache.get_many(keys).items()}
+    names = affected_sections(entries, recipe, created=created, deleted=deleted)
+    kept = {_key(name, version): entry for name, entry in entries.items() if name not in names}
+    if kept:
+        cache.set_many(kept, SECTION_TIMEOUT)
+    # A rolled-back change hands its version out again; drop what it left.
+    cache.delete_many([_key(name, version) for name in SECTIONS if _key(name, version) not in kept])
+    return names
@@ -0,0 +1,122 @@
+"""Resized derivatives of uploaded recipe photos.
+
+Each upload is decoded once and re-encoded at a few display widths, in its
+own format and as WebP, next to the original file. The names and widths are
+recorded on ``Recipe.image_variants`` so templates can build ``srcset``
+attributes without touching storage.
+"""
+
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ChangeStamp
+
+# Display widths in CSS pixels' worth of image, smallest first.
+WIDTHS = {
+    "thumb": 320,
+    "card": 640,
+    "hero": 1280,
+}
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def derivative_name(name: str, label: str, extension: str) -> str:
+    """``recipes/uploads/pie.jpg`` -> ``recipes/uploads/pie.card.webp``."""
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.stem}.{label}.{extension}"))
+
+
+def _encode(image, extension: str) -> bytes:
+    buffer = BytesIO()
+    if extension == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif extension == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate(field_file) -> dict:
+    """Write the derivatives of ``field_file`` and describe them.
+
+    Widths wider than the original are clamped to it rather than upscaled,
+    so a small upload yields fewer (but never blurrier) sizes.
+    """
+    storage = field_file.storage
+    with field_file.open("rb") as handle:
+        original = Image.open(handle)
+        original.load()
+    image = ImageOps.exif_transpose(original)
+    has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+    extension = "png" if has_alpha else "jpg"
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    sizes = {}
+    done = {}
+    for label, width in WIDTHS.items():
+        width = min(width, image.width)
+        if width in done:
+            sizes[label] = done[width]
+            continue
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        entry = {"width": width}
+        for key, ext in (("src", extension), ("webp", "webp")):
+            name = derivative_name(field_file.name, label, ext)
+            if storage.exists(name):
+                storage.delete(name)
+            entry[key] = storage.save(name, ContentFile(_encode(resized, ext)))
+        sizes[label] = done[width] = entry
+    return {"source": field_file.name, "width": image.width, "sizes": sizes}
+
+
+def delete(variants: dict, storage) -> None:
+    """Remove the files listed in ``variants``."""
+    names = set()
+    for entry in variants.get("sizes", {}).values():
+        names.update((entry["src"], entry["webp"]))
+    for name in names:
+        storage.delete(name)
+
+
+def is_current(recipe) -> bool:
+    """Whether the recorded derivatives belong to the current upload."""
+    if not recipe.uploaded_image:
+        return not recipe.image_variants
+    return recipe.image_variants.get("source") == recipe.uploaded_image.name
+
+
+def refresh(recipe, force: bool = False) -> bool:
+    """Regenerate ``recipe``'s derivatives if its upload changed.
+
+    The new description is written with an ``update()`` so no further save
+    signals fire. Returns whether anything was regenerated.
+    """
+    if is_current(recipe) and not force:
+        return False
+    storage = recipe._meta.get_field("uploaded_image").storage
+    previous = recipe.image_variants
+    variants = generate(recipe.uploaded_image) if recipe.uploaded_image else {}
+    if previous and previous.get("source") != variants.get("source"):
+        delete(previous, storage)
+    # The page markup changes with the variants, so it needs new validators.
+    recipe.updated_at = timezone.now()
+    type(recipe).objects.filter(pk=recipe.pk).update(image_variants=variants, updated_at=recipe.updated_at)
+    recipe.image_variants = variants
+    ChangeStamp.bump(ChangeStamp.RECIPES)
+    return True
+
+
+def srcset(variants: dict, key: str, storage) -> str:
+    seen = {}
+    for entry in variants.get("sizes", {}).values():
+        seen[entry["width"]] = storage.url(entry[key])
+    return ", ".join(f"{url} {width}w" for width, url in sorted(seen.items()))
@@ -0,0 +1,133 @@
+"""Per-process in-memory indexes over the recipe table.
+
+An index class derives from ``StampedIndex`` and knows how to ``build``
+itself from the database and how to apply one saved or deleted recipe. A
+``ProcessIndex`` holds this process's copy: it builds it on first use,
+forwards the process's own recipe changes to it, and at most every
+``CHECK_INTERVAL`` compares the recipes ``ChangeStamp`` with the version
+the copy reflects. When the stamp moved for changes the copy was not told
+about (another worker, an import), a background thread builds a
+replacement while the current copy keeps answering.
+"""
+
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+from .models import ChangeStamp
+
+CHECK_INTERVAL = 1.0
+# Rebuild at most this often just to drop what incremental updates leave behind.
+REBUILD_INTERVAL = 15 * 60
+
+_holders = []
+
+
+class StampedIndex:
+    """Base for indexes that track the ``ChangeStamp`` version they reflect."""
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.built_version = version
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls) -> "StampedIndex":
+        raise NotImplementedError
+
+    def apply_saved(self, recipe) -> None:
+        raise NotImplementedError
+
+    def apply_deleted(self, recipe) -> None:
+        raise NotImplementedError
+
+    def recipe_saved(self, recipe, version: int | None = None) -> None:
+        with self._lock:
+            self.apply_saved(recipe)
+            self._advance(version)
+
+    def recipe_deleted(self, recipe, version: int | None = None) -> None:
+        with self._lock:
+            self.apply_deleted(recipe)
+            self._advance(version)
+
+    def _advance(self, version: int | None) -> None:
+        # Only when ours is the one change since the version we reflect.
+        if version is not None and version == self.version + 1:
+            self.version = version
+
+    def stale(self, version: int) -> bool:
+        if version != self.version:
+            return True
+        return version != self.built_version and time.monotonic() - self.built_at > REBUILD_INTERVAL
+
+
+class ProcessIndex:
+    def __init__(self, name: str, index_class):
+        self.name = name
+        self.index_class = index_class
+        self.current = None
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Event()
+        self._checked_at = 0.0
+        _holders.append(self)
+
+    def _build(self):
+        if self.current is None:
+            with self._lock:
+                if self.current is None:
+                    self.current = self.index_class.build()
+        return self.current
+
+    def _rebuild(self) -> None:
+        try:
+            self.current = self.index_class.build()
+        finally:
+            connection.close()
+            self._rebuilding.clear()
+
+    def _due(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        return True
+
+    def _refresh(self, version: int) -> None:
+        if self.current.stale(version) and not self._rebuilding.is_set():
+            self._rebuilding.set()
+            threading.Thread(target=self._rebuild, name=f"{self.name}-index", daemon=True).start()
+
+    def get(self):
+        index = self._build()
+        if self._due():
+            self._refresh(ChangeStamp.current(ChangeStamp.RECIPES).version)
+        return index
+
+    async def aget(self):
+        index = self.current or await sync_to_async(self._build)()
+        if self._due():
+            self._refresh((await ChangeStamp.acurrent(ChangeStamp.RECIPES)).version)
+        return index
+
+
+def recipe_saved(recipe, version: int) -> None:
+    for holder in _holders:
+        if holder.current is not None:
+            holder.current.recipe_saved(recipe, version)
+
+
+def recipe_deleted(recipe, version: int) -> None:
+    for holder in _holders:
+        if holder.current is not None:
+            holder.current.recipe_deleted(recipe, version)
+
+
+def warm() -> list:
+    """Build every process index that is not built yet; returns their names."""
+    for holder in _holders:
+        holder.get()
+    return [holder.name for holder in _holders]
@@ -0,0 +1,178 @@
+"""A small database-backed job queue.
+
+Work that should not hold up a request is recorded as a ``Job`` row in the
+same transaction as the change that caused it, and ``manage.py run_jobs``
+drains the table with a pool of worker processes. Claiming a job leases it
+for a visibility timeout; a job whose worker dies becomes claimable again
+once the lease runs out, so tasks must be safe to run more than once.
+Finished jobs are kept for ``KEEP_DONE`` and then deleted by ``prune``.
+"""
+
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .db import retry_on_locked
+from .models import Job
+
+VISIBILITY_TIMEOUT = 5 * 60
+RETRY_DELAY = 30
+# Seconds a done job is kept, for the admin, before ``prune`` deletes it.
+KEEP_DONE = 24 * 60 * 60
+PRUNE_BATCH = 1000
+
+_TASKS = {}
+
+
+def task(name: str):
+    """Register a function as the job task ``name``."""
+
+    def register(func):
+        _TASKS[name] = func
+        return func
+
+    return register
+
+
+def get_task(name: str):
+    try:
+        return _TASKS[name]
+    except KeyError:
+        raise LookupError(f"No job task named '{name}'.") from None
+
+
+def enqueue(
+    name: str,
+    payload: dict | None = None,
+    key: str | None = None,
+    max_attempts: int = 3,
+    delay: float = 0,
+    pending_only: bool = False,
+) -> Job:
+    """Queue ``name`` to run with ``payload`` as keyword arguments.
+
+    A job with the same idempotency ``key`` is only ever queued once; later
+    calls return the existing job. With ``pending_only`` the key only holds
+    while that job waits for a worker: once it has been claimed, a new job
+    takes the key over, so a change made meanwhile still gets a run.
+    """
+    get_task(name)
+    job = Job(
+        task=name,
+        payload=payload or {},
+        idempotency_key=key,
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        existing = Job.objects.get(idempotency_key=key)
+        if not pending_only or existing.status == Job.Status.QUEUED:
+            return existing
+        with transaction.atomic():
+            Job.objects.filter(pk=existing.pk).update(idempotency_key=None)
+            job.save()
+    return job
+
+
+def _claimable(now):
+    # Queued jobs that are due, and running jobs whose lease has expired.
+    return Job.objects.filter(
+        status__in=(Job.Status.QUEUED, Job.Status.RUNNING),
+        run_after__lte=now,
+        attempts__lt=F("max_attempts"),
+    )
+
+
+@retry_on_locked
+def claim(limit: int, visibility_timeout: float = VISIBILITY_TIMEOUT) -> list:
+    """Lease up to ``limit`` due jobs and return them.
+
+    The lease is taken by a conditional ``UPDATE``, so when two workers
+    race for the same rows only one of them gets each job.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Leases that ran out on the last allowed attempt will not be retried.
+        Job.objects.filter(
+            status=Job.Status.RUNNING, run_after__lte=now, attempts__gte=F("max_attempts")
+        ).update(status=Job.Status.FAILED, finished_at=now, last_error="Visibility timeout expired.")
+
+        ids = list(_claimable(now).order_by("run_after", "id").values_list("pk", flat=True)[:limit])
+        if not ids:
+            return []
+        lease = uuid.uuid4().hex
+        _claimable(now).filter(pk__in=ids).update(
+            status=Job.Status.RUNNING,
+            lease=lease,
+            attempts=F("attempts") + 1,
+            run_after=now + timedelta(seconds=visibility_timeout),
+        )
+    return list(Job.objects.filter(lease=lease, status=Job.Status.RUNNING))
+
+
+def execute(job_id: int, lease: str) -> str:
+    """Run a claimed job and record the outcome; returns the new status."""
+    job = Job.objects.get(pk=job_id)
+    try:
+        get_task(job.task)(**job.payload)
+    except Exception:
+        return fail(job, lease, traceback.format_exc())
+    return complete(job, lease)
+
+
+@retry_on_locked
+def complete(job: Job, lease: str) -> str:
+    # Filtering on the lease drops the result if the job was re-claimed.
+    Job.objects.filter(pk=job.pk, lease=lease).update(
+        status=Job.Status.DONE, finished_at=timezone.now(), last_error=""
+    )
+    return Job.Status.DONE
+
+
+@retry_on_locked
+def fail(job: Job, lease: str, error: str) -> str:
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        status = Job.Status.QUEUED
+        # Back off exponentially between attempts.
+        changes = {"run_after": now + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))}
+    else:
+        status = Job.Status.FAILED
+        changes = {"finished_at": now}
+    Job.objects.filter(pk=job.pk, lease=lease).update(status=status, last_error=error, **changes)
+    return status
+
+
+@retry_on_locked
+def _prune_batch(cutoff, batch: int) -> int:
+    ids = list(
+        Job.objects.filter(status=Job.Status.DONE, finished_at__lt=cutoff).values_list("pk", flat=True)[:batch]
+    )
+    if not ids:
+        return 0
+    return Job.objects.filter(pk__in=ids).delete()[0]
+
+
+def prune(keep: float = KEEP_DONE, batch: int = PRUNE_BATCH) -> int:
+    """Delete the jobs done more than ``keep`` seconds ago; returns how many.
+
+    Failed jobs stay for someone to look at. Rows go ``batch`` at a time so
+    no single write holds SQLite's lock for long.
+    """
+    cutoff = timezone.now() - timedelta(seconds=keep)
+    total = 0
+    while True:
+        deleted = _prune_batch(cutoff, batch)
+        total += deleted
+        if deleted < batch:
+            return total
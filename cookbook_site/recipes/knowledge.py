@@ -0,0 +1,351 @@
+"""Read-only snapshot of the ingredient knowledge base.
+
+``IngredientInfo`` rows are written to one file per knowledge
+``ChangeStamp`` version under ``RECIPES_SNAPSHOT_DIR``, and each process
+maps that file with ``mmap`` instead of loading the rows. The pages live
+in the OS page cache, so every worker on a machine shares a single copy of
+the knowledge base however large it grows. The lookup tables the voice
+parser, spelling corrections and typeahead need are derived from the keys
+when the file is written and stored in it too, so no worker builds its own.
+
+A worker checks the stamp at most every ``CHECK_INTERVAL``. When it moved,
+one worker per machine writes the new file in a background thread while
+requests keep reading the file they have mapped, and each worker maps the
+new one once it is there. Only a process with no snapshot at all yet
+writes one before answering.
+
+A file is a header (magic, version), a directory of ``TABLES``, the
+fixed-size slots of each table sorted by key, each holding the offset and
+length of a UTF-8 key and two integers, and then the keys, the JSON records
+and posting lists themselves. A lookup is a binary search over the slots
+that decodes only what it finds.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .models import ChangeStamp, IngredientInfo
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RKB2"
+CHECK_INTERVAL = 1.0
+# Older files kept on disk, for workers still mapping them.
+KEEP_FILES = 1
+# A build marker older than this is taken to belong to a process that died.
+BUILD_TIMEOUT = 120.0
+
+_HEADER = struct.Struct("<4sQ")
+_DIRECTORY = struct.Struct("<II")
+_SLOT = struct.Struct("<IIII")
+FIELDS = ("name", "description", "storage", "uses")
+# "records" holds the entries; the rest come from ``derived_tables``.
+TABLES = ("records", "phrases", "words", "prefixes", "grams")
+
+
+def derived_tables(keys: list) -> dict:
+    """The lookup tables for the sorted ``keys``; rows refer to a key by its index."""
+    from . import spelling, suggest, voice
+
+    return {**voice.knowledge_tables(keys), **suggest.knowledge_tables(keys), **spelling.knowledge_tables(keys)}
+
+
+def encode(version: int, entries) -> bytes:
+    """The snapshot file for ``version`` holding ``(key, record)`` pairs."""
+    records = sorted(
+        (key, json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        for key, record in entries
+    )
+    tables = {"records": records, **derived_tables([key for key, _ in records])}
+    return pack(version, tables)
+
+
+def pack(version: int, tables: dict) -> bytes:
+    """The file for ``tables``, which map names in ``TABLES`` to ``(key, value)`` rows.
+
+    A value is a record's bytes, a list of record indexes, or a pair of integers.
+    """
+    rows = {name: sorted((key.encode("utf-8"), value) for key, value in tables.get(name, ())) for name in TABLES}
+    slots_at = _HEADER.size + _DIRECTORY.size * len(TABLES)
+    offset = slots_at + _SLOT.size * sum(len(table) for table in rows.values())
+    directory, slots, blob = [], [], []
+    for name in TABLES:
+        directory.append(_DIRECTORY.pack(slots_at, len(rows[name])))
+        slots_at += _SLOT.size * len(rows[name])
+        for key, value in rows[name]:
+            key_at = offset
+            blob.append(key)
+            offset += len(key)
+            if isinstance(value, bytes):
+                first, second = offset, len(value)
+                blob.append(value)
+                offset += len(value)
+            elif isinstance(value, list):
+                # Aligned, so a posting list reads as a memoryview of ints.
+                blob.append(b"\0" * (-offset % 4))
+                offset += -offset % 4
+                first, second = offset, len(value)
+                blob.append(array("I", value).tobytes())
+                offset += 4 * len(value)
+            else:
+                first, second = value
+            slots.append(_SLOT.pack(key_at, len(key), first, second))
+    return b"".join([_HEADER.pack(MAGIC, version), *directory, *slots, *blob])
+
+
+class Table:
+    """One sorted table of a snapshot; indexing it gives the key bytes."""
+
+    def __init__(self, buffer, offset: int, count: int):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _slot(self, index: int) -> tuple:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return _SLOT.unpack_from(self._buffer, self._offset + _SLOT.size * index)
+
+    def __getitem__(self, index: int) -> bytes:
+        offset, length, _, _ = self._slot(index)
+        return self._buffer[offset : offset + length]
+
+    def values(self, index: int) -> tuple:
+        return self._slot(index)[2:]
+
+    def find(self, key: bytes) -> int:
+        """The index of ``key``, or -1."""
+        index = bisect_left(self, key)
+        return index if index < self._count and self[index] == key else -1
+
+    def prefixed(self, prefix: bytes):
+        """Indexes of the keys starting with ``prefix``, in order."""
+        for index in range(bisect_left(self, prefix), self._count):
+            if not self[index].startswith(prefix):
+                return
+            yield index
+
+    def prefixes_of(self, text: bytes) -> list:
+        """Indexes of the keys ``text`` starts with, longest first; keys must be unique."""
+        found = []
+        probe = text
+        while probe:
+            # Every key that is a prefix of ``probe`` sorts at or before this one.
+            index = bisect_right(self, probe) - 1
+            if index < 0:
+                break
+            key = self[index]
+            if probe.startswith(key):
+                found.append(index)
+                probe = key[:-1]
+            else:
+                probe = probe[: len(os.path.commonprefix((key, probe)))]
+        return found
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(path, "rb") as stream:
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a knowledge base snapshot")
+        for position, name in enumerate(TABLES):
+            offset, count = _DIRECTORY.unpack_from(self._map, _HEADER.size + _DIRECTORY.size * position)
+            setattr(self, name, Table(self._map, offset, count))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def key(self, index: int) -> str:
+        """The key of the entry at ``index``, as derived tables refer to it."""
+        return self.records[index].decode("utf-8")
+
+    def get(self, key, default=None):
+        """The record stored for ``key``: a dict of ``FIELDS``."""
+        index = self.records.find(key.encode("utf-8")) if isinstance(key, str) else -1
+        if index == -1:
+            return default
+        offset, length = self.records.values(index)
+        return json.loads(self._map[offset : offset + length])
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self.records.find(key.encode("utf-8")) != -1
+
+    def keys(self):
+        for index in range(len(self.records)):
+            yield self.key(index)
+
+    def postings(self, index: int) -> memoryview:
+        """The record indexes listed for the ``grams`` row at ``index``."""
+        offset, count = self.grams.values(index)
+        return memoryview(self._map)[offset : offset + 4 * count].cast("I")
+
+
+def snapshot_path(stamp: ChangeStamp) -> Path:
+    # The change time tells apart equal versions of a database restored or
+    # recreated under the same directory. A stamp never bumped has none.
+    changed = 0 if stamp._state.adding else int(stamp.changed_at.timestamp() * 1_000_000)
+    return Path(settings.RECIPES_SNAPSHOT_DIR) / f"knowledge-{stamp.version}-{changed}.snapshot"
+
+
+def write_snapshot() -> Path:
+    """Write the file for the current stamp, unless it exists, and return its path."""
+    # Read before the rows: a change made meanwhile bumps the stamp again.
+    stamp = ChangeStamp.current(ChangeStamp.KNOWLEDGE)
+    path = snapshot_path(stamp)
+    if path.exists():
+        return path
+    rows = IngredientInfo.objects.values_list("key", *FIELDS).iterator(chunk_size=5000)
+    data = encode(stamp.version, ((key, dict(zip(FIELDS, fields))) for key, *fields in rows))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+    _prune(path)
+    return path
+
+
+def _prune(newest: Path) -> None:
+    older = sorted(
+        (path for path in newest.parent.glob("knowledge-*.snapshot") if path != newest),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    for path in older[KEEP_FILES:]:
+        try:
+            # Workers that still map it keep their pages until they move on.
+            path.unlink()
+        except OSError:
+            pass
+    for marker in newest.parent.glob(".knowledge-*.building"):
+        try:
+            # Left behind by a process that died while writing.
+            if time.time() - marker.stat().st_mtime >= BUILD_TIMEOUT:
+                marker.unlink()
+        except OSError:
+            pass
+
+
+def _claim(path: Path) -> Path | None:
+    """Create ``path``'s build marker; ``None`` while another process holds it."""
+    marker = path.with_name(f".{path.name}.building")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        try:
+            if time.time() - marker.stat().st_mtime < BUILD_TIMEOUT:
+                return None
+            marker.unlink()
+        except FileNotFoundError:
+            pass
+        return _claim(path)
+    return marker
+
+
+def _build() -> None:
+    global _building
+    written = False
+    try:
+        # Another process holding the marker is left to it; the next check
+        # after ``CHECK_INTERVAL`` maps its file or tries again.
+        marker = _claim(snapshot_path(ChangeStamp.current(ChangeStamp.KNOWLEDGE)))
+        if marker is not None:
+            try:
+                write_snapshot()
+                written = True
+            finally:
+                marker.unlink(missing_ok=True)
+    except Exception:
+        logger.exception("Could not write the knowledge base snapshot.")
+    finally:
+        connections.close_all()
+        with _lock:
+            _building = None
+    if written:
+        changed()
+
+
+def build_in_background() -> None:
+    """Write the file for the current stamp in a thread, unless one is running."""
+    global _building
+    with _lock:
+        if _building is not None:
+            return
+        _building = threading.Thread(target=_build, name="recipes-knowledge-snapshot", daemon=True)
+        _building.start()
+
+
+_current = None
+_checked_at = 0.0
+_building = None
+_lock = threading.Lock()
+
+
+def _load(path: Path) -> Snapshot:
+    global _current
+    if _current is not None and not path.exists():
+        # Keep answering from the mapped file until the new one is written.
+        build_in_background()
+        return _current
+    with _lock:
+        if _current is None or _current.path != path:
+            _current = Snapshot(path if path.exists() else write_snapshot())
+        return _current
+
+
+def _due() -> bool:
+    global _checked_at
+    now = time.monotonic()
+    if _current is not None and now - _checked_at < CHECK_INTERVAL:
+        return False
+    _checked_at = now
+    return True
+
+
+def snapshot() -> Snapshot:
+    """This process's view of the knowledge base, at most ``CHECK_INTERVAL`` old."""
+    if not _due():
+        return _current
+    path = snapshot_path(ChangeStamp.current(ChangeStamp.KNOWLEDGE))
+    if _current is not None and _current.path == path:
+        return _current
+    return _load(path)
+
+
+async def asnapshot() -> Snapshot:
+    if not _due():
+        return _current
+    path = snapshot_path(await ChangeStamp.acurrent(ChangeStamp.KNOWLEDGE))
+    if _current is not None and _current.path == path:
+        return _current
+    return await sync_to_async(_load)(path)
+
+
+def changed() -> None:
+    """Look at the stamp on the next call instead of waiting out ``CHECK_INTERVAL``."""
+    global _checked_at
+    _checked_at = 0.0
+
+
+def rebuild() -> None:
+    """Start writing the file for a stamp just bumped; run it once that has committed."""
+    changed()
+    build_in_background()
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+QUERIES = (
+    "what is garlic",
+    "tell me about olive oil",
+    "what are the ingredients for hearty veggie pasta",
+    "what do i need for citrus herb salmon",
+    "describe tomato",
+)
+
+PATH = "/api/voice-assistant/"
+
+
+def query_string(index: int) -> str:
+    return urlencode({"q": QUERIES[index % len(QUERIES)]})
+
+
+def summarize(mode: str, clients: int, timings: list, elapsed: float, errors: int) -> dict:
+    timings.sort()
+    return {
+        "mode": mode,
+        "clients": clients,
+        "requests": len(timings),
+        "errors": errors,
+        "req_per_s": round(len(timings) / elapsed, 1),
+        "p50_ms": round(statistics.median(timings) * 1000, 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95)] * 1000, 2),
+    }
+
+
+def run_wsgi(clients: int, requests: int, threads: int) -> dict:
+    """Drive the WSGI handler as a server with ``threads`` workers would."""
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    workers = threading.BoundedSemaphore(threads)
+    timings, failures = [], []
+
+    def call(index):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": PATH,
+            "QUERY_STRING": query_string(index),
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "HTTP_HOST": "localhost",
+            "wsgi.input": BytesIO(),
+            "wsgi.url_scheme": "http",
+        }
+        status = []
+        response = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+        b"".join(response)
+        response.close()
+        return status[0].startswith("200")
+
+    def client(indexes):
+        for index in indexes:
+            # Latency includes the wait for a free worker thread.
+            started = time.perf_counter()
+            with workers:
+                ok = call(index)
+            timings.append(time.perf_counter() - started)
+            if not ok:
+                failures.append(index)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for n in range(clients):
+            pool.submit(client, range(n, requests, clients))
+    elapsed = time.perf_counter() - started
+    return summarize("wsgi", clients, timings, elapsed, len(failures))
+
+
+async def _asgi_request(application, index: int) -> bool:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": PATH,
+        "raw_path": PATH.encode(),
+        "query_string": query_string(index).encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 50000 + index % 10000),
+    }
+    body_sent = asyncio.Event()
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client stays connected until the response is complete.
+        await body_sent.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif not message.get("more_body"):
+            body_sent.set()
+
+    await application(scope, receive, send)
+    return status == [200]
+
+
+def run_asgi(clients: int, requests: int) -> dict:
+    """Drive the ASGI handler with ``clients`` concurrent tasks on one loop."""
+    from django.core.handlers.asgi import ASGIHandler
+
+    application = ASGIHandler()
+    timings, failures = [], []
+
+    async def client(indexes):
+        for index in indexes:
+            started = time.perf_counter()
+            ok = await _asgi_request(application, index)
+            timings.append(time.perf_counter() - started)
+            if not ok:
+                failures.append(index)
+
+    async def main():
+        await asyncio.gather(*(client(range(n, requests, clients)) for n in range(clients)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    return summarize("asgi", clients, timings, elapsed, len(failures))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare voice-assistant throughput under WSGI (sync views, thread pool) "
+        "and ASGI (async views, one event loop) at increasing client counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, nargs="+", default=[100, 250, 500, 1000])
+        parser.add_argument(
+            "--requests-per-client", type=int, default=5,
+            help="Requests each simulated client sends.",
+        )
+        parser.add_argument(
+            "--wsgi-threads", type=int, default=32,
+            help="Worker threads serving WSGI requests.",
+        )
+        parser.add_argument("--modes", nargs="+", choices=["wsgi", "asgi"], default=["wsgi", "asgi"])
+        parser.add_argument("--json", action="store_true", help="Print one JSON object per run.")
+        # Internal: run a single measurement in this process.
+        parser.add_argument("--worker", choices=["wsgi", "asgi"], help="Internal use.")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            clients = options["clients"][0]
+            requests = clients * options["requests_per_client"]
+            if options["worker"] == "wsgi":
+                result = run_wsgi(clients, requests, options["wsgi_threads"])
+            else:
+                result = run_asgi(clients, requests)
+            self.stdout.write(json.dumps(result))
+            return
+
+        if not options["json"]:
+            self.stdout.write(
+                f"{'mode':<5} {'clients':>7} {'requests':>8} {'errors':>6} "
+                f"{'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}"
+            )
+        for clients in options["clients"]:
+            for mode in options["modes"]:
+                result = self._measure(mode, clients, options)
+                if options["json"]:
+                    self.stdout.write(json.dumps(result))
+                else:
+                    self.stdout.write(
+                        f"{result['mode']:<5} {result['clients']:>7} {result['requests']:>8} "
+                        f"{result['errors']:>6} {result['req_per_s']:>8.1f} "
+                        f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}"
+                    )
+
+    def _measure(self, mode, clients, options) -> dict:
+        # The URLconf picks sync or async views at import time, so each
+        # measurement runs in a fresh process with the matching setting.
+        env = {**os.environ, "RECIPES_ASYNC_VIEWS": "1" if mode == "asgi" else "0"}
+        command = [
+            sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_concurrency",
+            "--worker", mode,
+            "--clients", str(clients),
+            "--requests-per-client", str(options["requests_per_client"]),
+            "--wsgi-threads", str(options["wsgi_threads"]),
+        ]
+        if options["settings"]:
+            command += ["--settings", options["settings"]]
+        process = subprocess.run(command, env=env, capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(f"{mode} run failed:\n{process.stderr}")
+        return json.loads(process.stdout.strip().splitlines()[-1])
@@ -0,0 +1,56 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import shopping
+from recipes.ingredients import parse_lines
+from recipes.management.commands.bench_views import synthetic_recipes
+
+
+def synthetic_rows(count: int, seed: int) -> list:
+    """``(recipe index, quantity, unit, name)`` rows for ``count`` synthetic recipes."""
+    return [
+        (index, parsed.quantity, parsed.unit, parsed.name)
+        for index, recipe in enumerate(synthetic_recipes(count, seed))
+        for parsed in parse_lines(recipe["ingredients"])
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark scaling and combining meal plans into shopping lists, with and without NumPy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 500], help="Recipes per plan.")
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        if shopping.np is None:
+            raise CommandError("NumPy is not installed; only the plain loop would run.")
+        rng = random.Random(options["seed"])
+        self.stdout.write(f"{'recipes':>7} {'rows':>6} {'items':>6} {'numpy p50 ms':>13} {'p95 ms':>7} {'loop p50 ms':>12}")
+        for size in options["sizes"]:
+            rows = synthetic_rows(size, options["seed"])
+            factors = [rng.choice((0.5, 1, 1.5, 2, 3)) for _ in range(size)]
+            arrays, loop = [], []
+            for _ in range(options["iterations"]):
+                started = time.perf_counter()
+                items = shopping.aggregate(rows, factors)
+                arrays.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                expected = shopping._aggregate_loop(rows, factors)
+                loop.append(time.perf_counter() - started)
+
+            expected.sort(key=lambda item: (item.name, item.unit))
+            if [item.as_dict() for item in items] != [item.as_dict() for item in expected]:
+                raise CommandError(f"The NumPy and loop lists differ for {size} recipes.")
+            arrays.sort()
+            self.stdout.write(
+                f"{size:>7} {len(rows):>6} {len(items):>6} "
+                f"{statistics.median(arrays) * 1000:>13.2f} "
+                f"{arrays[int(len(arrays) * 0.95)] * 1000:>7.2f} "
+                f"{statistics.median(loop) * 1000:>12.2f}"
+            )
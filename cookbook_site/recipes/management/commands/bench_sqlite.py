@@ -0,0 +1,151 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import override_settings
+
+from recipes import transfer
+from recipes.db import retry_on_locked
+from recipes.management.commands.bench_views import synthetic_recipes
+from recipes.models import Recipe
+
+# SQLite's own defaults, for comparison with the configured pragmas.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "delete",
+    "synchronous": "full",
+    "mmap_size": 0,
+    "cache_size": -2000,
+    "busy_timeout": 5000,
+}
+WAL_PRAGMAS = {"journal_mode": "wal", "synchronous": "normal"}
+
+
+@retry_on_locked
+def write_recipe(suffix: str) -> None:
+    with transaction.atomic():
+        recipe = Recipe.objects.create(
+            title=f"Benchmark Write {suffix}",
+            slug=f"bench-write-{suffix}",
+            prep_time=10,
+            cook_time=20,
+            short_description="Written while readers are busy.",
+            ingredients="2 cups rice\n1 tbsp butter\n3 cloves garlic",
+            directions="Cook.\nServe.",
+        )
+        recipe.sync_ingredients()
+
+
+def read_recipe(rng, count: int) -> None:
+    recipe = Recipe.objects.prefetch_related("ingredient_items").get(slug=f"bench-{rng.randrange(count)}")
+    recipe.ingredient_lines()
+    list(Recipe.objects.order_by("-created_at", "-id")[:12])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure read throughput while writers are committing, with SQLite's "
+        "defaults and with the configured pragmas and persistent connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument("--readers", type=int, default=8, help="Reader threads.")
+        parser.add_argument("--writers", type=int, default=2, help="Writer threads.")
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            self.stderr.write("This benchmark only applies to SQLite.")
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            # A file database: the in-memory test database has no journal to tune.
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(directory, "bench.sqlite3")
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                for chunk in transfer.chunks(synthetic_recipes(options["recipes"], options["seed"]), 2000):
+                    transfer.import_chunk([transfer.to_recipe(row) for row in chunk])
+                self.stdout.write(
+                    f"{'mode':<8} {'reads/s':>9} {'read p50 ms':>12} {'read p95 ms':>12} "
+                    f"{'writes/s':>9} {'write errors':>13}"
+                )
+                runs = (
+                    ("default", DEFAULT_PRAGMAS, None, False),
+                    # As the servers run it, with RECIPES_SQLITE_WAL on.
+                    ("tuned", {**WAL_PRAGMAS, **settings.RECIPES_SQLITE_PRAGMAS}, "IMMEDIATE", True),
+                )
+                for name, pragmas, transaction_mode, persistent in runs:
+                    connections.close_all()
+                    connection.settings_dict["OPTIONS"]["transaction_mode"] = transaction_mode
+                    with override_settings(RECIPES_SQLITE_PRAGMAS=pragmas):
+                        result = self._run(name, options, persistent)
+                    self.stdout.write(
+                        f"{name:<8} {result['reads_per_s']:>9.0f} {result['read_p50_ms']:>12.2f} "
+                        f"{result['read_p95_ms']:>12.2f} {result['writes_per_s']:>9.1f} "
+                        f"{result['write_errors']:>13}"
+                    )
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, label: str, options, persistent: bool) -> dict:
+        stop = threading.Event()
+        read_timings = []
+        writes = []
+        errors = []
+        counter = iter(range(10**9))
+        lock = threading.Lock()
+
+        def reader(seed):
+            rng = random.Random(seed)
+            timings = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                read_recipe(rng, options["recipes"])
+                timings.append(time.perf_counter() - started)
+                if not persistent:
+                    # What CONN_MAX_AGE = 0 does at the end of each request.
+                    connection.close()
+            connection.close()
+            with lock:
+                read_timings.extend(timings)
+
+        def writer():
+            while not stop.is_set():
+                with lock:
+                    index = next(counter)
+                try:
+                    write_recipe(f"{label}-{index}")
+                    writes.append(index)
+                except OperationalError:
+                    errors.append(index)
+                if not persistent:
+                    connection.close()
+            connection.close()
+
+        threads = [
+            threading.Thread(target=reader, args=(options["seed"] + n,)) for n in range(options["readers"])
+        ] + [threading.Thread(target=writer) for _ in range(options["writers"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        read_timings.sort()
+        return {
+            "reads_per_s": len(read_timings) / elapsed,
+            "read_p50_ms": statistics.median(read_timings) * 1000 if read_timings else 0.0,
+            "read_p95_ms": read_timings[int(len(read_timings) * 0.95)] * 1000 if read_timings else 0.0,
+            "writes_per_s": len(writes) / elapsed,
+            "write_errors": len(errors),
+        }
@@ -0,0 +1,284 @@
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from recipes import related, transfer
+
+INGREDIENTS = (
+    "garlic", "tomato", "basil", "onion", "chicken", "lemon", "rice", "black bean",
+    "bell pepper", "carrot", "spinach", "olive oil", "butter", "mushroom", "ginger",
+    "salmon", "potato", "parmesan", "chickpea", "coconut milk",
+)
+ADJECTIVES = ("smoky", "crispy", "creamy", "zesty", "rustic", "spicy", "golden", "herbed")
+DISHES = ("bowl", "skillet", "salad", "soup", "tacos", "pasta", "curry", "bake", "stew")
+UNITS = ("cup", "cups", "tbsp", "tsp", "oz", "cloves", "g")
+
+VOICE_QUERIES = (
+    "what is {ingredient}",
+    "tell me about {ingredient}",
+    "what are the ingredients for {title}",
+    "what do i need for {title}",
+)
+
+
+def synthetic_recipes(count: int, seed: int):
+    """Deterministic recipe rows in the import format."""
+    rng = random.Random(seed)
+    for index in range(count):
+        main = rng.choice(INGREDIENTS)
+        title = f"{rng.choice(ADJECTIVES).title()} {main.title()} {rng.choice(DISHES).title()} {index}"
+        lines = [
+            f"{rng.randint(1, 4)} {rng.choice(UNITS)} {ingredient}"
+            for ingredient in [main] + rng.sample(INGREDIENTS, rng.randint(3, 9))
+        ]
+        yield {
+            "slug": f"bench-{index}",
+            "title": title,
+            "subtitle": f"A {rng.choice(ADJECTIVES)} take on {main}",
+            "short_description": f"{title} with {', '.join(rng.sample(INGREDIENTS, 3))}.",
+            "prep_time": rng.randint(5, 60),
+            "cook_time": rng.randint(0, 120),
+            "servings": rng.randint(1, 8),
+            "ingredients": "\n".join(lines),
+            "directions": "\n".join(f"Step {step}." for step in range(1, rng.randint(3, 8))),
+        }
+
+
+def scenarios(count: int, seed: int) -> dict:
+    """Request builders for each view, keyed by scenario name."""
+    rng = random.Random(seed + 1)
+
+    def title():
+        return f"{rng.choice(ADJECTIVES)} {rng.choice(INGREDIENTS)} {rng.choice(DISHES)} {rng.randrange(count)}"
+
+    def voice(client):
+        query = rng.choice(VOICE_QUERIES).format(ingredient=rng.choice(INGREDIENTS), title=title())
+        return client.post("/api/voice-assistant/", json.dumps({"query": query}), content_type="application/json")
+
+    def voice_batch(client):
+        queries = [
+            rng.choice(VOICE_QUERIES).format(ingredient=rng.choice(INGREDIENTS), title=title())
+            for _ in range(10)
+        ]
+        return client.post("/api/voice-assistant/", json.dumps({"queries": queries}), content_type="application/json")
+
+    def shopping_list(client):
+        plan = [{"slug": f"bench-{rng.randrange(count)}", "servings": rng.randint(1, 8)} for _ in range(200)]
+        return client.post("/api/shopping-list/", json.dumps({"recipes": plan}), content_type="application/json")
+
+    def suggest(client):
+        word = rng.choice((rng.choice(ADJECTIVES), rng.choice(INGREDIENTS), rng.choice(DISHES)))
+        return client.get("/api/suggest/", {"q": word[: rng.randint(2, len(word))]})
+
+    return {
+        "home": lambda client: client.get("/"),
+        "home_page": lambda client: client.get("/", {"per_page": 12}),
+        "search_text": lambda client: client.get(
+            "/search/", {"q": f"{rng.choice(ADJECTIVES)} {rng.choice(INGREDIENTS)}"}
+        ),
+        "search_ingredient": lambda client: client.get(
+            "/search/", {"ingredient": rng.sample(INGREDIENTS, 2)}
+        ),
+        "search_title_sort": lambda client: client.get(
+            "/search/", {"q": rng.choice(INGREDIENTS), "sort": "title"}
+        ),
+        "recipe_detail": lambda client: client.get(f"/recipes/bench-{rng.randrange(count)}/"),
+        "api_list": lambda client: client.get("/api/recipes/", {"per_page": 24}),
+        "api_detail": lambda client: client.get(f"/api/recipes/bench-{rng.randrange(count)}/"),
+        "voice": voice,
+        "voice_batch": voice_batch,
+        "suggest": suggest,
+        "shopping_list": shopping_list,
+    }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the recipe views against a throwaway test database filled "
+        "with deterministic synthetic recipes, optionally failing on regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=10_000, help="Synthetic recipes to generate.")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per view.")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per view.")
+        parser.add_argument(
+            "--memory-samples", type=int, default=5, help="Requests per view traced for peak memory."
+        )
+        parser.add_argument("--views", nargs="+", help="Only run these scenarios.")
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every request.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--baseline", help="Compare with the results in this JSON file.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Allowed relative increase over the baseline in p50 latency and peak memory (p95 gets twice this).",
+        )
+        parser.add_argument(
+            "--noise-ms",
+            type=float,
+            default=1.0,
+            help="Latency increases smaller than this many milliseconds are never regressions.",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], encoding="utf-8") as stream:
+                    baseline = json.load(stream)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {exc}") from None
+            # Different settings draw different requests, so the numbers would not compare.
+            for key in ("recipes", "seed", "iterations", "cold"):
+                if baseline.get("meta", {}).get(key) != options[key]:
+                    raise CommandError(
+                        f"The baseline was recorded with {key}={baseline.get('meta', {}).get(key)!r}, "
+                        f"not {options[key]!r}."
+                    )
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._populate(options["recipes"], options["seed"], options["verbosity"])
+            results = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "recipes": options["recipes"],
+                "seed": options["seed"],
+                "iterations": options["iterations"],
+                "cold": options["cold"],
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "views": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as stream:
+                json.dump(report, stream, indent=2)
+                stream.write("\n")
+        self._print(results, baseline)
+        if baseline is not None:
+            regressions = self._regressions(results, baseline, options)
+            for message in regressions:
+                self.stderr.write(self.style.ERROR(message))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}.")
+
+    def _populate(self, count, seed, verbosity):
+        started = time.perf_counter()
+        for chunk in transfer.chunks(synthetic_recipes(count, seed), 2000):
+            transfer.import_chunk([transfer.to_recipe(row) for row in chunk])
+        transfer.finish_import()
+        # The queued job would never run here; detail pages need their lists.
+        related.rebuild()
+        if verbosity > 0:
+            self.stderr.write(f"Generated {count} recipes in {time.perf_counter() - started:.1f}s.")
+
+    def _run(self, options) -> dict:
+        client = Client()
+        views = scenarios(options["recipes"], options["seed"])
+        selected = options["views"] or list(views)
+        unknown = set(selected) - views.keys()
+        if unknown:
+            raise CommandError(f"Unknown views: {', '.join(sorted(unknown))}. Choose from {', '.join(views)}.")
+
+        results = {}
+        for name in selected:
+            request = views[name]
+            cache.clear()
+            for _ in range(options["warmup"]):
+                self._check(name, request(client))
+
+            timings, queries = [], []
+            for _ in range(options["iterations"]):
+                if options["cold"]:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = request(client)
+                    timings.append(time.perf_counter() - started)
+                self._check(name, response)
+                queries.append(len(captured))
+
+            peak = 0
+            tracemalloc.start()
+            try:
+                for _ in range(options["memory_samples"]):
+                    if options["cold"]:
+                        cache.clear()
+                    tracemalloc.reset_peak()
+                    request(client)
+                    peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+            results[name] = {
+                "p50_ms": round(statistics.median(timings) * 1000, 3),
+                "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+                "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+                "queries": max(queries),
+                "peak_kb": round(peak / 1024, 1),
+            }
+        return results
+
+    def _check(self, name, response):
+        if response.status_code != 200:
+            raise CommandError(f"{name}: unexpected status {response.status_code}.")
+
+    def _print(self, results, baseline):
+        previous = (baseline or {}).get("views", {})
+        self.stdout.write(
+            f"{'view':<20} {'p50 ms':>8} {'p95 ms':>8} {'queries':>7} {'peak KB':>9} {'p95 vs base':>12}"
+        )
+        for name, result in results.items():
+            change = ""
+            if name in previous and previous[name]["p95_ms"]:
+                change = f"{(result['p95_ms'] / previous[name]['p95_ms'] - 1) * 100:+.0f}%"
+            self.stdout.write(
+                f"{name:<20} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                f"{result['queries']:>7} {result['peak_kb']:>9.1f} {change:>12}"
+            )
+
+    def _regressions(self, results, baseline, options) -> list:
+        threshold = options["threshold"]
+        messages = []
+        for name, result in results.items():
+            before = baseline.get("views", {}).get(name)
+            if before is None:
+                continue
+            # The tail is noisier than the median, so it gets twice the slack.
+            for stat, allowed in (("p50_ms", threshold), ("p95_ms", threshold * 2)):
+                if (
+                    result[stat] > before[stat] * (1 + allowed)
+                    and result[stat] - before[stat] > options["noise_ms"]
+                ):
+                    messages.append(f"{name}: {stat[:3]} {before[stat]:.2f} -> {result[stat]:.2f} ms")
+            # Query counts are deterministic, so any increase counts.
+            if result["queries"] > before["queries"]:
+                messages.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+            if result["peak_kb"] > before["peak_kb"] * (1 + threshold):
+                messages.append(f"{name}: peak memory {before['peak_kb']:.0f} -> {result['peak_kb']:.0f} KB")
+        return messages
@@ -0,0 +1,87 @@
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from recipes import knowledge
+from recipes.voice import IntentParser
+
+SYLLABLES = ("ba", "ri", "co", "la", "mi", "to", "ne", "su", "ka", "po", "de", "lu")
+
+QUERY_TEMPLATES = (
+    "what is {key}",
+    "tell me about the {key}",
+    "what are the ingredients for hearty veggie pasta",
+    "describe {key} please",
+    "{key}",
+    "what is something you do not know",
+)
+
+
+def synthetic_keys(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    keys = set(knowledge.snapshot().keys())
+    while len(keys) < count:
+        words = ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(rng.randint(1, 2))]
+        keys.add(" ".join(words))
+    return sorted(keys)
+
+
+def linear_lookup(keys, ingredient_name):
+    """The per-request scan the view used before the automaton."""
+    for key in keys:
+        if key in ingredient_name or ingredient_name in key:
+            return key
+        if any(word in key for word in ingredient_name.split() if len(word) > 3):
+            return key
+    return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark voice intent parsing as the ingredient knowledge base grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[15, 500, 2000, 5000])
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.stdout.write(
+            f"{'keys':>7} {'build ms':>9} {'p50 us':>8} {'p95 us':>8} {'linear p50 us':>14}"
+        )
+        for size in options["sizes"]:
+            keys = synthetic_keys(size, options["seed"])
+            started = time.perf_counter()
+            # What writing the snapshot adds for the parser's tables; workers only map it.
+            data = knowledge.encode(0, ((key, {}) for key in keys))
+            build_ms = (time.perf_counter() - started) * 1000
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / "knowledge.snapshot"
+                path.write_bytes(data)
+                parser = IntentParser(knowledge.Snapshot(path))
+
+                queries = [
+                    rng.choice(QUERY_TEMPLATES).format(key=rng.choice(keys))
+                    for _ in range(options["queries"])
+                ]
+                timings, linear = [], []
+                for query in queries:
+                    started = time.perf_counter()
+                    intent = parser.parse(query)
+                    timings.append(time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    linear_lookup(keys, intent.entity)
+                    linear.append(time.perf_counter() - started)
+
+                timings.sort()
+                self.stdout.write(
+                    f"{size:>7} {build_ms:>9.1f} "
+                    f"{statistics.median(timings) * 1e6:>8.1f} "
+                    f"{timings[int(len(timings) * 0.95)] * 1e6:>8.1f} "
+                    f"{statistics.median(linear) * 1e6:>14.1f}"
+                )
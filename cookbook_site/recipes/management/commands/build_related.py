@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import related
+
+
+class Command(BaseCommand):
+    help = "Recompute every recipe's related-recipe list from scratch."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = related.build_index()
+        indexed = time.perf_counter()
+        lists = {pk: index.neighbours(pk) for pk in index.pks()}
+        scored = time.perf_counter()
+        changed = related.save_lists(lists)
+        finished = time.perf_counter()
+        self.stdout.write(
+            f"Indexed {len(index)} recipes in {indexed - started:.2f}s, "
+            f"found neighbours in {scored - indexed:.2f}s, "
+            f"wrote {changed} changed lists in {finished - scored:.2f}s."
+        )
+        self.stdout.write(self.style.SUCCESS(f"Updated related recipes for {changed} recipes."))
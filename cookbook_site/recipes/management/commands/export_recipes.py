@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes import transfer
+
+
+class Command(BaseCommand):
+    help = "Export all recipes as JSON Lines or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write, or - for standard output.")
+        parser.add_argument("--format", choices=transfer.FORMATS, help="Defaults to the file extension.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or transfer.guess_format(path)
+        if path == "-":
+            transfer.write_rows(sys.stdout, fmt, transfer.export_rows())
+            return
+        with open(path, "w", newline="", encoding="utf-8") as stream:
+            count = transfer.write_rows(stream, fmt, transfer.export_rows())
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} recipes to {path}."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Create resized and WebP variants for uploaded recipe images that lack them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate variants even where they are already up to date.",
+        )
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        recipes = Recipe.objects.exclude(uploaded_image="").exclude(uploaded_image__isnull=True)
+        for recipe in recipes.only("pk", "title", "uploaded_image", "image_variants").iterator():
+            try:
+                if images.refresh(recipe, force=options["force"]):
+                    generated += 1
+            except OSError as exc:
+                failed += 1
+                self.stderr.write(f"{recipe.title}: {exc}")
+        message = f"Generated variants for {generated} recipes."
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{message} {failed} failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
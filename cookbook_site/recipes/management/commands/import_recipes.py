@@ -0,0 +1,63 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import transfer
+
+
+class Command(BaseCommand):
+    help = "Import recipes from a JSON Lines or CSV file, updating existing slugs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or - for standard input.")
+        parser.add_argument("--format", choices=transfer.FORMATS, help="Defaults to the file extension.")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows written per transaction."
+        )
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Report and skip invalid rows instead of stopping at the first one.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or transfer.guess_format(path)
+        try:
+            stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc.strerror}") from None
+        try:
+            imported, skipped = self._import(stream, fmt, options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            transfer.finish_import()
+        message = f"Imported {imported} recipes."
+        if skipped:
+            message += f" Skipped {skipped} invalid rows."
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def _recipes(self, rows, options, counts):
+        for line_number, row in rows:
+            try:
+                yield transfer.to_recipe(row)
+            except ValueError as exc:
+                if not options["skip_invalid"]:
+                    raise CommandError(f"Line {line_number}: {exc}") from None
+                counts["skipped"] += 1
+                self.stderr.write(f"Line {line_number}: {exc}")
+
+    def _import(self, stream, fmt, options):
+        counts = {"skipped": 0}
+        imported = 0
+        started = reported = time.monotonic()
+        recipes = self._recipes(transfer.read_rows(stream, fmt), options, counts)
+        for chunk in transfer.chunks(recipes, options["batch_size"]):
+            imported += transfer.import_chunk(chunk)
+            now = time.monotonic()
+            if options["verbosity"] and now - reported >= 1:
+                reported = now
+                self.stderr.write(f"{imported} recipes ({imported / (now - started):.0f}/s)")
+        return imported, counts["skipped"]
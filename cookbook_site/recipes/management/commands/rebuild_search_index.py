@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the recipe full-text search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database alias to rebuild the index on.",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not search.is_supported(connection):
+            raise CommandError(
+                f"Full-text indexing needs SQLite; '{connection.vendor}' searches unindexed."
+            )
+        search.drop_index(connection)
+        search.create_index(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.FTS_TABLE}_docsize")
+            count = cursor.fetchone()[0]
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} recipes."))
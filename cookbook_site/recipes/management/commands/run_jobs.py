@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes import jobs
+
+# Seconds between deletions of old finished jobs.
+PRUNE_INTERVAL = 60
+
+
+def _init_process():
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+
+
+def _run(job_id, lease):
+    return jobs.execute(job_id, lease)
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs with a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2, help="Worker processes.")
+        parser.add_argument(
+            "--visibility-timeout",
+            type=float,
+            default=jobs.VISIBILITY_TIMEOUT,
+            help="Seconds a claimed job stays hidden from other workers.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0, help="Seconds between checks for new jobs."
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no jobs are due instead of polling."
+        )
+        parser.add_argument(
+            "--keep-done",
+            type=float,
+            default=jobs.KEEP_DONE,
+            help="Seconds to keep finished jobs before deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        counts = {}
+        running = {}
+        pruned_at = None
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_process) as pool:
+            try:
+                while True:
+                    if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                        pruned = jobs.prune(options["keep_done"])
+                        pruned_at = time.monotonic()
+                        if pruned and options["verbosity"] > 1:
+                            self.stdout.write(f"Deleted {pruned} finished jobs.")
+                    free = processes - len(running)
+                    if free:
+                        for job in jobs.claim(free, options["visibility_timeout"]):
+                            running[pool.submit(_run, job.pk, job.lease)] = job
+                    if not running:
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll_interval"])
+                        continue
+                    done, _ = wait(running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = running.pop(future)
+                        try:
+                            status = future.result()
+                        except Exception as exc:
+                            # The process died; the lease will expire and the job be retried.
+                            status = "lost"
+                            self.stderr.write(f"{job}: {exc!r}")
+                        counts[status] = counts.get(status, 0) + 1
+                        if options["verbosity"] > 1:
+                            self.stdout.write(f"{job.task} #{job.pk}: {status}")
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping; unfinished jobs will be retried after their lease expires.")
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(f"Jobs: {summary or 'none run'}."))
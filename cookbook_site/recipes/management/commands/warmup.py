@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how long each warmup step takes in a cold process. It warms only this command's own "
+        "process; set RECIPES_WARMUP_ON_START to warm the server workers."
+    )
+    # The checks would import the URLconf before the imports step can time it.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=warmup.TOP_RECIPES,
+            help="Trending recipes whose detail pages and searches are cached.",
+        )
+        parser.add_argument(
+            "--skip",
+            nargs="+",
+            default=[],
+            choices=[name for name, _ in warmup.STEPS],
+            help="Steps to leave out.",
+        )
+
+    def handle(self, *args, **options):
+        results = warmup.run(options["top"], skip=options["skip"])
+        width = max(len(result.name) for result in results) if results else 0
+        for result in results:
+            line = f"{result.name:<{width}}  {result.seconds * 1000:8.1f} ms  {result.detail}"
+            self.stdout.write(self.style.ERROR(f"{line}failed: {result.error}") if result.error else line)
+        total = sum(result.seconds for result in results)
+        self.stdout.write(f"{'total':<{width}}  {total * 1000:8.1f} ms")
+        failed = [result.name for result in results if result.error]
+        if failed:
+            raise CommandError(f"Warmup steps failed: {', '.join(failed)}.")
@@ -0,0 +1,212 @@
+"""In-process request metrics.
+
+``PerformanceMiddleware`` opens a ``RequestMetrics`` for every request in a
+context variable. The database execute wrapper and the timed template
+backend add to whichever one is current, which also holds when an async
+view runs its queries in a worker thread. Finished requests are folded
+into per-view histograms that ``render`` writes in the Prometheus text
+format, along with the ``COUNTERS`` other modules add to through
+``increment``. Each process keeps its own numbers.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Statements kept per request for the slow-request log.
+MAX_CAPTURED_SQL = 200
+
+
+@dataclass
+class RequestMetrics:
+    capture_sql: bool = False
+    queries: int = 0
+    db_time: float = 0.0
+    template_time: float = 0.0
+    template_depth: int = 0
+    sql: list = field(default_factory=list)
+
+
+_current = ContextVar("recipes_request_metrics", default=None)
+
+
+def start(capture_sql: bool = False):
+    """Begin collecting for the current request; returns ``(metrics, token)``."""
+    metrics = RequestMetrics(capture_sql=capture_sql)
+    return metrics, _current.set(metrics)
+
+
+def stop(token) -> None:
+    _current.reset(token)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        if metrics.capture_sql and len(metrics.sql) < MAX_CAPTURED_SQL:
+            metrics.sql.append((elapsed, sql))
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """``connection_created`` receiver that times every query on the connection."""
+    if execute_wrapper not in connection.execute_wrappers:
+        # First in the list, so connection.execute_wrapper() blocks, which
+        # pop from the end, never remove it.
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+@contextmanager
+def template_timer():
+    """Time a template render; nested renders count once, in the outermost."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - started
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# name -> (help text, buckets)
+HISTOGRAMS = {
+    "recipes_request_duration_seconds": ("Wall time per request.", DURATION_BUCKETS),
+    "recipes_request_db_seconds": ("Time spent in database queries per request.", DURATION_BUCKETS),
+    "recipes_request_db_queries": ("Database queries per request.", QUERY_BUCKETS),
+    "recipes_request_template_seconds": ("Template rendering time per request.", DURATION_BUCKETS),
+    "recipes_response_size_bytes": ("Size of non-streaming response bodies.", SIZE_BUCKETS),
+}
+
+# name -> help text
+COUNTERS = {
+    "recipes_voice_cache_lookups_total": "Voice answer cache lookups, by intent and result.",
+    "recipes_voice_cache_evictions_total": "Voice answers dropped from the cache, by reason.",
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_requests = {}
+_counters = {}
+
+
+def observe(view: str, status: int, duration: float, metrics: RequestMetrics, size: int | None) -> None:
+    values = {
+        "recipes_request_duration_seconds": duration,
+        "recipes_request_db_seconds": metrics.db_time,
+        "recipes_request_db_queries": metrics.queries,
+        "recipes_request_template_seconds": metrics.template_time,
+        "recipes_response_size_bytes": size,
+    }
+    with _lock:
+        key = (view, f"{status // 100}xx")
+        _requests[key] = _requests.get(key, 0) + 1
+        for name, value in values.items():
+            if value is None:
+                continue
+            histogram = _histograms.get((name, view))
+            if histogram is None:
+                histogram = _histograms[(name, view)] = Histogram(HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+
+def increment(name: str, amount: int = 1, **labels) -> None:
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _requests.clear()
+        _counters.clear()
+
+
+def server_timing(duration: float, metrics: RequestMetrics) -> str:
+    return ", ".join(
+        (
+            f"app;dur={duration * 1000:.1f}",
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f"tpl;dur={metrics.template_time * 1000:.1f}",
+        )
+    )
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        requests = sorted(_requests.items())
+        counters = sorted(_counters.items())
+        histograms = {
+            key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+            for key, histogram in _histograms.items()
+        }
+
+    lines = [
+        "# HELP recipes_requests_total Requests handled, by view and status class.",
+        "# TYPE recipes_requests_total counter",
+    ]
+    for (view, status), count in requests:
+        lines.append(f'recipes_requests_total{{view="{_label(view)}",status="{status}"}} {count}')
+
+    for name, (help_text, _) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (metric, view), (buckets, counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            view = _label(view)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{view="{view}",le="{_number(bound)}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{view="{view}"}} {_number(total)}')
+            lines.append(f'{name}_count{{view="{view}"}} {count}')
+
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (metric, labels), value in counters:
+            if metric == name:
+                labels = ",".join(f'{label}="{_label(text)}"' for label, text in labels)
+                lines.append(f"{name}{{{labels}}} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,204 @@
+import logging
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotFound
+from django.utils._os import safe_join
+from django.utils.module_loading import import_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from . import metrics
+from .storage import ENCODINGS
+
+logger = logging.getLogger("recipes.slow_requests")
+
+# Slowest statements included in a slow-request log entry.
+SLOW_LOG_STATEMENTS = 10
+
+# ManifestStaticFilesStorage puts a 12 character content hash before the extension.
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Files without a hash in their name may change under the same URL.
+MUTABLE_MAX_AGE = 60
+
+
+class PerformanceMiddleware:
+    """Measure each request and report it in ``Server-Timing`` and ``/metrics``.
+
+    Place it near the top of ``MIDDLEWARE``, below only
+    ``SecurityMiddleware`` and ``StaticAssetMiddleware``, so the wall time
+    covers the rest of the stack. With ``RECIPES_SLOW_REQUEST_MS`` set, requests at least that
+    slow are logged together with their slowest SQL statements.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_metrics, token = metrics.start(capture_sql=self.slow_ms is not None)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start(capture_sql=self.slow_ms is not None)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    @property
+    def slow_ms(self):
+        return settings.RECIPES_SLOW_REQUEST_MS
+
+    def finish(self, request, response, request_metrics, duration):
+        match = request.resolver_match
+        # Unmatched paths share one label to keep the series count bounded.
+        view = match.view_name if match else "<unresolved>"
+        size = None if response.streaming else len(response.content)
+        response["Server-Timing"] = metrics.server_timing(duration, request_metrics)
+        metrics.observe(view, response.status_code, duration, request_metrics, size)
+        if self.slow_ms is not None and duration * 1000 >= self.slow_ms:
+            self.log_slow(request, view, duration, request_metrics)
+        return response
+
+    def log_slow(self, request, view, duration, request_metrics):
+        slowest = sorted(request_metrics.sql, key=lambda item: item[0], reverse=True)
+        statements = "\n".join(
+            f"  {elapsed * 1000:8.1f} ms  {sql}" for elapsed, sql in slowest[:SLOW_LOG_STATEMENTS]
+        )
+        logger.warning(
+            "Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, templates %.1f ms\n%s",
+            request.method,
+            request.get_full_path(),
+            view,
+            duration * 1000,
+            request_metrics.queries,
+            request_metrics.db_time * 1000,
+            request_metrics.template_time * 1000,
+            statements,
+        )
+
+
+def accepted_encodings(header: str) -> set:
+    """The content codings an ``Accept-Encoding`` header allows."""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip().partition("=")[2] if params.strip().startswith("q=") else "1"
+        try:
+            if float(quality) > 0:
+                accepted.add(coding.strip().lower())
+        except ValueError:
+            continue
+    return accepted
+
+
+class StaticAssetMiddleware:
+    """Serve files from ``STATIC_ROOT`` as ``collectstatic`` left them.
+
+    The brotli or gzip sibling written by
+    ``storage.CompressedManifestStaticFilesStorage`` is sent when the client
+    accepts it. Fingerprinted names never change content, so they are
+    cached for a year as ``immutable``; anything else is revalidated after
+    ``MUTABLE_MAX_AGE``. The compressed siblings and the manifest are not
+    served under their own names. Under ``runserver`` the staticfiles handler
+    answers first, so development keeps serving straight from the app
+    directories.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.root = str(settings.STATIC_ROOT)
+        self.hidden_suffixes = tuple(ENCODINGS.values())
+        # Read from the class: the storage itself would load the manifest.
+        storage = import_string(settings.STORAGES["staticfiles"]["BACKEND"])
+        self.manifest_name = getattr(storage, "manifest_name", None)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        if response is None:
+            return await self.get_response(request)
+        if response.streaming:
+            # The file is read in a thread, as the staticfiles ASGI handler does.
+            content = response.streaming_content
+
+            async def read():
+                for part in await sync_to_async(list)(content):
+                    yield part
+
+            response.streaming_content = read()
+        return response
+
+    def serve(self, request):
+        """The response for a static file request, or ``None`` to pass it on."""
+        prefix = urlsplit(settings.STATIC_URL).path
+        if request.method not in ("GET", "HEAD") or not request.path.startswith(prefix):
+            return None
+        name = request.path[len(prefix) :]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not name or not os.path.isfile(path):
+            return None
+        if name.endswith(self.hidden_suffixes) or name == self.manifest_name:
+            return HttpResponseNotFound()
+
+        last_modified = int(os.stat(path).st_mtime)
+        response = get_conditional_response(request, last_modified=last_modified)
+        if response is None:
+            accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+            encoding = next(
+                (coding for coding, suffix in ENCODINGS.items() if coding in accepted and os.path.isfile(path + suffix)),
+                None,
+            )
+            content_type, _ = mimetypes.guess_type(name)
+            response = FileResponse(
+                open(path + ENCODINGS[encoding] if encoding else path, "rb"),
+                content_type=content_type or "application/octet-stream",
+            )
+            # Set from the file name; it is no download.
+            response.headers.pop("Content-Disposition", None)
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+        response.headers["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if HASHED_NAME.search(name):
+            response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={MUTABLE_MAX_AGE}"
+        return response
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# A frozen copy of the index in recipes.search as of this migration, so later
+# changes to the app code cannot change what migrating does.
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5("
+    "title, subtitle, short_description, ingredients, directions, "
+    "content='recipes_recipe', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    """
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_ai AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, title, subtitle, short_description, ingredients, directions)
+        VALUES (new.id, new.title, new.subtitle, new.short_description, new.ingredients, new.directions);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_ad AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, title, subtitle, short_description, ingredients, directions)
+        VALUES ('delete', old.id, old.title, old.subtitle, old.short_description, old.ingredients, old.directions);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_au
+    AFTER UPDATE OF title, subtitle, short_description, ingredients, directions ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, title, subtitle, short_description, ingredients, directions)
+        VALUES ('delete', old.id, old.title, old.subtitle, old.short_description, old.ingredients, old.directions);
+        INSERT INTO recipes_recipe_fts(rowid, title, subtitle, short_description, ingredients, directions)
+        VALUES (new.id, new.title, new.subtitle, new.short_description, new.ingredients, new.directions);
+    END
+    """,
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')",
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('optimize')",
+)
+
+DROP_SQL = (
+    "DROP TRIGGER IF EXISTS recipes_recipe_fts_ai",
+    "DROP TRIGGER IF EXISTS recipes_recipe_fts_ad",
+    "DROP TRIGGER IF EXISTS recipes_recipe_fts_au",
+    "DROP TABLE IF EXISTS recipes_recipe_fts",
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is SQLite only; other databases keep the icontains search.
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0003_recipe_uploaded_image"),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('raw', models.TextField(help_text='The line exactly as the author wrote it')),
+                ('quantity', models.FloatField(blank=True, null=True)),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('name', models.CharField(help_text='Normalized ingredient name', max_length=150)),
+                ('keyword', models.CharField(help_text='Last word of the name', max_length=50)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_items', to='recipes.recipe')),
+            ],
+            options={
+                'ordering': ['recipe', 'position'],
+                'indexes': [models.Index(fields=['name', 'recipe'], name='ingredient_name_idx'), models.Index(fields=['keyword', 'recipe'], name='ingredient_keyword_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recipe', 'position'), name='unique_recipe_ingredient_position')],
+            },
+        ),
+    ]
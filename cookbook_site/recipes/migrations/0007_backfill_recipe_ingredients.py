@@ -0,0 +1,195 @@
+import re
+from fractions import Fraction
+
+from django.db import migrations
+
+# A frozen copy of the parser in recipes.ingredients, so later changes to the
+# app code cannot change what migrating does.
+UNICODE_FRACTIONS = {
+    "¼": "1/4",
+    "½": "1/2",
+    "¾": "3/4",
+    "⅓": "1/3",
+    "⅔": "2/3",
+    "⅛": "1/8",
+}
+
+UNIT_ALIASES = {
+    "cup": "cup",
+    "cups": "cup",
+    "c": "cup",
+    "tbsp": "tbsp",
+    "tbs": "tbsp",
+    "tablespoon": "tbsp",
+    "tablespoons": "tbsp",
+    "tsp": "tsp",
+    "teaspoon": "tsp",
+    "teaspoons": "tsp",
+    "oz": "oz",
+    "ounce": "oz",
+    "ounces": "oz",
+    "lb": "lb",
+    "lbs": "lb",
+    "pound": "lb",
+    "pounds": "lb",
+    "g": "g",
+    "gram": "g",
+    "grams": "g",
+    "kg": "kg",
+    "ml": "ml",
+    "l": "l",
+    "liter": "l",
+    "liters": "l",
+    "litre": "l",
+    "litres": "l",
+    "pint": "pint",
+    "pints": "pint",
+    "quart": "quart",
+    "quarts": "quart",
+    "clove": "clove",
+    "cloves": "clove",
+    "can": "can",
+    "cans": "can",
+    "slice": "slice",
+    "slices": "slice",
+    "fillet": "fillet",
+    "fillets": "fillet",
+    "pinch": "pinch",
+    "dash": "dash",
+    "bunch": "bunch",
+    "sprig": "sprig",
+    "sprigs": "sprig",
+    "handful": "handful",
+    "stick": "stick",
+    "sticks": "stick",
+    "piece": "piece",
+    "pieces": "piece",
+}
+
+# Preparation and size words that describe an ingredient rather than name it.
+DESCRIPTORS = {
+    "fresh", "freshly", "frozen", "dried", "chopped", "minced", "sliced",
+    "diced", "grated", "shredded", "crushed", "melted", "softened", "peeled",
+    "large", "medium", "small", "ripe", "finely", "roughly", "thinly",
+    "toasted", "cooked", "raw", "whole",
+}
+# Trailing words naming the form an ingredient comes in ("basil leaves").
+FORM_WORDS = {
+    "leaf", "leaves", "sprig", "sprigs", "fillet", "fillets", "chunk",
+    "chunks", "piece", "pieces", "slice", "slices",
+}
+
+_FRACTION_RE = re.compile(rf"(?:(\d)\s*)?([{''.join(UNICODE_FRACTIONS)}])")
+_QUANTITY_RE = re.compile(
+    r"^(?P<quantity>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)(?:\s*[-–]\s*[\d./]+)?\s*"
+)
+_PARENTHETICAL_RE = re.compile(r"\([^)]*\)")
+_QUALIFIER_RE = re.compile(r"\s+(?:for|to taste|as needed)\b.*$")
+_WORD_RE = re.compile(r"[a-z][a-z'-]*")
+
+
+def singularize(word: str) -> str:
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def parse_quantity(text: str) -> float | None:
+    """The amount in ``text``; ``None`` when it is no usable number, like ``1/0``."""
+    whole, _, fraction = text.partition(" ")
+    try:
+        if fraction:
+            return float(int(whole) + Fraction(fraction))
+        return float(Fraction(whole))
+    except (ArithmeticError, ValueError):
+        # ZeroDivisionError, OverflowError, or more digits than int() accepts.
+        return None
+
+
+def normalize_name(text: str) -> str:
+    text = text.lower().split(",", 1)[0]
+    text = _QUALIFIER_RE.sub("", text)
+    words = _WORD_RE.findall(text)
+    if words and words[0] == "of":
+        words = words[1:]
+    words = [word for word in words if word not in DESCRIPTORS]
+    while len(words) > 1 and words[-1] in FORM_WORDS:
+        words.pop()
+    return " ".join(singularize(word) for word in words)
+
+
+def _expand_fraction(match) -> str:
+    """``1½`` -> ``1 1/2`` and a lone ``½`` -> ``1/2``."""
+    whole, symbol = match.groups()
+    fraction = UNICODE_FRACTIONS[symbol]
+    return f"{whole} {fraction}" if whole else fraction
+
+
+def parse_line(line: str) -> tuple:
+    """``(raw, quantity, unit, name)`` for one ingredient line."""
+    raw = line.strip()
+    text = _PARENTHETICAL_RE.sub(" ", raw).strip()
+    text = _FRACTION_RE.sub(_expand_fraction, text)
+
+    quantity = None
+    match = _QUANTITY_RE.match(text)
+    if match:
+        quantity = parse_quantity(match.group("quantity"))
+        text = text[match.end():]
+
+    unit = ""
+    first, _, rest = text.partition(" ")
+    candidate = first.lower().rstrip(".")
+    if candidate in UNIT_ALIASES and (match or candidate in ("pinch", "dash", "handful")):
+        unit = UNIT_ALIASES[candidate]
+        text = rest
+
+    return raw, quantity, unit, normalize_name(text)
+
+
+def parse_lines(text: str) -> list:
+    return [parse_line(line) for line in text.splitlines() if line.strip()]
+
+
+def backfill_ingredients(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+
+    rows = []
+    for recipe_id, text in Recipe.objects.values_list("id", "ingredients").iterator():
+        for position, (raw, quantity, unit, name) in enumerate(parse_lines(text)):
+            rows.append(
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    position=position,
+                    raw=raw,
+                    quantity=quantity,
+                    unit=unit,
+                    name=name[:150],
+                    keyword=(name.rsplit(" ", 1)[-1] if name else "")[:50],
+                )
+            )
+        if len(rows) >= 1000:
+            RecipeIngredient.objects.bulk_create(rows)
+            rows = []
+    RecipeIngredient.objects.bulk_create(rows)
+
+
+def clear_ingredients(apps, schema_editor):
+    apps.get_model("recipes", "RecipeIngredient").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipes", "0006_recipeingredient"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ingredients, clear_ingredients),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:46
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    ChangeStamp = apps.get_model("recipes", "ChangeStamp")
+    # Existing recipes were last changed no later than they were created.
+    Recipe.objects.update(updated_at=F("created_at"))
+    ChangeStamp.objects.get_or_create(name="recipes", defaults={"version": 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeStamp',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
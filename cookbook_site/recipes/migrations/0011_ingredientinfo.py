@@ -0,0 +1,130 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+def seed_knowledge_base(apps, schema_editor):
+    IngredientInfo = apps.get_model("recipes", "IngredientInfo")
+    ChangeStamp = apps.get_model("recipes", "ChangeStamp")
+
+    entries = {
+        "tomato": {
+            "name": "Tomato",
+            "description": "Tomatoes are rich in vitamin C, potassium, and lycopene. They add acidity and umami to dishes.",
+            "storage": "Store at room temperature until ripe, then refrigerate.",
+            "uses": "Great in salads, sauces, soups, and as a base for many dishes.",
+        },
+        "garlic": {
+            "name": "Garlic",
+            "description": "Garlic is a powerful flavor enhancer with antimicrobial properties. It contains allicin, which provides health benefits.",
+            "storage": "Keep in a cool, dry place with good air circulation.",
+            "uses": "Essential in many cuisines. Use minced, crushed, or sliced for different flavor intensities.",
+        },
+        "onion": {
+            "name": "Onion",
+            "description": "Onions add sweetness and depth when cooked. They're rich in antioxidants and vitamin C.",
+            "storage": "Store in a cool, dry, well-ventilated area away from potatoes.",
+            "uses": "Base for many dishes. Can be caramelized, sautéed, or used raw in salads.",
+        },
+        "bell pepper": {
+            "name": "Bell Pepper",
+            "description": "Bell peppers are rich in vitamin C and come in various colors. They add crunch and sweetness.",
+            "storage": "Refrigerate in the crisper drawer for up to a week.",
+            "uses": "Great raw in salads, roasted, stuffed, or sautéed in stir-fries.",
+        },
+        "zucchini": {
+            "name": "Zucchini",
+            "description": "Zucchini is a summer squash low in calories and high in water content. It's rich in vitamin A and C.",
+            "storage": "Refrigerate in a plastic bag for up to a week.",
+            "uses": "Can be grilled, sautéed, baked, or spiralized into noodles.",
+        },
+        "salmon": {
+            "name": "Salmon",
+            "description": "Salmon is rich in omega-3 fatty acids, protein, and vitamin D. It's a heart-healthy fish.",
+            "storage": "Keep refrigerated and cook within 1-2 days of purchase.",
+            "uses": "Can be baked, grilled, pan-seared, or poached. Pairs well with citrus and herbs.",
+        },
+        "chicken": {
+            "name": "Chicken",
+            "description": "Chicken is a lean protein source rich in B vitamins and selenium. It's versatile and widely used.",
+            "storage": "Refrigerate and use within 1-2 days, or freeze for longer storage.",
+            "uses": "Can be roasted, grilled, sautéed, or braised. Works with many flavor profiles.",
+        },
+        "pasta": {
+            "name": "Pasta",
+            "description": "Pasta is a carbohydrate-rich food made from wheat. Whole grain versions offer more fiber.",
+            "storage": "Store in a cool, dry place in an airtight container.",
+            "uses": "Base for many dishes. Cook al dente for best texture.",
+        },
+        "basil": {
+            "name": "Basil",
+            "description": "Basil is an aromatic herb with a sweet, slightly peppery flavor. It's rich in antioxidants.",
+            "storage": "Keep fresh basil in water like flowers, or store in the refrigerator wrapped in damp paper towels.",
+            "uses": "Essential in Italian cuisine. Use fresh in salads, pesto, or as a garnish.",
+        },
+        "mango": {
+            "name": "Mango",
+            "description": "Mangoes are tropical fruits rich in vitamin C, vitamin A, and fiber. They're sweet and juicy.",
+            "storage": "Ripen at room temperature, then refrigerate to slow further ripening.",
+            "uses": "Great in smoothies, salads, desserts, or eaten fresh.",
+        },
+        "coconut": {
+            "name": "Coconut",
+            "description": "Coconut provides healthy fats, fiber, and minerals. Coconut milk adds creaminess to dishes.",
+            "storage": "Store coconut milk in the refrigerator after opening. Fresh coconut should be refrigerated.",
+            "uses": "Used in curries, desserts, smoothies, and as a dairy alternative.",
+        },
+        "yogurt": {
+            "name": "Yogurt",
+            "description": "Yogurt is rich in probiotics, protein, and calcium. Greek yogurt has more protein.",
+            "storage": "Keep refrigerated and check expiration date.",
+            "uses": "Great in smoothies, as a marinade, in dips, or eaten plain with fruit.",
+        },
+        "lemon": {
+            "name": "Lemon",
+            "description": "Lemons are rich in vitamin C and add bright acidity to dishes. The zest contains aromatic oils.",
+            "storage": "Store at room temperature or in the refrigerator for longer storage.",
+            "uses": "Adds flavor to dressings, marinades, desserts, and beverages.",
+        },
+        "butter": {
+            "name": "Butter",
+            "description": "Butter adds richness and flavor. It's made from cream and contains saturated fats.",
+            "storage": "Refrigerate butter, but let it soften at room temperature for baking.",
+            "uses": "Used for sautéing, baking, spreading, and finishing dishes.",
+        },
+        "olive oil": {
+            "name": "Olive Oil",
+            "description": "Olive oil is rich in monounsaturated fats and antioxidants. Extra virgin is the highest quality.",
+            "storage": "Store in a cool, dark place away from heat and light.",
+            "uses": "Used for cooking, dressings, marinades, and finishing dishes.",
+        },
+    }
+    IngredientInfo.objects.bulk_create(IngredientInfo(key=key, **fields) for key, fields in entries.items())
+    ChangeStamp.objects.get_or_create(name="knowledge", defaults={"version": 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_updated_at_changestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientInfo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Lowercase name the assistant listens for', max_length=100, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('storage', models.TextField(blank=True)),
+                ('uses', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'ingredient info',
+                'ordering': ['key'],
+            },
+        ),
+        migrations.RunPython(seed_knowledge_base, migrations.RunPython.noop),
+    ]
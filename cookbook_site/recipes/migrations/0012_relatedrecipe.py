@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:11
+
+import math
+import re
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# A frozen copy of the scoring in recipes.related as of this migration, so
+# later changes to the app code cannot change what migrating does. It scores
+# every recipe sharing a term exactly; the databases migrated here are small.
+TOP_K = 6
+MIN_SCORE = 0.05
+
+INGREDIENT_WEIGHT = 1.0
+TITLE_WEIGHT = 0.7
+DESCRIPTION_WEIGHT = 0.3
+
+STOP_WORDS = frozenset(
+    "and the with for from into this that these your you our its are was were has have "
+    "but not all any can will just than then them they their over under very more most "
+    "some such only each about also".split()
+)
+
+WORD_RE = re.compile(r"[a-z]+")
+
+
+def words(text):
+    return [word for word in WORD_RE.findall(text.lower()) if len(word) > 2 and word not in STOP_WORDS]
+
+
+def features(title, description, ingredient_names):
+    weights = Counter()
+    for word in {word for name in ingredient_names for word in words(name)}:
+        weights[word] += INGREDIENT_WEIGHT
+    for word in words(title):
+        weights[word] += TITLE_WEIGHT
+    for word in words(description):
+        weights[word] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def build_related(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+    RelatedRecipe = apps.get_model("recipes", "RelatedRecipe")
+
+    names = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.values_list("recipe_id", "name").iterator():
+        names[recipe_id].append(name)
+    weights = {
+        pk: features(title, description, names[pk])
+        for pk, title, description in Recipe.objects.values_list("id", "title", "short_description").iterator()
+    }
+    df = Counter(term for terms in weights.values() for term in terms)
+    idf = {term: math.log((1 + len(weights)) / (1 + count)) + 1 for term, count in df.items()}
+
+    # Unit TF-IDF vectors, so a dot product is the cosine.
+    vectors = {}
+    postings = defaultdict(list)
+    for pk, terms in weights.items():
+        weighted = {term: weight * idf[term] for term, weight in terms.items()}
+        norm = math.sqrt(sum(value * value for value in weighted.values())) or 1.0
+        vectors[pk] = {term: value / norm for term, value in weighted.items()}
+        for term, value in vectors[pk].items():
+            postings[term].append((pk, value))
+
+    rows = []
+    for pk, vector in vectors.items():
+        scores = Counter()
+        for term, value in vector.items():
+            for other, other_value in postings[term]:
+                scores[other] += value * other_value
+        scores.pop(pk, None)
+        best = sorted(
+            ((score, other) for other, score in scores.items() if score >= MIN_SCORE),
+            key=lambda entry: (-entry[0], entry[1]),
+        )[:TOP_K]
+        rows.extend(
+            RelatedRecipe(recipe_id=pk, related_id=other, rank=rank, score=score)
+            for rank, (score, other) in enumerate(best)
+        )
+    RelatedRecipe.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredientinfo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(help_text='Cosine similarity of the two recipes')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_items', to='recipes.recipe')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe')),
+            ],
+            options={
+                'ordering': ['recipe', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('recipe', 'rank'), name='unique_related_recipe_rank')],
+            },
+        ),
+        migrations.RunPython(build_related, migrations.RunPython.noop),
+    ]
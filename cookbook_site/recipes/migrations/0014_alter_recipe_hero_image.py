@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_trending'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='hero_image',
+            field=models.CharField(blank=True, help_text='Relative path to a hero image stored under recipes static files.', max_length=255),
+        ),
+    ]
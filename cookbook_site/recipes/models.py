@@ -1,4 +1,96 @@
 from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .ingredients import normalize_name, parse_lines
+
+# Shown for recipes created without a hero image of their own.
+DEFAULT_HERO_IMAGE = "recipes/images/hearty_veggie_pasta.svg"
+
+# Written only by ``recipes.popularity``; saving a recipe leaves them alone.
+COUNTER_FIELDS = ("view_count", "trending_score")
+
+
+class ChangeStamp(models.Model):
+    """A version counter per table, bumped whenever its rows change.
+
+    Listing pages derive their ``ETag`` from it, which costs one primary
+    key lookup instead of a scan of the rows they show.
+    """
+
+    RECIPES = "recipes"
+    KNOWLEDGE = "knowledge"
+    # Bumped when view counts reorder the top of the trending ranking.
+    TRENDING = "trending"
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def bump(cls, name: str) -> int:
+        """Advance ``name``'s version and return the new one."""
+        now = timezone.now()
+        if not cls.objects.filter(name=name).update(version=F("version") + 1, changed_at=now):
+            cls.objects.get_or_create(name=name, defaults={"version": 1, "changed_at": now})
+        return cls.objects.filter(name=name).values_list("version", flat=True).get()
+
+    @classmethod
+    def current(cls, name: str) -> "ChangeStamp":
+        return cls.objects.filter(name=name).first() or cls(name=name)
+
+    @classmethod
+    async def acurrent(cls, name: str) -> "ChangeStamp":
+        return await cls.objects.filter(name=name).afirst() or cls(name=name)
+
+
+class IngredientInfo(models.Model):
+    """What the voice assistant can tell about one ingredient.
+
+    Requests never query this table; they read ``knowledge.snapshot()``,
+    which is rebuilt from it whenever the knowledge ``ChangeStamp`` moves.
+    """
+
+    key = models.CharField(max_length=100, unique=True, help_text="Lowercase name the assistant listens for")
+    name = models.CharField(max_length=100)
+    description = models.TextField()
+    storage = models.TextField(blank=True)
+    uses = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["key"]
+        verbose_name_plural = "ingredient info"
+
+    def __str__(self) -> str:
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.key = " ".join(self.key.lower().split())
+        super().save(*args, **kwargs)
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_ingredients(self, *names):
+        """Recipes that list every one of ``names`` as an ingredient.
+
+        Each name becomes an indexed lookup on ``RecipeIngredient`` rather
+        than a substring scan of the ingredients text.
+        """
+        queryset = self
+        for name in names:
+            term = normalize_name(name)
+            if term:
+                matching = RecipeIngredient.objects.matching(term).values("recipe_id")
+                queryset = queryset.filter(pk__in=matching)
+        return queryset
+
+    def trending(self):
+        """Most viewed first, by the decayed score ``recipes.popularity`` keeps."""
+        return self.order_by("-trending_score", "id")
 
 
 class Recipe(models.Model):
@@ -15,6 +107,12 @@ class Recipe(models.Model):
     uploaded_image = models.ImageField(
         upload_to="recipes/uploads/", blank=True, null=True
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Resized copies of uploaded_image, maintained by recipes.images.",
+    )
     prep_time = models.PositiveIntegerField(help_text="Preparation time in minutes")
     cook_time = models.PositiveIntegerField(help_text="Cooking time in minutes")
     servings = models.PositiveIntegerField(default=1)
@@ -22,9 +120,177 @@ class Recipe(models.Model):
     ingredients = models.TextField(help_text="One ingredient per line")
     directions = models.TextField(help_text="One step per line")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)
+    trending_score = models.FloatField(
+        default=0.0,
+        editable=False,
+        help_text="Log of the forward-decayed view count, maintained by recipes.popularity.",
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ["title"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="recipe_created_id_idx"),
+            models.Index(fields=["title", "id"], name="recipe_title_id_idx"),
+            models.Index(fields=["-trending_score", "id"], name="recipe_trending_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title
+
+    def save(self, *args, **kwargs):
+        """Save the recipe without writing back the counters it was loaded with.
+
+        Views flushed while the instance was in hand would otherwise be
+        overwritten by its stale copies.
+        """
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    def ingredient_lines(self) -> list[str]:
+        """The ingredient lines as written, from the parsed rows when present."""
+        lines = [item.raw for item in self.ingredient_items.all()]
+        if lines or not self.ingredients.strip():
+            return lines
+        return [line.strip() for line in self.ingredients.splitlines() if line.strip()]
+
+    def sync_ingredients(self) -> None:
+        """Re-parse ``ingredients`` into ``RecipeIngredient`` rows."""
+        self.ingredient_items.all().delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient.from_parsed(self, position, parsed)
+            for position, parsed in enumerate(parse_lines(self.ingredients))
+        )
+        # Drop any prefetched rows so ingredient_lines() sees the new ones.
+        getattr(self, "_prefetched_objects_cache", {}).pop("ingredient_items", None)
+
+
+class RecipeIngredientQuerySet(models.QuerySet):
+    def matching(self, term: str):
+        """Rows whose normalized name is, starts with, or ends in ``term``.
+
+        All three branches are index lookups: the prefix test is written as
+        a range on ``name`` and the suffix test uses ``keyword``.
+        """
+        return self.filter(
+            Q(name=term)
+            | Q(name__gte=f"{term} ", name__lt=f"{term}!")
+            | Q(keyword=term)
+        )
+
+
+class RecipeIngredient(models.Model):
+    """One parsed line of a recipe's ingredient list."""
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="ingredient_items"
+    )
+    position = models.PositiveSmallIntegerField()
+    raw = models.TextField(help_text="The line exactly as the author wrote it")
+    quantity = models.FloatField(null=True, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
+    name = models.CharField(max_length=150, help_text="Normalized ingredient name")
+    keyword = models.CharField(max_length=50, help_text="Last word of the name")
+
+    objects = RecipeIngredientQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["recipe", "position"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "position"], name="unique_recipe_ingredient_position"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["name", "recipe"], name="ingredient_name_idx"),
+            models.Index(fields=["keyword", "recipe"], name="ingredient_keyword_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return self.raw
+
+    @classmethod
+    def from_parsed(cls, recipe, position: int, parsed):
+        return cls(
+            recipe=recipe,
+            position=position,
+            raw=parsed.raw,
+            quantity=parsed.quantity,
+            unit=parsed.unit,
+            name=parsed.name[:150],
+            keyword=parsed.keyword[:50],
+        )
+
+
+class RelatedRecipeQuerySet(models.QuerySet):
+    def for_recipe(self, recipe):
+        """``recipe``'s neighbours, best first, with each related recipe joined in."""
+        return self.filter(recipe=recipe).select_related("related").order_by("rank")
+
+
+class RelatedRecipe(models.Model):
+    """One of a recipe's nearest neighbours, maintained by ``recipes.related``."""
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="related_items"
+    )
+    related = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(help_text="Cosine similarity of the two recipes")
+
+    objects = RelatedRecipeQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["recipe", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "rank"], name="unique_related_recipe_rank"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.recipe_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class Job(models.Model):
+    """A unit of background work, run by ``manage.py run_jobs``.
+
+    A claimed job is leased until ``run_after``; if its worker has not
+    finished by then, the job becomes visible to other workers again.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    lease = models.CharField(max_length=64, blank=True, help_text="Token of the claiming worker")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["run_after", "id"]
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_status_run_after_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.task} #{self.pk} ({self.status})"
@@ -0,0 +1,165 @@
+"""Keyset (cursor) pagination for recipe listings.
+
+Pages are addressed by the sort key of the last row shown rather than by an
+offset, so every page is a bounded range scan on an index no matter how deep
+the reader goes. Cursors are opaque URL-safe tokens.
+"""
+
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import ChangeStamp
+
+# Each ordering ends in a unique column so the sort key is a total order.
+ORDERINGS = {
+    "newest": ("-created_at", "-id"),
+    "title": ("title", "id"),
+}
+
+DEFAULT_PAGE_SIZE = 12
+MAX_PAGE_SIZE = 48
+
+COUNT_TIMEOUT = 60 * 10
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: str | None = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def _encode_value(value):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which would let
+    # rows sharing a millisecond fall between two pages.
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return DjangoJSONEncoder().default(value)
+
+
+def encode_cursor(values) -> str:
+    payload = json.dumps(list(values), default=_encode_value, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def page_size(value, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Parse a requested page size, clamped to ``1..MAX_PAGE_SIZE``."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _after(fields, values) -> Q:
+    """Build "sort key comes after ``values``" for ``fields``.
+
+    The leading column is repeated as an inclusive bound so SQLite can start
+    the index range scan at the cursor instead of filtering from the top.
+    """
+    (first, *rest), (first_value, *rest_values) = fields, values
+    name = first.lstrip("-")
+    op = "lt" if first.startswith("-") else "gt"
+    strictly_after = Q(**{f"{name}__{op}": first_value})
+    if not rest:
+        return strictly_after
+    return Q(**{f"{name}__{op}e": first_value}) & (strictly_after | _after(rest, rest_values))
+
+
+def _keyset(queryset, ordering: str, cursor: str | None):
+    fields = ORDERINGS[ordering]
+    names = [name.lstrip("-") for name in fields]
+    queryset = queryset.order_by(*fields)
+    if cursor:
+        raw_values = decode_cursor(cursor, len(fields))
+        model_fields = [queryset.model._meta.get_field(name) for name in names]
+        try:
+            values = [f.to_python(value) for f, value in zip(model_fields, raw_values)]
+            # Range checks too, so an id SQLite cannot bind is refused here.
+            for f, value in zip(model_fields, values):
+                f.run_validators(value)
+        except (TypeError, ValueError, ValidationError) as exc:
+            # to_python lets some types through, e.g. a number as the datetime.
+            raise InvalidCursor(cursor) from exc
+        if None in values:
+            raise InvalidCursor(cursor)
+        queryset = queryset.filter(_after(fields, values))
+    return queryset, names
+
+
+def _page(items: list, size: int, names) -> Page:
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        # Rows from values() querysets are dicts.
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last[name] for name in names)
+        else:
+            next_cursor = encode_cursor(getattr(last, name) for name in names)
+    return Page(items, next_cursor)
+
+
+def paginate(queryset, ordering: str, cursor: str | None = None, size: int = DEFAULT_PAGE_SIZE) -> Page:
+    """Return one page of ``queryset`` sorted by the named keyset ordering.
+
+    A malformed or tampered cursor raises ``InvalidCursor``.
+    """
+    queryset, names = _keyset(queryset, ordering, cursor)
+    return _page(list(queryset[: size + 1]), size, names)
+
+
+async def apaginate(queryset, ordering: str, cursor: str | None = None, size: int = DEFAULT_PAGE_SIZE) -> Page:
+    """Async variant of ``paginate``."""
+    queryset, names = _keyset(queryset, ordering, cursor)
+    return _page([item async for item in queryset[: size + 1]], size, names)
+
+
+def cached_count(key: str, compute, version: int | None = None) -> int:
+    """Return ``compute()``, cached until the recipe table next changes.
+
+    Counts are keyed on the recipes ``ChangeStamp`` ``version``, read here
+    unless the caller has it already, so a change in any process retires them.
+    """
+    if version is None:
+        version = ChangeStamp.current(ChangeStamp.RECIPES).version
+    digest = hashlib.md5(key.encode()).hexdigest()
+    cache_key = f"recipes:count:{version}:{digest}"
+    count = cache.get(cache_key)
+    if count is None:
+        count = compute()
+        cache.set(cache_key, count, COUNT_TIMEOUT)
+    return count
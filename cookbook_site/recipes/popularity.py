@@ -0,0 +1,139 @@
+"""Buffered view counts and the "Trending Now" score.
+
+Detail views call ``record_view``, which only adds to a counter in this
+process. A daemon thread writes the counts every ``FLUSH_INTERVAL``, or
+sooner once ``FLUSH_AT`` recipes are waiting, in one transaction, so a
+burst of views costs one write per interval instead of one per hit on
+SQLite's single writer. Counts still pending when a process exits are
+written then; a process that is killed loses at most one interval.
+
+``trending_score`` uses forward decay: a view at time ``t`` weighs
+``exp(RATE * (t - EPOCH))``. Stored scores never need rewriting as time
+passes; newer views simply count for more, twice as much every
+``HALF_LIFE``. The column holds the log of the sum, which stays a small
+float, and is indexed, so the rail is one ordered query. A flush that
+reorders the top of the ranking bumps the trending ``ChangeStamp``.
+"""
+
+import atexit
+import logging
+import math
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import home_cache
+from .db import retry_on_locked
+from .models import ChangeStamp, Recipe
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 10.0
+FLUSH_AT = 1000
+
+HALF_LIFE = timedelta(days=2)
+RATE = math.log(2) / HALF_LIFE.total_seconds()
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+_pending = Counter()
+_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+
+
+def log_weight(views: int, when: datetime) -> float:
+    """The log of the decayed weight of ``views`` views at ``when``."""
+    return math.log(views) + RATE * (when - EPOCH).total_seconds()
+
+
+def add_views(score: float, views: int, when: datetime) -> float:
+    """``score`` after ``views`` more views at ``when``; a zero score has no views yet."""
+    added = log_weight(views, when)
+    if not score:
+        return added
+    high, low = max(score, added), min(score, added)
+    return high + math.log1p(math.exp(low - high))
+
+
+def record_view(pk: int) -> None:
+    global _thread
+    with _lock:
+        _pending[pk] += 1
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="recipes-view-counts", daemon=True)
+            _thread.start()
+            atexit.register(flush)
+        full = len(_pending) >= FLUSH_AT
+    if full:
+        _wake.set()
+
+
+def pending() -> int:
+    """Views recorded in this process and not yet written."""
+    with _lock:
+        return sum(_pending.values())
+
+
+def _run() -> None:
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Could not write view counts; keeping them for the next flush.")
+        finally:
+            # This thread's connection would otherwise stay open between flushes.
+            connections.close_all()
+
+
+def _top_ids() -> list:
+    return list(Recipe.objects.trending().values_list("pk", flat=True)[: home_cache.TRENDING_SIZE])
+
+
+def _update_sql() -> str:
+    quote = connection.ops.quote_name
+    return (
+        f"UPDATE {quote(Recipe._meta.db_table)} SET {quote('view_count')} = %s, "
+        f"{quote('trending_score')} = %s WHERE {quote('id')} = %s"
+    )
+
+
+@retry_on_locked
+def write(counts: dict, when: datetime) -> bool:
+    """Add ``{pk: views}`` seen at ``when``; returns whether the ranking head moved."""
+    with transaction.atomic():
+        before = _top_ids()
+        rows = [
+            (views + counts[pk], add_views(score, counts[pk], when), pk)
+            for pk, views, score in Recipe.objects.filter(pk__in=counts).values_list(
+                "pk", "view_count", "trending_score"
+            )
+        ]
+        # One prepared statement for every row; bulk_update's CASE expressions
+        # grow with the batch. updated_at, and with it the page validators, stays.
+        with connection.cursor() as cursor:
+            cursor.executemany(_update_sql(), rows)
+        moved = _top_ids() != before
+        if moved:
+            ChangeStamp.bump(ChangeStamp.TRENDING)
+    return moved
+
+
+def flush() -> int:
+    """Write the pending counts now; returns how many recipes they covered."""
+    with _lock:
+        counts = dict(_pending)
+        _pending.clear()
+    if not counts:
+        return 0
+    try:
+        write(counts, timezone.now())
+    except Exception:
+        with _lock:
+            _pending.update(counts)
+        raise
+    return len(counts)
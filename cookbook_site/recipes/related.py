@@ -0,0 +1,374 @@
+"""Precomputed "related recipes" for the detail page.
+
+Each recipe is a sparse TF-IDF vector over the words of its parsed
+ingredient names, title and description, weighted in that order, and two
+recipes are as related as the cosine of their vectors. The ``TOP_K`` nearest
+neighbours of every recipe are stored as ``RelatedRecipe`` rows, so the
+detail page reads its recommendations with one indexed query.
+
+Neighbours are found through an inverted index from term to recipes. The
+postings of a recipe's rarest terms are walked first, up to
+``SCAN_LIMIT`` entries, to pick ``CANDIDATES``, and only those are scored
+exactly; common terms such as salt still count towards the scores.
+
+``manage.py build_related`` computes every list. Saving a recipe queues
+``update_recipe``, which refreshes that recipe's list and, since the score
+is symmetric, only the lists it now enters or drops out of. The pages
+listing a recipe that is saved or deleted get new validators right away
+through ``touch_listing``, since they show its title and link. A job worker
+keeps its index between jobs and catches up from ``updated_at``. IDF
+weights drift as the corpus grows, so run the command now and then.
+"""
+
+import math
+import re
+import threading
+from array import array
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .db import retry_on_locked
+from .models import ChangeStamp, Recipe, RecipeIngredient, RelatedRecipe
+
+try:
+    import numpy as np
+except ImportError:  # Optional: candidates are then counted in a plain loop.
+    np = None
+
+TOP_K = 6
+MIN_SCORE = 0.05
+# Posting entries walked per recipe while collecting candidates.
+SCAN_LIMIT = 10_000
+# Candidates scored exactly after the postings walk.
+CANDIDATES = 100
+# Share the recipe count may change by before IDF weights are recomputed.
+IDF_DRIFT = 0.01
+# Re-read recipes changed this long before the last sync, for transactions
+# that committed after it.
+SYNC_OVERLAP = timedelta(minutes=1)
+# Recipe ids per statement when lists are rewritten.
+WRITE_CHUNK = 500
+
+INGREDIENT_WEIGHT = 1.0
+TITLE_WEIGHT = 0.7
+DESCRIPTION_WEIGHT = 0.3
+
+STOP_WORDS = frozenset(
+    "and the with for from into this that these your you our its are was were has have "
+    "but not all any can will just than then them they their over under very more most "
+    "some such only each about also".split()
+)
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def _words(text: str) -> list:
+    return [word for word in _WORD_RE.findall(text.lower()) if len(word) > 2 and word not in STOP_WORDS]
+
+
+def features(title: str, description: str, ingredient_names) -> Counter:
+    """Term weights for one recipe: its words, weighted by where they appear."""
+    weights = Counter()
+    for word in {word for name in ingredient_names for word in _words(name)}:
+        weights[word] += INGREDIENT_WEIGHT
+    for word in _words(title):
+        weights[word] += TITLE_WEIGHT
+    for word in _words(description):
+        weights[word] += DESCRIPTION_WEIGHT
+    return weights
+
+
+class SimilarityIndex:
+    def __init__(self):
+        # slot -> (pk, term ids, weights); None once removed.
+        self._slots = []
+        self._slot_of = {}
+        self._term_ids = {}
+        # term id -> (slots, weights); removed slots stay until compaction.
+        self._postings = []
+        # Live recipes per term id.
+        self._df = array("I")
+        self._dead = 0
+        # IDF per term id and norm per slot, as of ``_weighted_count`` recipes.
+        self._idf = []
+        self._norms = {}
+        self._weighted_count = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, pk) -> bool:
+        return pk in self._slot_of
+
+    def pks(self):
+        return self._slot_of.keys()
+
+    def _unchanged(self, pk: int, weights: dict) -> bool:
+        slot = self._slot_of.get(pk)
+        if slot is None or len(self._slots[slot][1]) != len(weights):
+            return False
+        stored = dict(zip(*self._slots[slot][1:]))
+        return all(
+            abs(stored.get(self._term_ids.get(term), -1.0) - weight) < 1e-6 for term, weight in weights.items()
+        )
+
+    def add(self, pk: int, weights: dict) -> None:
+        # Keeping the slot keeps the order ties between candidates come in.
+        if self._unchanged(pk, weights):
+            return
+        self.remove(pk)
+        slot = len(self._slots)
+        terms, values = array("I"), array("f")
+        for term, weight in weights.items():
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._term_ids[term] = len(self._postings)
+                self._postings.append((array("I"), array("f")))
+                self._df.append(0)
+            slots, posted = self._postings[term_id]
+            slots.append(slot)
+            posted.append(weight)
+            self._df[term_id] += 1
+            terms.append(term_id)
+            values.append(weight)
+        self._slots.append((pk, terms, values))
+        self._slot_of[pk] = slot
+
+    def remove(self, pk: int) -> None:
+        slot = self._slot_of.pop(pk, None)
+        if slot is None:
+            return
+        for term_id in self._slots[slot][1]:
+            self._df[term_id] -= 1
+        self._slots[slot] = None
+        self._dead += 1
+        if self._dead > len(self._slot_of):
+            self._compact()
+
+    def _compact(self) -> None:
+        live = [entry for entry in self._slots if entry is not None]
+        names = {term_id: term for term, term_id in self._term_ids.items()}
+        self.__init__()
+        for pk, terms, values in live:
+            self.add(pk, {names[term_id]: weight for term_id, weight in zip(terms, values)})
+
+    def _refresh_weights(self) -> None:
+        # IDF and norms are recomputed once the recipe count has drifted far
+        # enough to matter, not on every change.
+        count = len(self._slot_of)
+        if self._idf and abs(count - self._weighted_count) <= self._weighted_count * IDF_DRIFT:
+            return
+        self._weighted_count = count
+        self._idf = []
+        self._norms = {}
+
+    def _idf_of(self, term_id: int) -> float:
+        while term_id >= len(self._idf):
+            self._idf.append(math.log((1 + self._weighted_count) / (1 + self._df[len(self._idf)])) + 1)
+        return self._idf[term_id]
+
+    def _norm(self, slot: int) -> float:
+        norm = self._norms.get(slot)
+        if norm is None:
+            _, terms, values = self._slots[slot]
+            total = sum((weight * self._idf_of(term_id)) ** 2 for term_id, weight in zip(terms, values))
+            norm = self._norms[slot] = math.sqrt(total) or 1.0
+        return norm
+
+    def _candidates(self, vector: dict, slot: int) -> list:
+        """Slots sharing the rarest of ``vector``'s terms, by their partial score."""
+        walked = []
+        budget = SCAN_LIMIT
+        for term_id in sorted(vector, key=self._df.__getitem__):
+            if budget <= 0:
+                break
+            slots, weights = self._postings[term_id]
+            walked.append((term_id, slots, weights, budget))
+            budget -= len(slots)
+        if np is not None:
+            slots = np.concatenate([np.frombuffer(slots, dtype=np.uint32)[:take] for _, slots, _, take in walked])
+            weights = np.concatenate(
+                [np.frombuffer(weights, dtype=np.float32)[:take] * vector[term_id] for term_id, _, weights, take in walked]
+            )
+            partial = np.bincount(slots, weights=weights, minlength=len(self._slots))
+            partial[slot] = 0.0
+            if len(partial) > CANDIDATES:
+                best = np.argpartition(partial, -CANDIDATES)[-CANDIDATES:]
+            else:
+                best = np.arange(len(partial))
+            return [int(other) for other in best if partial[other] > 0]
+        partial = Counter()
+        for term_id, slots, weights, take in walked:
+            scale = vector[term_id]
+            for other, weight in zip(slots[:take], weights[:take]):
+                partial[other] += scale * weight
+        partial.pop(slot, None)
+        return [other for other, _ in partial.most_common(CANDIDATES)]
+
+    def similar(self, pk: int) -> dict:
+        """``{other pk: cosine}`` for ``pk``'s candidates scoring at least ``MIN_SCORE``."""
+        slot = self._slot_of.get(pk)
+        if slot is None:
+            return {}
+        _, terms, values = self._slots[slot]
+        if not terms:
+            # No usable words, so nothing shares a term with it.
+            return {}
+        self._refresh_weights()
+        norm = self._norm(slot)
+        # Each term's share of the cosine per unit of another recipe's weight.
+        vector = {term_id: weight * self._idf_of(term_id) ** 2 / norm for term_id, weight in zip(terms, values)}
+        scores = {}
+        for other in self._candidates(vector, slot):
+            entry = self._slots[other]
+            if entry is None:
+                continue
+            dot = sum(vector.get(term_id, 0.0) * weight for term_id, weight in zip(entry[1], entry[2]))
+            score = dot / self._norm(other)
+            if score >= MIN_SCORE:
+                scores[entry[0]] = score
+        return scores
+
+    def neighbours(self, pk: int) -> list:
+        """``pk``'s top ``TOP_K`` as ``(score, other pk)``, best first."""
+        return top(self.similar(pk).items())
+
+
+def top(pairs) -> list:
+    """The best ``TOP_K`` of ``(other pk, score)`` pairs as ``(score, other pk)``."""
+    return sorted(((score, other) for other, score in pairs), key=lambda entry: (-entry[0], entry[1]))[:TOP_K]
+
+
+def load(index: SimilarityIndex, recipes, ingredients) -> None:
+    """Add the rows of ``recipes`` to ``index``; ``ingredients`` holds their ingredient rows."""
+    names = defaultdict(list)
+    for recipe_id, name in ingredients.values_list("recipe_id", "name").iterator(chunk_size=5000):
+        names[recipe_id].append(name)
+    rows = recipes.values_list("pk", "title", "short_description").iterator(chunk_size=5000)
+    for pk, title, description in rows:
+        index.add(pk, features(title, description, names.pop(pk, ())))
+
+
+def build_index(recipes=None, ingredients=None) -> SimilarityIndex:
+    """An index over every recipe; migrations pass their historical managers."""
+    index = SimilarityIndex()
+    load(
+        index,
+        Recipe.objects.all() if recipes is None else recipes,
+        RecipeIngredient.objects.all() if ingredients is None else ingredients,
+    )
+    return index
+
+
+_index = None
+_synced_at = None
+_lock = threading.Lock()
+
+
+def synced_index() -> SimilarityIndex:
+    """This process's index, caught up with the recipe table."""
+    global _index, _synced_at
+    with _lock:
+        started = timezone.now()
+        if _index is None:
+            _index = build_index()
+        else:
+            changed = Recipe.objects.filter(updated_at__gte=_synced_at - SYNC_OVERLAP)
+            load(_index, changed, RecipeIngredient.objects.filter(recipe__in=changed))
+            for pk in set(_index.pks()) - set(Recipe.objects.values_list("pk", flat=True)):
+                _index.remove(pk)
+        _synced_at = started
+        return _index
+
+
+def _ids(entries) -> list:
+    return [other for _, other in entries]
+
+
+def stored_lists(queryset) -> dict:
+    """``{recipe pk: [(score, other pk)]}`` for the ``RelatedRecipe`` rows in ``queryset``."""
+    lists = defaultdict(list)
+    for recipe_id, related_id, score in queryset.order_by("recipe_id", "rank").values_list(
+        "recipe_id", "related_id", "score"
+    ):
+        lists[recipe_id].append((score, related_id))
+    return lists
+
+
+@retry_on_locked
+def _store(lists: dict) -> None:
+    """Replace the lists of the recipes in ``lists`` and give those recipes new validators."""
+    pks = list(lists)
+    # The page markup changes with the list, so it needs new validators.
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(pks), WRITE_CHUNK):
+            chunk = pks[start : start + WRITE_CHUNK]
+            RelatedRecipe.objects.filter(recipe_id__in=chunk).delete()
+            RelatedRecipe.objects.bulk_create(
+                RelatedRecipe(recipe_id=pk, related_id=other, rank=rank, score=score)
+                for pk in chunk
+                for rank, (score, other) in enumerate(lists[pk])
+            )
+            Recipe.objects.filter(pk__in=chunk).update(updated_at=now)
+        ChangeStamp.bump(ChangeStamp.RECIPES)
+
+
+def save_lists(lists: dict) -> int:
+    """Store the lists in ``lists`` that differ from the stored ones; returns how many did."""
+    existing = stored_lists(RelatedRecipe.objects.all())
+    changed = {pk: entries for pk, entries in lists.items() if _ids(entries) != _ids(existing.get(pk, ()))}
+    if changed:
+        _store(changed)
+    return len(changed)
+
+
+def rebuild() -> int:
+    """Recompute every recipe's list; returns how many lists changed."""
+    index = build_index()
+    return save_lists({pk: index.neighbours(pk) for pk in index.pks()})
+
+
+def update_recipe(recipe_id: int) -> list:
+    """Refresh ``recipe_id``'s list and the lists it enters or leaves.
+
+    Returns the pks of the recipes whose list changed.
+    """
+    index = synced_index()
+    if recipe_id not in index:
+        return []
+    scores = index.similar(recipe_id)
+    existing = stored_lists(
+        RelatedRecipe.objects.filter(
+            Q(recipe_id=recipe_id) | Q(recipe_id__in=list(scores)) | Q(related_id=recipe_id)
+        )
+    )
+    lists = {recipe_id: top(scores.items())}
+    for other in (set(scores) | set(existing)) - {recipe_id}:
+        current = existing.get(other, [])
+        kept = [(score, pk) for score, pk in current if pk != recipe_id]
+        if other in scores:
+            kept.append((scores[other], recipe_id))
+        if len(current) == TOP_K and len(kept) < TOP_K:
+            # It dropped out of a full list; whatever comes next is not stored.
+            lists[other] = index.neighbours(other)
+        else:
+            lists[other] = top((pk, score) for score, pk in kept)
+    changed = {pk: entries for pk, entries in lists.items() if _ids(entries) != _ids(existing.get(pk, ()))}
+    if changed:
+        _store(changed)
+    return list(changed)
+
+
+def touch_listing(recipe) -> list:
+    """Give the recipes whose lists show ``recipe`` new validators; returns their ``(pk, slug)``."""
+    listing = list(
+        Recipe.objects.filter(related_items__related=recipe).exclude(pk=recipe.pk).values_list("pk", "slug")
+    )
+    if listing:
+        Recipe.objects.filter(pk__in=[pk for pk, _ in listing]).update(updated_at=timezone.now())
+    return listing
@@ -0,0 +1,242 @@
+"""Full-text recipe search backed by an SQLite FTS5 index.
+
+The index is an external-content FTS5 table over ``recipes_recipe``; SQLite
+triggers keep it in sync on every insert, update and delete, so saves, deletes
+and bulk operations never have to touch it from Python. On databases without
+FTS5 the helpers fall back to the original ``icontains`` scan.
+"""
+
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import pagination
+from .models import Recipe
+
+FTS_TABLE = "recipes_recipe_fts"
+INDEXED_FIELDS = ("title", "subtitle", "short_description", "ingredients", "directions")
+# bm25() column weights, in the same order as INDEXED_FIELDS.
+FIELD_WEIGHTS = (10.0, 4.0, 2.0, 3.0, 1.0)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+_COLUMNS = ", ".join(INDEXED_FIELDS)
+_NEW_VALUES = ", ".join(f"new.{field}" for field in INDEXED_FIELDS)
+_OLD_VALUES = ", ".join(f"old.{field}" for field in INDEXED_FIELDS)
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_COLUMNS}, content='recipes_recipe', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')"
+)
+
+CREATE_TRIGGERS_SQL = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_COLUMNS}) VALUES (new.id, {_NEW_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMNS})
+        VALUES ('delete', old.id, {_OLD_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_COLUMNS} ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLUMNS})
+        VALUES ('delete', old.id, {_OLD_VALUES});
+        INSERT INTO {FTS_TABLE}(rowid, {_COLUMNS}) VALUES (new.id, {_NEW_VALUES});
+    END
+    """,
+)
+
+DROP_SQL = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+
+# Aliases whose database is known to have the FTS table; only positive
+# answers are remembered so a later ``migrate`` is picked up.
+_indexed_aliases = set()
+
+
+def _connection():
+    return connections[router.db_for_read(Recipe)]
+
+
+def is_supported(connection) -> bool:
+    return connection.vendor == "sqlite"
+
+
+def index_exists(connection) -> bool:
+    if connection.alias in _indexed_aliases:
+        return True
+    exists = is_supported(connection) and FTS_TABLE in connection.introspection.table_names()
+    if exists:
+        _indexed_aliases.add(connection.alias)
+    return exists
+
+
+def create_index(connection) -> None:
+    """Create the FTS table and its triggers, then fill it from scratch."""
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        for statement in CREATE_TRIGGERS_SQL:
+            cursor.execute(statement)
+    rebuild_index(connection)
+
+
+def ensure_triggers(connection) -> bool:
+    """Re-create sync triggers that a table rebuild may have dropped.
+
+    SQLite drops triggers together with their table, and Django rebuilds
+    ``recipes_recipe`` for many schema changes. Returns True (after
+    rebuilding the index) when any trigger was missing.
+    """
+    if not index_exists(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f"{FTS_TABLE}_a_"],
+        )
+        if cursor.fetchone()[0] == len(CREATE_TRIGGERS_SQL):
+            return False
+        for statement in CREATE_TRIGGERS_SQL:
+            cursor.execute(statement)
+    rebuild_index(connection)
+    return True
+
+
+def drop_index(connection) -> None:
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+    _indexed_aliases.discard(connection.alias)
+
+
+def rebuild_index(connection=None) -> None:
+    """Rebuild the whole index from ``recipes_recipe`` and compact it."""
+    connection = connection or _connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def build_match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query that ANDs every term.
+
+    Terms are quoted so user input can never inject FTS syntax, and the last
+    term is matched as a prefix so partially typed words still hit.
+    """
+    terms = _TOKEN_RE.findall(query.lower())
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _bm25() -> str:
+    weights = ", ".join(str(weight) for weight in FIELD_WEIGHTS)
+    return f"bm25({FTS_TABLE}, {weights})"
+
+
+def match_queryset(query: str):
+    """All recipes matching ``query``, as an unordered queryset."""
+    expression = build_match_expression(query)
+    if not expression:
+        return Recipe.objects.none()
+    if not index_exists(_connection()):
+        return fallback_queryset(query)
+    return Recipe.objects.filter(
+        pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression])
+    )
+
+
+def ranked_ids(query: str, limit: int | None = None, after: tuple | None = None) -> list[tuple]:
+    """Return ``(score, id)`` pairs matching ``query``, best BM25 first.
+
+    Lower scores rank higher. ``after`` is the ``(score, id)`` of the last
+    row already shown and restricts the result to the rows following it.
+    """
+    connection = _connection()
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    if not index_exists(connection):
+        # Without an index everything ties on score; fall back to id order.
+        queryset = fallback_queryset(query).order_by("pk")
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after[1])
+        return [(0.0, pk) for pk in queryset.values_list("pk", flat=True)[:limit]]
+
+    sql = f"SELECT {_bm25()} AS score, rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    params = [expression]
+    if after is not None:
+        sql += " AND (score > %s OR (score = %s AND rowid > %s))"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY score, rowid"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def count(query: str) -> int:
+    """Number of recipes matching ``query``, cached until recipes change."""
+    expression = build_match_expression(query)
+    if not expression:
+        return 0
+    return pagination.cached_count(f"search:{expression}", match_queryset(query).count)
+
+
+def search_page(query: str, sort: str = "relevance", cursor: str | None = None,
+                size: int = pagination.DEFAULT_PAGE_SIZE) -> pagination.Page:
+    """Return one keyset page of search results.
+
+    ``sort`` is ``"relevance"`` or any ordering in ``pagination.ORDERINGS``.
+    """
+    if sort in pagination.ORDERINGS:
+        return pagination.paginate(match_queryset(query), sort, cursor, size)
+
+    after = None
+    if cursor:
+        score, pk = pagination.decode_cursor(cursor, 2)
+        try:
+            after = (float(score), int(pk))
+            # An id outside the column's range would fail when bound.
+            Recipe._meta.pk.run_validators(after[1])
+        except (TypeError, ValueError, ValidationError) as exc:
+            raise pagination.InvalidCursor(cursor) from exc
+    rows = ranked_ids(query, size + 1, after)
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = pagination.encode_cursor(rows[-1])
+    recipes = Recipe.objects.in_bulk([pk for _, pk in rows])
+    return pagination.Page([recipes[pk] for _, pk in rows if pk in recipes], next_cursor)
+
+
+def fallback_queryset(query: str):
+    """The unindexed substring scan used where FTS5 is unavailable."""
+    return Recipe.objects.filter(
+        Q(title__icontains=query)
+        | Q(subtitle__icontains=query)
+        | Q(short_description__icontains=query)
+        | Q(ingredients__icontains=query)
+        | Q(directions__icontains=query)
+    ).distinct()
@@ -0,0 +1,231 @@
+"""Serving scaler and shopping-list aggregator.
+
+A meal plan is a list of ``(slug, servings)`` pairs. The parsed
+``RecipeIngredient`` rows of every recipe in it are read with one query
+and combined in a single batch. Each quantity is multiplied by its
+recipe's scale factor and by its unit's size in a base unit (millilitres
+for volume, grams for weight), then summed per ingredient and kind of
+unit, and shown in the largest unit the recipes used. With NumPy installed
+that is a fixed handful of array operations however many recipes the plan
+holds; without it the same sums run in a plain loop.
+
+Units without a conversion (cloves, cans, pinches) only add up with
+themselves, and lines without a quantity ("salt and pepper") are listed
+once with no amount.
+"""
+
+import math
+from dataclasses import dataclass
+
+from .models import Recipe, RecipeIngredient
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the plain loop gives the same lists, only slower.
+    np = None
+
+MAX_RECIPES = 500
+MAX_SERVINGS = 1000
+
+VOLUME = "volume"
+WEIGHT = "weight"
+
+# unit -> (dimension, size in the dimension's base unit: ml or g)
+CONVERSIONS = {
+    "tsp": (VOLUME, 4.92892),
+    "tbsp": (VOLUME, 14.7868),
+    "cup": (VOLUME, 236.588),
+    "pint": (VOLUME, 473.176),
+    "quart": (VOLUME, 946.353),
+    "ml": (VOLUME, 1.0),
+    "l": (VOLUME, 1000.0),
+    "g": (WEIGHT, 1.0),
+    "kg": (WEIGHT, 1000.0),
+    "oz": (WEIGHT, 28.3495),
+    "lb": (WEIGHT, 453.592),
+}
+
+
+class InvalidPlan(ValueError):
+    pass
+
+
+@dataclass
+class ShoppingItem:
+    name: str
+    quantity: float | None
+    unit: str
+    # How many recipes of the plan use it.
+    recipes: int
+
+    def as_dict(self) -> dict:
+        quantity = None if self.quantity is None else round(self.quantity, 2)
+        return {"name": self.name, "quantity": quantity, "unit": self.unit, "recipes": self.recipes}
+
+
+def conversion(unit: str) -> tuple:
+    """``(dimension, size)``; a unit without a conversion is its own dimension."""
+    return CONVERSIONS.get(unit, (unit, 1.0))
+
+
+def _codes(values) -> tuple:
+    """``(distinct values, code of each value)``, codes in order of first appearance."""
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return list(index), codes
+
+
+def _display_units(units) -> dict:
+    """``(dimension, size) -> unit`` for ``units``; the first unit of a size wins."""
+    found = {}
+    for unit in units:
+        found.setdefault(conversion(unit), unit)
+    return found
+
+
+def _aggregate_arrays(rows, factors) -> list:
+    recipe_index, quantities, units, names = zip(*rows)
+    names, name_codes = _codes(names)
+    units, unit_codes = _codes(units)
+    dimensions, unit_dimension = _codes(conversion(unit)[0] for unit in units)
+    unit_size = np.array([conversion(unit)[1] for unit in units])
+
+    recipe_index = np.array(recipe_index)
+    unit_codes = np.array(unit_codes)
+    quantity = np.array([math.nan if value is None else value for value in quantities], dtype=float)
+    known = ~np.isnan(quantity)
+    size = unit_size[unit_codes]
+    amount = np.where(known, quantity * np.asarray(factors, dtype=float)[recipe_index] * size, 0.0)
+
+    # One group per ingredient name and dimension.
+    group = np.array(name_codes) * len(dimensions) + np.array(unit_dimension)[unit_codes]
+    keys, inverse = np.unique(group, return_inverse=True)
+    totals = np.bincount(inverse, weights=amount, minlength=len(keys))
+    quantified = np.bincount(inverse, weights=known, minlength=len(keys)) > 0
+    largest = np.zeros(len(keys))
+    np.maximum.at(largest, inverse[known], size[known])
+    pairs = np.unique(inverse * len(factors) + recipe_index)
+    recipes = np.bincount(pairs // len(factors), minlength=len(keys))
+
+    by_size = _display_units(units)
+    items = []
+    for position, key in enumerate(keys.tolist()):
+        dimension = dimensions[key % len(dimensions)]
+        if quantified[position]:
+            unit = by_size[(dimension, float(largest[position]))]
+            quantity = float(totals[position] / largest[position])
+        else:
+            unit, quantity = "", None
+        items.append(ShoppingItem(names[key // len(dimensions)], quantity, unit, int(recipes[position])))
+    return items
+
+
+def _aggregate_loop(rows, factors) -> list:
+    # (name, dimension) -> [total in base units, largest size, recipe indexes]
+    groups = {}
+    units = set()
+    for recipe_index, quantity, unit, name in rows:
+        dimension, size = conversion(unit)
+        group = groups.setdefault((name, dimension), [0.0, 0.0, set()])
+        group[2].add(recipe_index)
+        if quantity is not None:
+            group[0] += quantity * factors[recipe_index] * size
+            group[1] = max(group[1], size)
+            units.add(unit)
+    by_size = _display_units(units)
+    items = []
+    for (name, dimension), (total, largest, recipes) in groups.items():
+        if largest:
+            items.append(ShoppingItem(name, total / largest, by_size[(dimension, largest)], len(recipes)))
+        else:
+            items.append(ShoppingItem(name, None, "", len(recipes)))
+    return items
+
+
+def aggregate(rows, factors) -> list:
+    """Scale and combine ingredient rows into ``ShoppingItem``s sorted by name.
+
+    ``rows`` are ``(recipe index, quantity, unit, name)`` tuples and
+    ``factors[recipe index]`` is how many times that recipe is made.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    items = _aggregate_arrays(rows, factors) if np is not None else _aggregate_loop(rows, factors)
+    # Unquantified lines of one name in several kinds of unit share the
+    # empty unit, so the rest of the key keeps both code paths in one order.
+    items.sort(key=lambda item: (item.name, item.unit, item.quantity is None, item.recipes))
+    return items
+
+
+def parse_plan(data) -> list:
+    """``[(slug, servings or None)]`` from ``[{"slug": ..., "servings": ...}]``."""
+    if not isinstance(data, list) or not data or len(data) > MAX_RECIPES:
+        raise InvalidPlan(f"Send a list of 1 to {MAX_RECIPES} recipes in 'recipes'.")
+    plan = []
+    for entry in data:
+        if isinstance(entry, str):
+            entry = {"slug": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("slug"), str):
+            raise InvalidPlan("Each recipe needs a 'slug'.")
+        servings = entry.get("servings")
+        if servings is not None and (
+            isinstance(servings, bool) or not isinstance(servings, (int, float)) or not 0 < servings <= MAX_SERVINGS
+        ):
+            raise InvalidPlan(f"'servings' must be a number between 0 and {MAX_SERVINGS}.")
+        plan.append((entry["slug"], servings))
+    return plan
+
+
+def _scale(plan, recipes: dict) -> tuple:
+    """``(recipe ids, factors, summaries)``; a recipe planned twice is made twice."""
+    ids, factors, summaries = [], [], []
+    position = {}
+    for slug, servings in plan:
+        recipe = recipes.get(slug)
+        if recipe is None:
+            continue
+        base = recipe["servings"] or 1
+        factor = (servings or base) / base
+        if recipe["id"] not in position:
+            position[recipe["id"]] = len(ids)
+            ids.append(recipe["id"])
+            factors.append(0.0)
+        factors[position[recipe["id"]]] += factor
+        summaries.append(
+            {"slug": slug, "title": recipe["title"], "servings": servings or base, "factor": round(factor, 4)}
+        )
+    return ids, factors, summaries
+
+
+def _payload(plan, recipes: dict, ids: list, factors: list, summaries: list, rows) -> dict:
+    position = {pk: index for index, pk in enumerate(ids)}
+    items = aggregate(((position[recipe_id], *rest) for recipe_id, *rest in rows), factors)
+    return {
+        "recipes": summaries,
+        "missing": [slug for slug, _ in plan if slug not in recipes],
+        "items": [item.as_dict() for item in items],
+    }
+
+
+def _recipe_rows(plan):
+    return Recipe.objects.filter(slug__in={slug for slug, _ in plan}).values("id", "slug", "title", "servings")
+
+
+def _ingredient_rows(ids):
+    return RecipeIngredient.objects.filter(recipe_id__in=ids).values_list("recipe_id", "quantity", "unit", "name")
+
+
+def shopping_list(plan) -> dict:
+    """The combined, scaled shopping list for ``plan`` (see ``parse_plan``)."""
+    recipes = {row["slug"]: row for row in _recipe_rows(plan)}
+    ids, factors, summaries = _scale(plan, recipes)
+    rows = list(_ingredient_rows(ids)) if ids else []
+    return _payload(plan, recipes, ids, factors, summaries, rows)
+
+
+async def ashopping_list(plan) -> dict:
+    recipes = {row["slug"]: row async for row in _recipe_rows(plan)}
+    ids, factors, summaries = _scale(plan, recipes)
+    rows = [row async for row in _ingredient_rows(ids)] if ids else []
+    return _payload(plan, recipes, ids, factors, summaries, rows)
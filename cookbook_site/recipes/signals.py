@@ -0,0 +1,55 @@
+import copy
+
+from django.db import connections, transaction
+
+from . import detail_cache, home_cache, indexing, knowledge, related, search, tasks, voice_cache
+from .models import ChangeStamp
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """Put back FTS triggers that a migration's table rebuild dropped."""
+    search.ensure_triggers(connections[using])
+
+
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    version = ChangeStamp.bump(ChangeStamp.RECIPES)
+    slugs = [instance.slug]
+    if not raw and not created:
+        # Pages listing it show its title and link to its slug.
+        slugs += [slug for _, slug in related.touch_listing(instance)]
+    # A copy, as the instance may change again before the commit.
+    recipe = copy.copy(instance)
+    transaction.on_commit(lambda: _recipe_saved(recipe, version, created, slugs))
+    if not raw:
+        tasks.recipe_changed(instance)
+
+
+def _recipe_saved(recipe, version, created, slugs):
+    indexing.recipe_saved(recipe, version)
+    voice_cache.recipe_saved(recipe, version)
+    home_cache.invalidate(recipe, version, created=created)
+    detail_cache.invalidate(*slugs)
+
+
+def recipe_deleting(sender, instance, **kwargs):
+    tasks.recipe_removing(instance)
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    version = ChangeStamp.bump(ChangeStamp.RECIPES)
+    # Deleting clears the instance's pk once the signals have run.
+    recipe = copy.copy(instance)
+    transaction.on_commit(lambda: _recipe_deleted(recipe, version))
+
+
+def _recipe_deleted(recipe, version):
+    indexing.recipe_deleted(recipe, version)
+    voice_cache.recipe_deleted(recipe, version)
+    home_cache.invalidate(recipe, version, deleted=True)
+    detail_cache.invalidate(recipe.slug)
+
+
+def knowledge_changed(sender, instance, **kwargs):
+    ChangeStamp.bump(ChangeStamp.KNOWLEDGE)
+    # The file is written in a thread once the new stamp is visible to it.
+    transaction.on_commit(knowledge.rebuild)
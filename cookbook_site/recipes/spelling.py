@@ -0,0 +1,173 @@
+"""Trigram "did you mean" corrections for searches and voice queries.
+
+Texts are split into the three-character grams ``pg_trgm`` uses (each word
+padded with two spaces in front and one behind) and kept in an inverted
+index from gram to entries. A lookup counts shared grams through the
+postings of the query's rarer grams only, then scores the best few
+candidates by trigram similarity, so a typo costs a handful of posting
+lists instead of a scan of every title.
+
+Recipe titles are indexed per process through ``indexing.ProcessIndex``.
+The index of knowledge-base keys is the snapshot's ``grams`` table, written
+with it by ``knowledge_tables``, so the async voice path needs no database
+and no worker builds a copy.
+"""
+
+import re
+from array import array
+from collections import Counter
+
+from . import knowledge
+from .indexing import ProcessIndex, StampedIndex
+from .models import ChangeStamp, Recipe
+
+# pg_trgm's default similarity threshold.
+THRESHOLD = 0.3
+# Grams in more entries than this are skipped while collecting candidates.
+MAX_POSTINGS = 5000
+# Candidates scored exactly after the gram count.
+CANDIDATES = 50
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text: str) -> set:
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[index : index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+def similarity(first: set, second: set) -> float:
+    if not first or not second:
+        return 0.0
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+
+class TrigramIndex:
+    def __init__(self):
+        # entry id -> (label, ref); None once removed.
+        self._entries = []
+        self._postings = {}
+
+    def add(self, label: str, ref) -> int:
+        entry_id = len(self._entries)
+        self._entries.append((label, ref))
+        for gram in trigrams(label):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("I")
+            postings.append(entry_id)
+        return entry_id
+
+    def remove(self, entry_id: int) -> None:
+        # Postings keep the id; lookups skip removed entries.
+        self._entries[entry_id] = None
+
+    def lookup(self, text: str, limit: int = 3, threshold: float = THRESHOLD) -> list:
+        """``(similarity, label, ref)`` for the closest entries, best first."""
+        grams = trigrams(text)
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        return _closest(grams, postings, self._entries.__getitem__, limit, threshold)
+
+
+def _closest(grams: set, postings: list, entry, limit: int, threshold: float) -> list:
+    """Score the entries in the ``postings`` of ``grams``; ``entry(id)`` is ``(label, ref)`` or None."""
+    postings = sorted(postings, key=len)
+    if not postings:
+        return []
+    usable = [entries for entries in postings if len(entries) <= MAX_POSTINGS] or postings[:3]
+    counts = Counter()
+    for entries in usable:
+        counts.update(entries)
+    results = []
+    for entry_id, _ in counts.most_common(CANDIDATES):
+        found = entry(entry_id)
+        if found is None:
+            continue
+        score = similarity(grams, trigrams(found[0]))
+        if score >= threshold:
+            results.append((score, found[0], found[1]))
+    results.sort(key=lambda result: (-result[0], result[1]))
+    return results[:limit]
+
+
+class TitleIndex(StampedIndex):
+    """Recipe titles, with the recipe's pk and slug as each entry's ``ref``."""
+
+    def __init__(self, version: int = 0):
+        super().__init__(version)
+        self.trigrams = TrigramIndex()
+        self._entry_ids = {}
+
+    @classmethod
+    def build(cls) -> "TitleIndex":
+        index = cls(ChangeStamp.current(ChangeStamp.RECIPES).version)
+        for pk, title, slug in Recipe.objects.values_list("pk", "title", "slug").iterator(chunk_size=5000):
+            index._entry_ids[pk] = index.trigrams.add(title, (pk, slug))
+        return index
+
+    def apply_saved(self, recipe) -> None:
+        self.apply_deleted(recipe)
+        self._entry_ids[recipe.pk] = self.trigrams.add(recipe.title, (recipe.pk, recipe.slug))
+
+    def apply_deleted(self, recipe) -> None:
+        entry_id = self._entry_ids.pop(recipe.pk, None)
+        if entry_id is not None:
+            self.trigrams.remove(entry_id)
+
+    def lookup(self, text: str, limit: int = 3) -> list:
+        with self._lock:
+            return self.trigrams.lookup(text, limit)
+
+
+_titles = ProcessIndex("spelling", TitleIndex)
+
+
+def knowledge_tables(keys: list) -> dict:
+    """The snapshot's ``grams`` table: each gram with the indexes of the ``keys`` holding it."""
+    postings = {}
+    for index, key in enumerate(keys):
+        for gram in trigrams(key):
+            postings.setdefault(gram, []).append(index)
+    return {"grams": list(postings.items())}
+
+
+def ingredient_corrections(text: str, limit: int = 3, snapshot=None) -> list:
+    """Knowledge-base keys close to ``text``, as ``(similarity, key, key)``."""
+    if snapshot is None:
+        snapshot = knowledge.snapshot()
+    grams = trigrams(text)
+    postings = []
+    for gram in grams:
+        index = snapshot.grams.find(gram.encode("utf-8"))
+        if index != -1:
+            postings.append(snapshot.postings(index))
+
+    def entry(index):
+        key = snapshot.key(index)
+        return key, key
+
+    return _closest(grams, postings, entry, limit, THRESHOLD)
+
+
+def recipe_corrections(text: str, limit: int = 3) -> list:
+    """Recipe titles close to ``text``, as ``(similarity, title, (pk, slug))``."""
+    return _titles.get().lookup(text, limit)
+
+
+async def arecipe_corrections(text: str, limit: int = 3) -> list:
+    return (await _titles.aget()).lookup(text, limit)
+
+
+def did_you_mean(text: str, limit: int = 3) -> list:
+    """Recipe titles and ingredient keys close to ``text``, best first."""
+    found = recipe_corrections(text, limit) + ingredient_corrections(text, limit)
+    found.sort(key=lambda result: -result[0])
+    labels = []
+    for _, label, _ in found:
+        if label not in labels:
+            labels.append(label)
+    return labels[:limit]
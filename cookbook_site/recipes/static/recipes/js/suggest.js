@@ -0,0 +1,91 @@
+document.addEventListener("DOMContentLoaded", () => {
+  const DEBOUNCE_MS = 120;
+
+  document.querySelectorAll("input[data-suggest-url]").forEach((input) => {
+    const form = input.form;
+    const list = document.createElement("ul");
+    list.className = "suggestions";
+    list.id = `${input.name}-suggestions-${Math.random().toString(36).slice(2, 8)}`;
+    list.setAttribute("role", "listbox");
+    list.hidden = true;
+    form.classList.add("has-suggestions");
+    form.appendChild(list);
+    input.setAttribute("autocomplete", "off");
+    input.setAttribute("aria-controls", list.id);
+
+    let timer = null;
+    let controller = null;
+    let activeIndex = -1;
+
+    const items = () => Array.from(list.querySelectorAll("a"));
+
+    const close = () => {
+      list.hidden = true;
+      activeIndex = -1;
+    };
+
+    const highlight = (index) => {
+      const links = items();
+      activeIndex = (index + links.length) % links.length;
+      links.forEach((link, linkIndex) => {
+        link.setAttribute("aria-selected", linkIndex === activeIndex ? "true" : "false");
+      });
+    };
+
+    const show = (suggestions) => {
+      list.replaceChildren(
+        ...suggestions.map((suggestion) => {
+          const item = document.createElement("li");
+          const link = document.createElement("a");
+          link.href = suggestion.url;
+          link.setAttribute("role", "option");
+          link.dataset.type = suggestion.type;
+          link.textContent = suggestion.label;
+          item.appendChild(link);
+          return item;
+        })
+      );
+      list.hidden = suggestions.length === 0;
+      activeIndex = -1;
+    };
+
+    const fetchSuggestions = async () => {
+      const query = input.value.trim();
+      controller?.abort();
+      if (query.length < 2) {
+        close();
+        return;
+      }
+      controller = new AbortController();
+      try {
+        const url = `${input.dataset.suggestUrl}?${new URLSearchParams({ q: query })}`;
+        const response = await fetch(url, { signal: controller.signal });
+        if (response.ok) {
+          show((await response.json()).suggestions);
+        }
+      } catch (error) {
+        if (error.name !== "AbortError") close();
+      }
+    };
+
+    input.addEventListener("input", () => {
+      window.clearTimeout(timer);
+      timer = window.setTimeout(fetchSuggestions, DEBOUNCE_MS);
+    });
+
+    input.addEventListener("keydown", (event) => {
+      if (list.hidden) return;
+      if (event.key === "ArrowDown" || event.key === "ArrowUp") {
+        event.preventDefault();
+        highlight(activeIndex + (event.key === "ArrowDown" ? 1 : -1));
+      } else if (event.key === "Enter" && activeIndex >= 0) {
+        event.preventDefault();
+        window.location.href = items()[activeIndex].href;
+      } else if (event.key === "Escape") {
+        close();
+      }
+    });
+
+    input.addEventListener("blur", () => window.setTimeout(close, 150));
+  });
+});
@@ -0,0 +1,233 @@
+"""Static files storage that minifies and precompresses what it collects.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` fingerprints
+file names as ``ManifestStaticFilesStorage`` does, strips comments and
+redundant whitespace from CSS, JavaScript and SVG, and writes ``.gz`` (and,
+when the ``brotli`` package is installed, ``.br``) siblings next to every
+text asset. ``middleware.StaticAssetMiddleware`` serves the result.
+
+The minifiers are deliberately conservative: they only remove comments and
+whitespace, never rename or reorder anything, and leave string and template
+literal contents alone.
+"""
+
+import gzip
+import os
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip alone is still a big saving.
+    brotli = None
+
+# Suffix of each precompressed sibling, by content coding.
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".xml", ".html", ".map"}
+
+# A sibling is only written when it is at least this much smaller.
+MIN_SAVING = 0.05
+
+_CSS_COMMENT = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*(?!!).*?\*/""", re.S)
+_CSS_SPACE = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|\s+""")
+# Whitespace next to these never matters; ``:`` only counts on its left.
+_CSS_TIGHT = set("{};,>")
+
+_SVG_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_SVG_BETWEEN_TAGS = re.compile(r">\s+<")
+
+_JS_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^") | {""}
+
+
+def minify_css(source: str) -> str:
+    source = _CSS_COMMENT.sub(lambda match: match.group(1) or " ", source)
+
+    def space(match):
+        if match.group(1):
+            return match.group(1)
+        before = source[match.start() - 1 : match.start()]
+        after = source[match.end() : match.end() + 1]
+        if not before or not after or before in _CSS_TIGHT or before == ":" or after in _CSS_TIGHT:
+            return ""
+        return " "
+
+    return _CSS_SPACE.sub(space, source)
+
+
+def minify_svg(source: str) -> str:
+    source = _SVG_COMMENT.sub("", source)
+    # Whitespace between <tspan>s or under xml:space="preserve" is rendered.
+    if "<tspan" not in source and "xml:space" not in source:
+        source = _SVG_BETWEEN_TAGS.sub("><", source)
+    return source.strip()
+
+
+def _skip_quoted(source: str, start: int, quote: str) -> int:
+    """The index just past the string or regex literal opening at ``start``."""
+    index = start + 1
+    in_class = False
+    while index < len(source):
+        char = source[index]
+        if char == "\\":
+            index += 2
+            continue
+        if char == "\n" and quote != "`":
+            return -1
+        if quote == "/" and char in "[]":
+            in_class = char == "["
+        elif char == quote and not in_class:
+            return index + 1
+        index += 1
+    return -1
+
+
+def _append_space(out: list, skipped: str) -> None:
+    """Stand in for skipped whitespace or a comment, merging with any before it."""
+    space = "\n" if "\n" in skipped else " "
+    if out and out[-1] in (" ", "\n"):
+        out[-1] = "\n" if "\n" in (out[-1], space) else " "
+    else:
+        out.append(space)
+
+
+def minify_js(source: str) -> str:
+    """Drop comments and collapse whitespace, keeping line breaks.
+
+    Keeping a newline wherever the source had one leaves automatic
+    semicolon insertion exactly as it was.
+    """
+    out = []
+    # One open-brace count per ``${`` we are inside of.
+    templates = []
+    last = ""
+    index = 0
+    length = len(source)
+    while index < length:
+        char = source[index]
+        if char == "`" or (char == "}" and templates and templates[-1] == 0):
+            # A template literal, or the rest of one after a ``${...}``.
+            if char == "}":
+                templates.pop()
+            end = index + 1
+            while end < length:
+                if source[end] == "\\":
+                    end += 2
+                elif source[end] == "`":
+                    end += 1
+                    break
+                elif source.startswith("${", end):
+                    end += 2
+                    templates.append(0)
+                    break
+                else:
+                    end += 1
+            out.append(source[index:end])
+            last = "`"
+            index = end
+        elif char in "'\"" or (char == "/" and last in _JS_REGEX_AFTER and source[index + 1 : index + 2] not in "/*"):
+            end = _skip_quoted(source, index, char)
+            if end == -1:
+                # Not a literal after all (a division), or unterminated.
+                out.append(char)
+                last = char
+                index += 1
+            else:
+                out.append(source[index:end])
+                last = char
+                index = end
+        elif source.startswith("//", index):
+            end = source.find("\n", index)
+            index = length if end == -1 else end
+        elif source.startswith("/*", index):
+            end = source.find("*/", index + 2)
+            end = length if end == -1 else end + 2
+            _append_space(out, source[index:end])
+            index = end
+        elif char.isspace():
+            end = index
+            while end < length and source[end].isspace():
+                end += 1
+            _append_space(out, source[index:end])
+            index = end
+        else:
+            if templates and char == "{":
+                templates[-1] += 1
+            elif templates and char == "}":
+                templates[-1] -= 1
+            out.append(char)
+            last = char
+            index += 1
+    if templates:
+        # Unbalanced template literals: leave the file as it was.
+        return source
+    return "".join(out).strip()
+
+
+MINIFIERS = {
+    ".css": minify_css,
+    ".js": minify_js,
+    ".svg": minify_svg,
+}
+
+
+def compressed_variants(data: bytes) -> dict:
+    """``{suffix: bytes}`` for each encoding that is worth serving."""
+    variants = {ENCODINGS["gzip"]: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[ENCODINGS["br"]] = brotli.compress(data, mode=brotli.MODE_TEXT)
+    return {suffix: body for suffix, body in variants.items() if len(body) <= len(data) * (1 - MIN_SAVING)}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` that minifies and precompresses on save.
+
+    Both the plain and the hashed copy of each file go through ``_save``,
+    so both are minified and get compressed siblings. The content hash is
+    taken from the source file, which changes whenever the output does.
+    """
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        if extension not in COMPRESSIBLE or name == self.manifest_name:
+            return super()._save(name, content)
+        # Hashing may have read the file already.
+        content.seek(0)
+        data = content.read()
+        minify = MINIFIERS.get(extension)
+        if minify is not None:
+            try:
+                data = minify(data.decode("utf-8")).encode("utf-8")
+            except UnicodeDecodeError:
+                pass
+        name = super()._save(name, ContentFile(data))
+        self._write_variants(name, data)
+        return name
+
+    def _write_variants(self, name: str, data: bytes) -> None:
+        variants = compressed_variants(data)
+        for suffix in ENCODINGS.values():
+            path = self.path(name) + suffix
+            if suffix in variants:
+                with open(path, "wb") as stream:
+                    stream.write(variants[suffix])
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def delete(self, name):
+        super().delete(name)
+        for suffix in ENCODINGS.values():
+            if os.path.exists(self.path(name) + suffix):
+                os.remove(self.path(name) + suffix)
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            if self.hashed_files:
+                raise
+            # No manifest: collectstatic has not run (tests, a fresh
+            # checkout), so link to the unhashed file instead of failing.
+            return self._url(lambda clean_name, *args: clean_name, name, force)
@@ -0,0 +1,191 @@
+"""In-memory prefix index behind the search box typeahead.
+
+Recipe titles, ingredient names and knowledge-base keys are kept in sorted
+lists of ``(key, ...)`` tuples with one key per word start, so "pas" finds
+"Creamy Garlic Pasta". A lookup is a ``bisect`` to the first key with the
+prefix followed by a scan of at most ``SCAN_LIMIT`` entries per kind, which
+keeps each keystroke well under a millisecond however many recipes there
+are.
+
+The index lives in ``indexing.ProcessIndex``, which keeps it in step with
+recipe changes. Ingredient names that no recipe uses any more are only
+dropped when it is next rebuilt. Knowledge-base keys are read from the
+snapshot's ``prefixes`` table, written with it by ``knowledge_tables``.
+"""
+
+from bisect import bisect_left, insort
+from urllib.parse import urlencode
+
+from django.db.models import Count
+from django.urls import reverse
+
+from . import knowledge
+from .indexing import ProcessIndex, StampedIndex
+from .ingredients import parse_lines
+from .models import ChangeStamp, Recipe, RecipeIngredient
+from .voice import normalize
+
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Candidates looked at per kind before ranking.
+SCAN_LIMIT = 50
+# Longer keys are cut to this; a longer query is checked against the full text.
+KEY_LENGTH = 32
+STOP_WORDS = frozenset({"a", "an", "and", "the", "with", "of", "in", "on", "or"})
+
+RECIPE = "recipe"
+INGREDIENT = "ingredient"
+KNOWLEDGE = "knowledge"
+KINDS = (RECIPE, INGREDIENT, KNOWLEDGE)
+
+
+def word_keys(text: str):
+    """``(position, key)`` for the text from each word that is not a stop word."""
+    words = normalize(text).split()
+    for position, word in enumerate(words):
+        if position == 0 or word not in STOP_WORDS:
+            yield position, " ".join(words[position:])[:KEY_LENGTH]
+
+
+class SuggestIndex(StampedIndex):
+    def __init__(self, version: int = 0):
+        super().__init__(version)
+        # kind -> sorted [(key, position, ref)]; knowledge keys come from the snapshot.
+        self._entries = {RECIPE: [], INGREDIENT: []}
+        self._titles = {}  # recipe pk -> (title, slug)
+        self._ingredient_counts = {}
+
+    @classmethod
+    def build(cls) -> "SuggestIndex":
+        version = ChangeStamp.current(ChangeStamp.RECIPES).version
+        index = cls(version)
+        titles = index._entries[RECIPE]
+        for pk, title, slug in Recipe.objects.values_list("pk", "title", "slug").iterator(chunk_size=5000):
+            index._titles[pk] = (title, slug)
+            titles.extend((key, position, pk) for position, key in word_keys(title))
+        counts = RecipeIngredient.objects.values_list("name").annotate(recipes=Count("recipe", distinct=True))
+        for name, recipes in counts.iterator(chunk_size=5000):
+            index._add_ingredient(name, recipes, sort=False)
+        for entries in index._entries.values():
+            entries.sort()
+        return index
+
+    def _add_ingredient(self, name: str, recipes: int = 1, sort: bool = True) -> None:
+        if not name:
+            return
+        if name in self._ingredient_counts:
+            self._ingredient_counts[name] = max(self._ingredient_counts[name], recipes)
+            return
+        self._ingredient_counts[name] = recipes
+        for position, key in word_keys(name):
+            if sort:
+                insort(self._entries[INGREDIENT], (key, position, name))
+            else:
+                self._entries[INGREDIENT].append((key, position, name))
+
+    def _remove_recipe(self, pk: int) -> None:
+        old = self._titles.pop(pk, None)
+        if old is None:
+            return
+        titles = self._entries[RECIPE]
+        for position, key in word_keys(old[0]):
+            at = bisect_left(titles, (key, position, pk))
+            if at < len(titles) and titles[at] == (key, position, pk):
+                del titles[at]
+
+    def apply_saved(self, recipe) -> None:
+        self._remove_recipe(recipe.pk)
+        self._titles[recipe.pk] = (recipe.title, recipe.slug)
+        for position, key in word_keys(recipe.title):
+            insort(self._entries[RECIPE], (key, position, recipe.pk))
+        for parsed in parse_lines(recipe.ingredients):
+            self._add_ingredient(parsed.name)
+
+    def apply_deleted(self, recipe) -> None:
+        self._remove_recipe(recipe.pk)
+
+    def _rows(self, kind: str, prefix: str, snapshot):
+        """``(position, ref)`` for the keys of ``kind`` starting with ``prefix``, in key order."""
+        if kind == KNOWLEDGE:
+            if snapshot is None:
+                return
+            table = snapshot.prefixes
+            for at in table.prefixed(prefix.encode("utf-8")):
+                position, index = table.values(at)
+                yield position, snapshot.key(index)
+            return
+        entries = self._entries[kind]
+        at = bisect_left(entries, (prefix,))
+        while at < len(entries) and entries[at][0].startswith(prefix):
+            yield entries[at][1:]
+            at += 1
+
+    def _candidates(self, rows) -> list:
+        found = {}
+        for position, ref in rows:
+            if len(found) >= SCAN_LIMIT:
+                break
+            # A word start beats a later word of the same text.
+            if ref not in found or position < found[ref]:
+                found[ref] = position
+        return list(found.items())
+
+    def suggest(self, query: str, limit: int = DEFAULT_LIMIT, snapshot=None) -> list:
+        """Ranked suggestions, knowledge-base keys from ``snapshot``."""
+        query = normalize(query)
+        if len(query) < MIN_QUERY_LENGTH:
+            return []
+        ranked = []
+        with self._lock:
+            for kind_rank, kind in enumerate(KINDS):
+                for ref, position in self._candidates(self._rows(kind, query[:KEY_LENGTH], snapshot)):
+                    if kind == RECIPE:
+                        label, popularity = self._titles[ref][0], 0
+                    elif kind == INGREDIENT:
+                        label, popularity = ref, self._ingredient_counts.get(ref, 0)
+                    else:
+                        label, popularity = ref, 0
+                    if len(query) > KEY_LENGTH and query not in normalize(label):
+                        continue
+                    # Matches at the start of the text first, then recipes,
+                    # ingredients and knowledge, then popular and short ones.
+                    rank = (position > 0, kind_rank, -popularity, len(label), label)
+                    ranked.append((rank, kind, ref, label))
+            ranked.sort(key=lambda item: item[0])
+            top, seen = [], set()
+            for _, kind, ref, label in ranked:
+                # An ingredient that is also a knowledge key is offered once, as the better-ranked kind.
+                if normalize(label) in seen:
+                    continue
+                seen.add(normalize(label))
+                top.append((kind, ref, label, self._titles.get(ref)))
+                if len(top) >= limit:
+                    break
+        return [{"type": kind, "label": label, "url": _url(kind, ref, title)} for kind, ref, label, title in top]
+
+
+def _url(kind: str, ref, title) -> str:
+    if kind == RECIPE:
+        return reverse("recipes:detail", args=[title[1]])
+    field = "ingredient" if kind == INGREDIENT else "q"
+    return f"{reverse('recipes:search')}?{urlencode({field: ref})}"
+
+
+_index = ProcessIndex("suggest", SuggestIndex)
+
+
+def knowledge_tables(keys: list) -> dict:
+    """The snapshot's ``prefixes`` table: ``word_keys`` of the sorted ``keys``."""
+    return {
+        "prefixes": [(key, (position, index)) for index, name in enumerate(keys) for position, key in word_keys(name)]
+    }
+
+
+def suggest(query: str, limit: int = DEFAULT_LIMIT) -> list:
+    return _index.get().suggest(query, limit, knowledge.snapshot())
+
+
+async def asuggest(query: str, limit: int = DEFAULT_LIMIT) -> list:
+    index = await _index.aget()
+    return index.suggest(query, limit, await knowledge.asnapshot())
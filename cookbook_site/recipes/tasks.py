@@ -0,0 +1,62 @@
+"""Background tasks run by the job queue (see ``recipes.jobs``)."""
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from . import detail_cache, home_cache, images, jobs, related
+from .models import Recipe
+
+PROCESS_IMAGE = "recipes.process_image"
+WARM_HOME = "recipes.warm_home"
+UPDATE_RELATED = "recipes.update_related"
+REBUILD_RELATED = "recipes.rebuild_related"
+
+
+@jobs.task(PROCESS_IMAGE)
+def process_image(recipe_id: int) -> None:
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    # refresh() bumps the recipes stamp, which retires the cached sections.
+    if recipe is not None and images.refresh(recipe):
+        warm_home()
+
+
+@jobs.task(WARM_HOME)
+def warm_home() -> None:
+    # A per-process cache filled by a worker would never be read.
+    if not isinstance(caches["default"], LocMemCache):
+        home_cache.get_sections()
+
+
+@jobs.task(UPDATE_RELATED)
+def update_related(recipe_ids: list) -> None:
+    for recipe_id in recipe_ids:
+        related.update_recipe(recipe_id)
+
+
+@jobs.task(REBUILD_RELATED)
+def rebuild_related() -> None:
+    related.rebuild()
+
+
+def recipe_changed(recipe) -> None:
+    """Queue the follow-up work for a saved recipe."""
+    if not images.is_current(recipe):
+        # Keyed on the file name: one job per upload, however often it is saved.
+        name = recipe.uploaded_image.name
+        key = f"{PROCESS_IMAGE}:{recipe.pk}:{name}" if name else None
+        jobs.enqueue(PROCESS_IMAGE, {"recipe_id": recipe.pk}, key=key)
+    else:
+        # One waiting job covers every save made before a worker gets to it.
+        jobs.enqueue(WARM_HOME, key=WARM_HOME, pending_only=True)
+    jobs.enqueue(UPDATE_RELATED, {"recipe_ids": [recipe.pk]}, key=f"{UPDATE_RELATED}:{recipe.pk}", pending_only=True)
+
+
+def recipe_removing(recipe) -> None:
+    """Queue new lists for the recipes that list ``recipe``, before its rows cascade away."""
+    listing = related.touch_listing(recipe)
+    if listing:
+        # Their pages would otherwise keep linking to a recipe that is gone.
+        slugs = [slug for _, slug in listing]
+        transaction.on_commit(lambda: detail_cache.invalidate(*slugs))
+        jobs.enqueue(UPDATE_RELATED, {"recipe_ids": [pk for pk, _ in listing]})
@@ -0,0 +1,32 @@
+from django import template
+
+from .. import images
+
+register = template.Library()
+
+# How wide each kind of slot renders, for the browser's srcset choice.
+SIZES = {
+    "thumb": "160px",
+    "card": "(max-width: 640px) 100vw, 320px",
+    "hero": "(max-width: 720px) 100vw, 550px",
+    "detail": "(max-width: 1100px) 100vw, 1100px",
+}
+
+# The derivative used as the plain ``src`` for browsers without srcset.
+FALLBACK = {"thumb": "thumb", "card": "card", "hero": "hero", "detail": "hero"}
+
+
+@register.inclusion_tag("recipes/includes/recipe_image.html")
+def recipe_image(recipe, slot="card"):
+    """Render a recipe's photo with ``srcset`` over its resized variants."""
+    context = {"recipe": recipe}
+    variants = recipe.image_variants
+    if recipe.uploaded_image and images.is_current(recipe) and variants.get("sizes"):
+        storage = recipe.uploaded_image.storage
+        context.update(
+            src=storage.url(variants["sizes"][FALLBACK[slot]]["src"]),
+            srcset=images.srcset(variants, "src", storage),
+            webp_srcset=images.srcset(variants, "webp", storage),
+            sizes=SIZES[slot],
+        )
+    return context
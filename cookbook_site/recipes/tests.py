@@ -1,3 +1,1301 @@
-from django.test import TestCase
+import json
+import math
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, transaction
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    api,
+    async_views,
+    detail_cache,
+    home_cache,
+    images,
+    jobs,
+    knowledge,
+    metrics,
+    popularity,
+    related,
+    search,
+    shopping,
+    spelling,
+    suggest,
+    tasks,
+    transfer,
+    views,
+    voice,
+    voice_cache,
+    warmup,
+)
+from .forms import RecipeForm
+from .management.commands import bench_views
+from .middleware import StaticAssetMiddleware
+from .ingredients import parse_line, parse_lines
+from .templatetags.recipe_images import recipe_image
+from .pagination import InvalidCursor, encode_cursor, paginate
+from .views import save_recipe
+from .models import ChangeStamp, IngredientInfo, Job, Recipe
+
+
+def make_recipe(title, ingredients="1 cup flour", description="A recipe.", **fields):
+    recipe = Recipe.objects.create(
+        title=title,
+        slug=fields.pop("slug", title.lower().replace(" ", "-")),
+        prep_time=10,
+        cook_time=20,
+        short_description=description,
+        ingredients=ingredients,
+        directions="Mix.\nCook.",
+        **fields,
+    )
+    recipe.sync_ingredients()
+    return recipe
+
+
+class CursorTests(TestCase):
+    # The datetime slot holds something else, or an id SQLite cannot bind.
+    BAD_CURSORS = [
+        encode_cursor(values)
+        for values in (
+            [None, 1],
+            [5, 1],
+            [[1], 1],
+            ["yesterday", 1],
+            ["2024-01-01T00:00:00+00:00", None],
+            ["2024-01-01T00:00:00+00:00", 10**30],
+            [1],
+        )
+    ] + ["not a cursor"]
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(5):
+            make_recipe(f"Soup {number}")
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page = paginate(Recipe.objects.all(), "newest", cursor, size=2)
+            seen.extend(recipe.pk for recipe in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(Recipe.objects.order_by("-created_at", "-id").values_list("pk", flat=True)))
+
+    def test_invalid_cursors(self):
+        for cursor in self.BAD_CURSORS:
+            with self.subTest(cursor):
+                with self.assertRaises(InvalidCursor):
+                    paginate(Recipe.objects.all(), "newest", cursor)
+
+    def test_invalid_relevance_cursors(self):
+        for values in ([None, 1], ["best", 1], [1.0, 10**30]):
+            with self.subTest(values), self.assertRaises(InvalidCursor):
+                search.search_page("soup", cursor=encode_cursor(values))
+
+    def test_views_ignore_invalid_cursors(self):
+        urls = (
+            reverse("recipes:home"),
+            reverse("recipes:search") + "?q=soup&sort=newest",
+            reverse("recipes:api_recipes"),
+        )
+        for cursor in self.BAD_CURSORS:
+            for url in urls:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {"cursor": cursor})
+                    self.assertIn(response.status_code, (200, 302, 400))
+
+
+class IngredientParsingTests(TestCase):
+    def test_quantities(self):
+        cases = {
+            "1 1/2 cups cherry tomatoes, halved": (1.5, "cup", "cherry tomato"),
+            "½ tsp salt": (0.5, "tsp", "salt"),
+            "2-3 cloves garlic": (2.0, "clove", "garlic"),
+            "pinch of salt": (None, "pinch", "salt"),
+        }
+        for line, expected in cases.items():
+            with self.subTest(line):
+                parsed = parse_line(line)
+                self.assertEqual((parsed.quantity, parsed.unit, parsed.name), expected)
+
+    def test_unusable_quantities(self):
+        for line in ("1/0 cup flour", "9" * 400 + " g flour", "9" * 5000 + " g flour"):
+            with self.subTest(line[:10]):
+                parsed = parse_line(line)
+                self.assertEqual((parsed.quantity, parsed.name, parsed.raw), (None, "flour", line))
+
+    def test_create_recipe_with_unusable_quantity(self):
+        response = self.client.post(
+            reverse("recipes:create"),
+            {
+                "title": "Flatbread",
+                "slug": "flatbread",
+                "short_description": "Quick bread.",
+                "prep_time": 5,
+                "cook_time": 10,
+                "servings": 2,
+                "ingredients": "1/0 cup flour\n1 cup water",
+                "directions": "Mix.\nBake.",
+            },
+        )
+        self.assertRedirects(response, reverse("recipes:detail", args=["flatbread"]), fetch_redirect_response=False)
+        items = Recipe.objects.get(slug="flatbread").ingredient_items.order_by("position")
+        self.assertEqual([item.quantity for item in items], [None, 1.0])
+
+
+class SaveRecipeTests(TransactionTestCase):
+    def test_locked_write_is_retried_once_uploaded(self):
+        image = BytesIO()
+        Image.new("RGB", (8, 8), "orange").save(image, "PNG")
+        form = RecipeForm(
+            {
+                "title": "Carrot Cake",
+                "slug": "carrot-cake",
+                "short_description": "Moist and spiced.",
+                "prep_time": 20,
+                "cook_time": 45,
+                "servings": 8,
+                "ingredients": "3 carrots\n2 cups flour",
+                "directions": "Mix.\nBake.",
+            },
+            {"uploaded_image": SimpleUploadedFile("cake.png", image.getvalue(), "image/png")},
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        sync_ingredients = Recipe.sync_ingredients
+        attempts = []
+
+        def locked_once(recipe):
+            attempts.append(recipe)
+            if len(attempts) == 1:
+                raise OperationalError("database is locked")
+            sync_ingredients(recipe)
+
+        storage_save = mock.patch.object(
+            FileSystemStorage, "save", autospec=True, side_effect=FileSystemStorage.save
+        )
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            with mock.patch.object(Recipe, "sync_ingredients", autospec=True, side_effect=locked_once):
+                with storage_save as save:
+                    recipe = save_recipe(form)
+            self.assertEqual(save.call_count, 1)
+        self.assertEqual(len(attempts), 2)
+        self.assertIsNot(attempts[0], attempts[1])
+        self.assertEqual(Recipe.objects.filter(slug="carrot-cake").get().pk, recipe.pk)
+        self.assertEqual(recipe.ingredient_items.count(), 2)
+        self.assertTrue(recipe.uploaded_image.name.startswith("recipes/uploads/cake"))
+
+
+def image_upload(name, size, mode="RGB", format="JPEG"):
+    buffer = BytesIO()
+    Image.new(mode, size, "orange").save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue(), f"image/{format.lower()}")
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.recipe = make_recipe("Carrot Cake", uploaded_image=image_upload("cake.jpg", (1000, 500)))
+        self.storage = self.recipe.uploaded_image.storage
+
+    def test_widths_are_clamped_to_the_upload(self):
+        version = ChangeStamp.current(ChangeStamp.RECIPES).version
+        self.assertFalse(images.is_current(self.recipe))
+        self.assertTrue(images.refresh(self.recipe))
+        self.assertGreater(ChangeStamp.current(ChangeStamp.RECIPES).version, version)
+        variants = Recipe.objects.get(pk=self.recipe.pk).image_variants
+        self.assertEqual(variants["source"], self.recipe.uploaded_image.name)
+        widths = {label: entry["width"] for label, entry in variants["sizes"].items()}
+        self.assertEqual(widths, {"thumb": 320, "card": 640, "hero": 1000})
+        hero = variants["sizes"]["hero"]
+        self.assertTrue(hero["src"].endswith(".hero.jpg"))
+        with self.storage.open(hero["webp"]) as handle, Image.open(handle) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (1000, 500)))
+        self.assertFalse(images.refresh(self.recipe))
+        srcset = images.srcset(variants, "webp", self.storage)
+        self.assertEqual([part.split()[1] for part in srcset.split(", ")], ["320w", "640w", "1000w"])
+
+    def test_small_and_transparent_uploads(self):
+        self.recipe.uploaded_image = image_upload("icon.png", (200, 100), "RGBA", "PNG")
+        self.recipe.save()
+        images.refresh(self.recipe)
+        sizes = self.recipe.image_variants["sizes"]
+        # Every label shares the one size no wider than the upload.
+        self.assertEqual({entry["width"] for entry in sizes.values()}, {200})
+        self.assertEqual(len({entry["src"] for entry in sizes.values()}), 1)
+        self.assertTrue(sizes["card"]["src"].endswith(".png"))
+
+    def test_new_upload_removes_the_old_files(self):
+        images.refresh(self.recipe)
+        old = self.recipe.image_variants["sizes"]["card"]
+        self.recipe.uploaded_image = image_upload("carrot.jpg", (800, 600))
+        self.recipe.save()
+        self.assertTrue(images.refresh(self.recipe))
+        self.assertFalse(self.storage.exists(old["src"]) or self.storage.exists(old["webp"]))
+        self.assertTrue(self.storage.exists(self.recipe.image_variants["sizes"]["card"]["webp"]))
+
+    def test_one_job_per_upload(self):
+        jobs_for = Job.objects.filter(task=tasks.PROCESS_IMAGE)
+        self.recipe.save()
+        self.assertEqual(jobs_for.count(), 1)
+        tasks.process_image(self.recipe.pk)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertTrue(images.is_current(recipe))
+        html = render_to_string("recipes/includes/recipe_image.html", recipe_image(recipe, "detail"))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(self.storage.url(recipe.image_variants["sizes"]["hero"]["src"]), html)
+
+
+class HomeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        make_recipe("Apple Pie")
+
+    def versions(self):
+        return {
+            "trending_version": ChangeStamp.current(ChangeStamp.TRENDING).version,
+            "recipes_version": ChangeStamp.current(ChangeStamp.RECIPES).version,
+        }
+
+    def test_sections_are_cached_per_version(self):
+        versions = self.versions()
+        home_cache.get_sections(**versions)
+        with self.assertNumQueries(0):
+            home_cache.get_sections(**versions)
+
+    def test_change_from_another_process(self):
+        # As the job worker changes recipes: no signal reaches this process.
+        home_cache.get_sections()
+        count = Recipe.objects.count()
+        Recipe.objects.bulk_create([Recipe(title="Zucchini Bread", slug="zucchini-bread", prep_time=1, cook_time=1)])
+        self.assertInHTML(f"<dd>{count}</dd>", home_cache.get_sections()["stats"])
+        ChangeStamp.bump(ChangeStamp.RECIPES)
+        self.assertInHTML(f"<dd>{count + 1}</dd>", home_cache.get_sections()["stats"])
+
+    def test_untouched_sections_carry_over(self):
+        home_cache.get_sections()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_recipe("Zucchini Bread")
+        versions = self.versions()
+        # Sorts after the hero spotlight, which is carried over as it was.
+        with self.assertNumQueries(0):
+            home_cache.get_sections(("hero",), **versions)
+        self.assertInHTML(f"<dd>{Recipe.objects.count()}</dd>", home_cache.get_sections(**versions)["stats"])
+        self.assertIn("Zucchini Bread", home_cache.get_sections(**versions)["latest"])
+
+    def test_rolled_back_save_changes_no_process_state(self):
+        with mock.patch.object(home_cache, "invalidate") as invalidate:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with self.assertRaises(OperationalError), transaction.atomic():
+                    make_recipe("Zucchini Bread")
+                    raise OperationalError("database is locked")
+            self.assertEqual(callbacks, [])
+            invalidate.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                make_recipe("Zucchini Bread")
+            invalidate.assert_called_once()
+
+
+class PopularityTests(TestCase):
+    def setUp(self):
+        self.recipe = make_recipe("Apple Pie")
+        # A running flush thread stands in, so none starts and no exit hook is left behind.
+        patcher = mock.patch.object(popularity, "_thread", object())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(popularity._pending.clear)
+
+    def test_views_are_buffered_until_flushed(self):
+        for _ in range(3):
+            popularity.record_view(self.recipe.pk)
+        self.assertEqual(popularity.pending(), 3)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.view_count, 0)
+        updated_at = self.recipe.updated_at
+        self.assertEqual(popularity.flush(), 1)
+        self.assertEqual(popularity.pending(), 0)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.view_count, 3)
+        self.assertGreater(self.recipe.trending_score, 0)
+        # Views leave the detail page validators alone.
+        self.assertEqual(self.recipe.updated_at, updated_at)
+
+    def test_failed_flush_keeps_the_views(self):
+        popularity.record_view(self.recipe.pk)
+        with mock.patch.object(popularity, "write", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                popularity.flush()
+        self.assertEqual(popularity.pending(), 1)
+
+    def test_reordering_the_head_bumps_the_trending_stamp(self):
+        now = timezone.now()
+        version = ChangeStamp.current(ChangeStamp.TRENDING).version
+        self.assertTrue(popularity.write({self.recipe.pk: 1}, now))
+        self.assertEqual(Recipe.objects.trending().first(), self.recipe)
+        self.assertGreater(ChangeStamp.current(ChangeStamp.TRENDING).version, version)
+        self.assertFalse(popularity.write({self.recipe.pk: 1}, now))
+
+    def test_older_views_decay(self):
+        now = timezone.now()
+        self.assertAlmostEqual(
+            popularity.log_weight(1, now + popularity.HALF_LIFE) - popularity.log_weight(1, now), math.log(2)
+        )
+        score = popularity.add_views(0.0, 1, now)
+        self.assertEqual(score, popularity.log_weight(1, now))
+        self.assertAlmostEqual(popularity.add_views(score, 1, now), popularity.log_weight(2, now))
+        # One view today outweighs three from two half-lives ago.
+        stale = popularity.log_weight(3, now - 2 * popularity.HALF_LIFE)
+        self.assertGreater(popularity.log_weight(1, now), stale)
+
+    def test_saving_a_recipe_keeps_flushed_counts(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        popularity.write({self.recipe.pk: 5}, timezone.now())
+        stale.title = "Dutch Apple Pie"
+        stale.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, "Dutch Apple Pie")
+        self.assertEqual(self.recipe.view_count, 5)
+        self.assertGreater(self.recipe.trending_score, 0)
+        # Through the edit form, too.
+        form = RecipeForm(
+            {**RecipeForm(instance=stale).initial, "title": "Apple Crumble Pie"}, instance=stale
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.view_count, 5)
+
+
+class ShoppingListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_recipe("Apple Pie", "2 cups flour\n1 tbsp sugar\n3 cloves garlic\n1 cup milk\nsalt", servings=4)
+        make_recipe("Garlic Bread", "1 cup flour\n2 cloves garlic\n100 g sugar\n2 tablespoons milk\nsalt", servings=2)
+
+    def items(self, plan):
+        return {(item["name"], item["unit"]): item for item in shopping.shopping_list(plan)["items"]}
+
+    def test_scaled_and_combined(self):
+        items = self.items([("apple-pie", 8), ("garlic-bread", None)])
+        self.assertEqual(items[("flour", "cup")]["quantity"], 5.0)
+        self.assertEqual(items[("garlic", "clove")]["quantity"], 8.0)
+        # Shown in the largest unit used, and never mixed across weight and volume.
+        self.assertEqual(items[("milk", "cup")]["quantity"], round(2 + 2 * 14.7868 / 236.588, 2))
+        self.assertEqual(items[("sugar", "tbsp")]["quantity"], 2.0)
+        self.assertEqual(items[("sugar", "g")]["quantity"], 100.0)
+        self.assertEqual(items[("salt", "")], {"name": "salt", "quantity": None, "unit": "", "recipes": 2})
+        self.assertEqual(items[("flour", "cup")]["recipes"], 2)
+
+    def test_recipe_planned_twice_is_made_twice(self):
+        data = shopping.shopping_list([("garlic-bread", None), ("garlic-bread", 4), ("nope", None)])
+        self.assertEqual([recipe["factor"] for recipe in data["recipes"]], [1.0, 2.0])
+        self.assertEqual(data["missing"], ["nope"])
+        self.assertEqual(self.items([("garlic-bread", None), ("garlic-bread", 4)])[("flour", "cup")]["quantity"], 3.0)
+
+    def test_array_and_loop_aggregation_agree(self):
+        if shopping.np is None:
+            self.skipTest("NumPy is not installed.")
+        rng = random.Random(3)
+        units = [*shopping.CONVERSIONS, "clove", "can", ""]
+        names = ["flour", "milk", "sugar", "garlic", "salt", "rice"]
+        for _ in range(20):
+            factors = [rng.uniform(0.25, 4) for _ in range(rng.randint(1, 8))]
+            rows = [
+                (
+                    rng.randrange(len(factors)),
+                    None if rng.random() < 0.2 else rng.uniform(0.1, 500),
+                    rng.choice(units),
+                    rng.choice(names),
+                )
+                for _ in range(rng.randint(1, 60))
+            ]
+            arrays = shopping.aggregate(rows, factors)
+            with mock.patch.object(shopping, "np", None):
+                loop = shopping.aggregate(rows, factors)
+            self.assertEqual(
+                [(item.name, item.unit, item.recipes) for item in arrays],
+                [(item.name, item.unit, item.recipes) for item in loop],
+            )
+            for array_item, loop_item in zip(arrays, loop):
+                if loop_item.quantity is None:
+                    self.assertIsNone(array_item.quantity)
+                else:
+                    self.assertAlmostEqual(array_item.quantity, loop_item.quantity, places=6)
+
+    def test_invalid_plans(self):
+        url = reverse("recipes:shopping_list")
+        plans = [
+            [],
+            "apple-pie",
+            [{"servings": 2}],
+            [{"slug": "apple-pie", "servings": 0}],
+            [{"slug": "apple-pie", "servings": True}],
+            ["apple-pie"] * (shopping.MAX_RECIPES + 1),
+        ]
+        for plan in plans:
+            with self.subTest(plan=str(plan)[:40]):
+                response = self.client.post(url, json.dumps({"recipes": plan}), content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, json.dumps({"recipes": ["apple-pie"]}), content_type="application/json")
+        self.assertEqual(response.json()["recipes"][0]["servings"], 4)
+
+
+class RecipeApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = make_recipe("Apple Pie", "6 apples\n\n 1 cup sugar ", hero_image="recipes/images/pie.svg")
+
+    def get(self, url, **params):
+        return self.client.get(url, params)
+
+    def test_detail_fields(self):
+        url = reverse("recipes:api_recipe", args=["apple-pie"])
+        data = self.get(url, fields="title,ingredients,directions,total_time,title").json()
+        self.assertEqual(list(data), ["title", "ingredients", "directions", "total_time"])
+        self.assertEqual(data["ingredients"], ["6 apples", "1 cup sugar"])
+        self.assertEqual(data["directions"], ["Mix.", "Cook."])
+        self.assertEqual(data["total_time"], 30)
+        data = self.get(url).json()
+        self.assertEqual(list(data), list(api.FIELDS))
+        self.assertEqual(data["url"], "http://testserver/recipes/apple-pie/")
+        self.assertEqual(data["image"], {"url": "http://testserver/static/recipes/images/pie.svg", "sizes": []})
+        self.assertEqual(list(self.get(reverse("recipes:api_recipes")).json()["results"][0]), list(api.LIST_FIELDS))
+
+    def test_pages_walk_every_recipe_once(self):
+        url, slugs = reverse("recipes:api_recipes"), []
+        params = {"sort": "title", "per_page": 2, "fields": "slug"}
+        while url:
+            data = self.get(url, **params).json()
+            slugs += [item["slug"] for item in data["results"]]
+            url, params = data["next"], {}
+        self.assertEqual(slugs, list(Recipe.objects.order_by("title", "id").values_list("slug", flat=True)))
+
+    def test_bad_requests(self):
+        list_url = reverse("recipes:api_recipes")
+        cases = [
+            (list_url, {"fields": "title,secret"}, 400, "Unknown fields: secret."),
+            (list_url, {"sort": "random"}, 400, "Unknown sort: random."),
+            (list_url, {"cursor": "not-a-cursor"}, 400, "Invalid cursor."),
+            (list_url, {"cursor": encode_cursor(["x", 1]), "sort": "newest"}, 400, "Invalid cursor."),
+            (reverse("recipes:api_recipe", args=["nope"]), {}, 404, "Recipe not found."),
+        ]
+        for url, params, status, message in cases:
+            with self.subTest(params=params):
+                response = self.get(url, **params)
+                self.assertEqual(response.status_code, status)
+                self.assertIn(message, response.json()["error"])
+
+    def test_compressed_and_conditional(self):
+        url = reverse("recipes:api_recipes")
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        # Other fields are another representation.
+        self.assertEqual(self.get(url, fields="slug").status_code, 200)
+        self.assertNotEqual(self.get(url, fields="slug")["ETag"], self.get(url)["ETag"])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(popularity, "record_view")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.recipe = make_recipe("Apple Pie")
+        self.detail_url = reverse("recipes:detail", args=[self.recipe.slug])
+
+    def test_unchanged_pages_are_not_rendered(self):
+        for url, renderer in ((self.detail_url, "render_detail"), (reverse("recipes:home"), "render")):
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                cache_control = response["Cache-Control"]
+                for directive in ("public", "max-age=0", "s-maxage="):
+                    self.assertIn(directive, cache_control)
+                with mock.patch.object(views, renderer) as render:
+                    for headers in (
+                        {"If-None-Match": response["ETag"]},
+                        {"If-Modified-Since": response["Last-Modified"]},
+                    ):
+                        not_modified = self.client.get(url, headers=headers)
+                        self.assertEqual(not_modified.status_code, 304)
+                        self.assertEqual(not_modified.content, b"")
+                        self.assertEqual(not_modified["ETag"], response["ETag"])
+                render.assert_not_called()
+
+    def test_listing_revalidation_reads_only_the_stamps(self):
+        url = reverse("recipes:home")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+
+    def test_changes_move_the_validators(self):
+        detail_etag = self.client.get(self.detail_url)["ETag"]
+        home_etag = self.client.get(reverse("recipes:home"))["ETag"]
+        self.recipe.title = "Dutch Apple Pie"
+        self.recipe.save()
+        response = self.client.get(self.detail_url, headers={"If-None-Match": detail_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Dutch Apple Pie")
+        response = self.client.get(reverse("recipes:home"), headers={"If-None-Match": home_etag})
+        self.assertEqual(response.status_code, 200)
+
+
+class DetailCacheTests(SimpleTestCase):
+    VALIDATORS = ('"v1"', timezone.now())
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_served_while_the_etag_matches(self):
+        render = mock.Mock(return_value="<p>one</p>")
+        self.assertEqual(detail_cache.get_page("pie", self.VALIDATORS, render)["html"], "<p>one</p>")
+        detail_cache.get_page("pie", self.VALIDATORS, render)
+        render.assert_called_once()
+        changed = ('"v2"', timezone.now())
+        render.return_value = "<p>two</p>"
+        entry = detail_cache.get_page("pie", changed, render)
+        self.assertEqual((entry["html"], entry["validators"]), ("<p>two</p>", changed))
+        detail_cache.invalidate("pie")
+        detail_cache.get_page("pie", changed, render)
+        self.assertEqual(render.call_count, 3)
+
+    def test_old_copy_is_fresh_for_a_while(self):
+        render = mock.Mock(return_value="<p>one</p>")
+        with mock.patch.object(detail_cache, "FRESH_TIMEOUT", -1):
+            detail_cache.get_page("pie", self.VALIDATORS, render)
+        detail_cache.get_page("pie", self.VALIDATORS, render)
+        self.assertEqual(render.call_count, 2)
+
+    def test_stale_copy_is_served_while_another_worker_renders(self):
+        detail_cache.get_page("pie", self.VALIDATORS, lambda: "<p>old</p>")
+        self.assertTrue(cache.add(detail_cache._lock_key("pie"), True))
+        render = mock.Mock(return_value="<p>new</p>")
+        entry = detail_cache.get_page("pie", ('"v2"', timezone.now()), render)
+        self.assertEqual((entry["html"], entry["validators"]), ("<p>old</p>", self.VALIDATORS))
+        render.assert_not_called()
+
+    def test_concurrent_misses_render_once(self):
+        calls = []
+        barrier = threading.Barrier(5)
+
+        def render():
+            calls.append(threading.get_ident())
+            time.sleep(0.1)
+            return "<p>one</p>"
+
+        def request(results):
+            barrier.wait()
+            results.append(detail_cache.get_page("pie", self.VALIDATORS, render)["html"])
+
+        results = []
+        threads = [threading.Thread(target=request, args=(results,)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["<p>one</p>"] * 5)
+        self.assertIsNone(cache.get(detail_cache._lock_key("pie")))
+
+    def test_a_wait_past_the_deadline_renders_anyway(self):
+        cache.add(detail_cache._lock_key("pie"), True)
+        with mock.patch.object(detail_cache, "LOCK_WAIT", 0.05):
+            entry = detail_cache.get_page("pie", self.VALIDATORS, lambda: "<p>one</p>")
+        self.assertEqual(entry["html"], "<p>one</p>")
+        # The lock belongs to the other worker.
+        self.assertTrue(cache.get(detail_cache._lock_key("pie")))
+
+    async def test_async_variant(self):
+        render = mock.AsyncMock(return_value="<p>one</p>")
+        entry = await detail_cache.aget_page("pie", self.VALIDATORS, render)
+        self.assertEqual(entry["html"], "<p>one</p>")
+        await detail_cache.aget_page("pie", self.VALIDATORS, render)
+        render.assert_awaited_once()
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        isolate_voice(self)
+        patcher = mock.patch.object(popularity, "record_view")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.recipe = make_recipe("Warm Apple Cake")
+        popularity.write({self.recipe.pk: 10}, timezone.now())
+
+    def test_fills_the_caches(self):
+        # The per-process indexes would outlive this test's rows.
+        results = warmup.run(top=1, skip=["indexes"])
+        names = [name for name, _ in warmup.STEPS if name != "indexes"]
+        self.assertEqual([result.name for result in results], names)
+        self.assertEqual([result.error for result in results], [""] * len(results))
+        self.assertEqual(results[-2].detail, "1 pages")
+        versions = {
+            "trending_version": ChangeStamp.current(ChangeStamp.TRENDING).version,
+            "recipes_version": ChangeStamp.current(ChangeStamp.RECIPES).version,
+        }
+        with self.assertNumQueries(0):
+            home_cache.get_sections(**versions)
+        with mock.patch.object(views, "render_detail") as render_detail:
+            response = self.client.get(reverse("recipes:detail", args=[self.recipe.slug]))
+        self.assertContains(response, "Warm Apple Cake")
+        render_detail.assert_not_called()
+
+    def test_command_reports_each_step(self):
+        stdout = StringIO()
+        call_command("warmup", skip=["indexes", "detail", "search"], stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(
+            [line.split()[0] for line in lines], ["imports", "templates", "database", "knowledge", "home", "total"]
+        )
+        self.assertRegex(lines[1], r"templates\s+[\d.]+ ms  \d+ templates")
+
+    def test_failed_step_fails_the_command(self):
+        def broken(top):
+            raise OperationalError("no such table: recipes_recipe")
+
+        with mock.patch.object(warmup, "STEPS", (("home", broken), ("templates", warmup.compile_templates))):
+            with self.assertLogs("recipes.warmup", "ERROR"):
+                results = warmup.run()
+                self.assertEqual(results[0].error, "no such table: recipes_recipe")
+                self.assertEqual(results[1].error, "")
+                stdout = StringIO()
+                with self.assertRaisesMessage(CommandError, "Warmup steps failed: home."):
+                    call_command("warmup", stdout=stdout)
+        self.assertIn("failed: no such table", stdout.getvalue())
+
+
+class RelatedRecipesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # Detail views would leave counts for the real database at exit.
+        record_view = mock.patch.object(popularity, "record_view")
+        record_view.start()
+        self.addCleanup(record_view.stop)
+        self.pancakes = make_recipe("Buttermilk Pancakes", "2 cups flour\n1 cup buttermilk\n2 eggs")
+        self.waffles = make_recipe("Buttermilk Waffles", "2 cups flour\n1 cup buttermilk\n3 eggs")
+        self.salad = make_recipe("Tomato Salad", "3 tomatoes\n1 red onion", "Fresh and sharp.")
+
+    def test_similar_recipes_are_neighbours(self):
+        index = related.build_index()
+        self.assertEqual(index.neighbours(self.pancakes.pk)[0][1], self.waffles.pk)
+        self.assertNotIn(self.pancakes.pk, [pk for _, pk in index.neighbours(self.salad.pk)])
+
+    def test_recipe_without_usable_words(self):
+        ox = make_recipe("Ox", "1 ox", "So so.")
+        for np in (related.np, None):
+            with self.subTest(numpy=np is not None), mock.patch.object(related, "np", np):
+                index = related.build_index()
+                self.assertEqual(index.similar(ox.pk), {})
+                self.assertEqual(index.neighbours(ox.pk), [])
+
+    def test_listing_pages_follow_related_changes(self):
+        related.rebuild()
+        url = reverse("recipes:detail", args=[self.pancakes.slug])
+        etag = self.client.get(url)["ETag"]
+        self.waffles.title = "Belgian Waffles"
+        self.waffles.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Belgian Waffles")
+        etag = response["ETag"]
+        self.waffles.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, reverse("recipes:detail", args=[self.waffles.slug]))
+
+    def test_rebuild_stores_lists(self):
+        ox = make_recipe("Ox", "1 ox", "So so.")
+        related.rebuild()
+        self.assertEqual(self.waffles.related_items.first().related_id, self.pancakes.pk)
+        self.assertFalse(ox.related_items.exists())
+
+
+def import_row(slug, title, ingredients="1 cup flour", **fields):
+    return {
+        "slug": slug,
+        "title": title,
+        "short_description": "A recipe.",
+        "ingredients": ingredients,
+        "directions": "Mix.",
+        **fields,
+    }
+
+
+class ImportTests(TestCase):
+    def import_rows(self, rows, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8") as stream:
+            stream.writelines(json.dumps(row) + "\n" for row in rows)
+            stream.flush()
+            call_command("import_recipes", stream.name, *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_skip_invalid_rows(self):
+        def parse(text):
+            if "boom" in text:
+                raise ValueError("cannot parse")
+            return parse_lines(text)
+
+        rows = [
+            import_row("flatbread", "Flatbread", "1/0 cup flour\n1 cup water"),
+            import_row("untitled", ""),
+            import_row("broken", "Broken", "boom"),
+            import_row("soup", "Soup", prep_time="-1"),
+            import_row("stew", "Stew"),
+        ]
+        with mock.patch.object(transfer, "parse_lines", parse):
+            self.import_rows(rows, "--skip-invalid")
+        self.assertQuerySetEqual(
+            Recipe.objects.filter(slug__in=[row["slug"] for row in rows]).order_by("slug"),
+            ["flatbread", "stew"],
+            transform=lambda recipe: recipe.slug,
+        )
+        quantities = Recipe.objects.get(slug="flatbread").ingredient_items.order_by("position")
+        self.assertEqual([item.quantity for item in quantities], [None, 1.0])
+
+    def test_invalid_row_stops_the_import(self):
+        with self.assertRaisesMessage(CommandError, "Line 2: missing title"):
+            self.import_rows([import_row("stew", "Stew"), import_row("untitled", "")], "--batch-size", "1")
+        self.assertTrue(Recipe.objects.filter(slug="stew").exists())
+
+
+def knowledge_snapshot(test, keys):
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    path = Path(directory.name) / "knowledge.snapshot"
+    path.write_bytes(knowledge.encode(1, ((key, {"name": key.title()}) for key in keys)))
+    return knowledge.Snapshot(path)
+
+
+def isolate_voice(test):
+    """Give ``test`` its own knowledge snapshot directory and answer cache."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    settings = override_settings(RECIPES_SNAPSHOT_DIR=directory.name)
+    settings.enable()
+    test.addCleanup(settings.disable)
+    for patcher in (
+        mock.patch.object(knowledge, "_current", None),
+        mock.patch.object(voice_cache, "answers", voice_cache.AnswerCache()),
+    ):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class VoiceIntentTests(TestCase):
+    KEYS = ["bell pepper", "cherry tomato", "garlic", "Olive Oil", "tomato"]
+
+    def setUp(self):
+        self.snapshot = knowledge_snapshot(self, self.KEYS)
+        self.parser = voice.IntentParser(self.snapshot)
+
+    def test_ingredient_keys(self):
+        cases = {
+            "What is garlic?": ("garlic", "garlic"),
+            "tell me about tomatoes": ("tomatoes", "tomato"),
+            "what about cherry tomatoes": ("cherry tomatoes", "cherry tomato"),
+            "describe olive oil please": ("olive oil please", "Olive Oil"),
+            "what is a pepper": ("pepper", "bell pepper"),
+            "what is saffron": ("saffron", None),
+        }
+        for query, expected in cases.items():
+            with self.subTest(query):
+                intent = self.parser.parse(query)
+                self.assertEqual(intent.kind, voice.INGREDIENT_INFO_INTENT)
+                self.assertEqual((intent.entity, intent.ingredient_key), expected)
+
+    def test_recipe_intent(self):
+        intent = self.parser.parse("What are the ingredients for the tomato soup?")
+        self.assertEqual((intent.kind, intent.entity), (voice.RECIPE_INGREDIENTS, "tomato soup"))
+        self.assertIsNone(intent.ingredient_key)
+
+    def test_corrections_and_suggestions_read_the_snapshot(self):
+        self.assertEqual(spelling.ingredient_corrections("garlick", snapshot=self.snapshot)[0][1], "garlic")
+        found = suggest.SuggestIndex().suggest("tom", snapshot=self.snapshot)
+        self.assertEqual([item["label"] for item in found], ["tomato", "cherry tomato"])
+        self.assertIsNone(self.snapshot.get("pepper"))
+        self.assertEqual(self.snapshot.get("garlic"), {"name": "Garlic"})
+
+    def test_new_version_is_written_off_the_request_path(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(RECIPES_SNAPSHOT_DIR=directory.name), mock.patch.object(knowledge, "_current", None):
+            first = knowledge.snapshot()
+            IngredientInfo.objects.create(key="fennel", name="Fennel", description="Anise-like.")
+            knowledge.changed()
+            with mock.patch.object(knowledge, "build_in_background") as build:
+                self.assertIs(knowledge.snapshot(), first)
+            build.assert_called_once_with()
+            knowledge.write_snapshot()
+            knowledge.changed()
+            self.assertIn("fennel", knowledge.snapshot())
+            self.assertEqual(voice.get_parser().parse("what is fennel").ingredient_key, "fennel")
+
+
+class VoiceAssistantTests(TestCase):
+    RECIPE_QUESTION = "What are the ingredients for tomato soup?"
+
+    @classmethod
+    def setUpTestData(cls):
+        # The knowledge base comes with garlic from its migration.
+        make_recipe("Tomato Soup", "2 cups tomato\n1 onion")
+
+    def setUp(self):
+        isolate_voice(self)
+
+    def ask(self, data, **headers):
+        # The sync view, whichever one the URLs serve; AsyncViewTests covers the other.
+        request = RequestFactory().post("/", json.dumps(data), content_type="application/json", headers=headers)
+        return views.voice_assistant(request)
+
+    def test_batch_answers_in_query_order(self):
+        with mock.patch.object(voice, "find_recipes", wraps=voice.find_recipes) as find_recipes:
+            response = self.ask({"queries": [self.RECIPE_QUESTION, "What is garlic?", "", self.RECIPE_QUESTION]})
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)["results"]
+        self.assertEqual(results[0]["recipe"], "Tomato Soup")
+        self.assertEqual(results[1]["ingredient"], "Garlic")
+        self.assertFalse(results[2]["success"])
+        self.assertEqual(results[3]["recipe"], "Tomato Soup")
+        # Both recipe questions share one lookup.
+        find_recipes.assert_called_once()
+
+    def test_stream_yields_answers_as_they_are_ready(self):
+        for data, headers in (
+            ({"queries": [self.RECIPE_QUESTION, "What is garlic?"], "stream": True}, {}),
+            ({"queries": [self.RECIPE_QUESTION, "What is garlic?"]}, {"Accept": "application/x-ndjson"}),
+        ):
+            with self.subTest(headers=headers):
+                # A cached recipe answer would be ready at once, too.
+                voice_cache.answers.clear()
+                response = self.ask(data, **headers)
+                self.assertEqual(response["Content-Type"], "application/x-ndjson")
+                lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+                # The knowledge-base answer needs no database, so it comes first.
+                self.assertEqual([line["index"] for line in lines], [1, 0])
+                self.assertEqual(lines[1]["recipe"], "Tomato Soup")
+
+    def test_single_question(self):
+        self.assertEqual(json.loads(self.ask({"query": "What is garlic?"}).content)["ingredient"], "Garlic")
+        response = views.voice_assistant(RequestFactory().get("/", {"q": self.RECIPE_QUESTION}))
+        self.assertEqual(json.loads(response.content)["ingredients"], ["2 cups tomato", "1 onion"])
+
+    def test_malformed_batch(self):
+        for queries in ("What is garlic?", ["What is garlic?"] * (voice.MAX_BATCH_SIZE + 1)):
+            with self.subTest(queries=queries):
+                response = self.ask({"queries": queries})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(json.loads(response.content)["type"], "error")
+
+
+class VoiceCacheTests(TestCase):
+    GARLIC = "What is garlic?"
+    SOUP = "What are the ingredients for tomato soup?"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.soup = make_recipe("Tomato Soup", "2 cups tomato\n1 onion")
+
+    def setUp(self):
+        isolate_voice(self)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def lookups(self, intent, result):
+        key = ("recipes_voice_cache_lookups_total", (("intent", intent), ("result", result)))
+        return metrics._counters.get(key, 0)
+
+    def test_rephrased_questions_hit(self):
+        with mock.patch.object(voice, "ingredient_answer", wraps=voice.ingredient_answer) as ingredient_answer:
+            first = voice.answer(self.GARLIC)
+            self.assertEqual(voice.answer("tell me about garlic"), first)
+        ingredient_answer.assert_called_once()
+        self.assertEqual((self.lookups("ingredient", "miss"), self.lookups("ingredient", "hit")), (1, 1))
+        voice.answer(self.SOUP)
+        with self.assertNumQueries(0):
+            self.assertEqual(voice.answer(self.SOUP)["recipe"], "Tomato Soup")
+        self.assertEqual(self.lookups("recipe", "hit"), 1)
+        self.assertIn('recipes_voice_cache_lookups_total{intent="recipe",result="hit"} 1', metrics.render())
+
+    def test_saving_a_recipe_drops_only_its_answers(self):
+        voice.answer(self.SOUP)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_recipe("Apple Pie")
+        with mock.patch.object(voice, "find_recipes", wraps=voice.find_recipes) as find_recipes:
+            voice.answer(self.SOUP)
+            find_recipes.assert_not_called()
+            self.soup.ingredients = "3 cups tomato"
+            with self.captureOnCommitCallbacks(execute=True):
+                self.soup.save()
+                self.soup.sync_ingredients()
+            self.assertEqual(voice.answer(self.SOUP)["ingredients"], ["3 cups tomato"])
+
+    def test_changes_from_another_process(self):
+        voice.answer(self.SOUP)
+        # As an import would: the stamp moves, but no signal reaches this process.
+        Recipe.objects.filter(pk=self.soup.pk).update(title="Roasted Tomato Soup")
+        ChangeStamp.bump(ChangeStamp.RECIPES)
+        with mock.patch.object(voice_cache, "CHECK_INTERVAL", 0):
+            self.assertIn("Roasted Tomato Soup", voice.answer(self.SOUP)["message"])
+
+    def test_knowledge_changes_drop_only_the_changed_keys(self):
+        voice.answer(self.GARLIC)
+        onion = voice.answer("What is an onion?")
+        IngredientInfo.objects.filter(key="garlic").update(description="A pungent bulb.")
+        ChangeStamp.bump(ChangeStamp.KNOWLEDGE)
+        knowledge.write_snapshot()
+        knowledge.changed()
+        self.assertIn("A pungent bulb.", voice.answer(self.GARLIC)["message"])
+        hits = self.lookups("ingredient", "hit")
+        self.assertEqual(voice.answer("What is an onion?"), onion)
+        self.assertEqual(self.lookups("ingredient", "hit"), hits + 1)
+
+    def test_size_and_age_limits(self):
+        answers = voice_cache.AnswerCache(max_entries=2)
+        for entity in ("garlic", "onion", "basil"):
+            answers.put(voice_cache.INGREDIENT, entity, {"entity": entity}, True)
+        self.assertEqual(len(answers), 2)
+        self.assertIsNone(answers.get(voice_cache.INGREDIENT, "garlic"))
+        expired = voice_cache.AnswerCache(ttl=-1)
+        expired.put(voice_cache.INGREDIENT, "garlic", {}, True)
+        self.assertIsNone(expired.get(voice_cache.INGREDIENT, "garlic"))
+        self.assertEqual(metrics._counters[("recipes_voice_cache_evictions_total", (("reason", "lru"),))], 1)
+        self.assertEqual(metrics._counters[("recipes_voice_cache_evictions_total", (("reason", "expired"),))], 1)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = make_recipe("Saffron Rice", "1 cup rice\n1 pinch saffron")
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(popularity, "record_view")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        isolate_voice(self)
+
+    async def both(self, name, path, *args, **headers):
+        """The responses of the sync and the async ``name`` view to the same GET."""
+        sync_response = await sync_to_async(getattr(views, name))(RequestFactory().get(path, headers=headers), *args)
+        async_response = await getattr(async_views, name)(AsyncRequestFactory().get(path, headers=headers), *args)
+        return sync_response, async_response
+
+    async def test_pages_match_the_sync_views(self):
+        cases = [
+            ("home", "/"),
+            ("home", "/?per_page=2"),
+            ("recipe_detail", "/recipes/saffron-rice/", "saffron-rice"),
+            ("search_recipes", "/search/?q=saffron"),
+            ("search_recipes", "/search/?q=safron"),
+            ("recipe_api", "/api/recipes/saffron-rice/?fields=title,ingredients", "saffron-rice"),
+        ]
+        for name, path, *args in cases:
+            with self.subTest(path):
+                sync_response, async_response = await self.both(name, path, *args)
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(async_response.content, sync_response.content)
+                self.assertEqual(async_response.headers.get("ETag"), sync_response.headers.get("ETag"))
+
+    async def test_not_modified(self):
+        for name, path, *args in (("home", "/"), ("recipe_detail", "/recipes/saffron-rice/", "saffron-rice")):
+            with self.subTest(path):
+                sync_response, _ = await self.both(name, path, *args)
+                _, async_response = await self.both(name, path, *args, if_none_match=sync_response["ETag"])
+                self.assertEqual(async_response.status_code, 304)
+
+    async def test_missing_recipe(self):
+        with self.assertRaises(Http404):
+            await async_views.recipe_detail(AsyncRequestFactory().get("/recipes/nope/"), "nope")
+
+    async def test_voice_answers_match(self):
+        path = "/api/voice-assistant/?q=What are the ingredients for saffron rice?"
+        sync_response, async_response = await self.both("voice_assistant", path)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        self.assertEqual(json.loads(async_response.content)["recipe"], "Saffron Rice")
+        # Not answered from the cache, so the empty question is ready first.
+        voice_cache.answers.clear()
+        request = AsyncRequestFactory().post(
+            "/api/voice-assistant/",
+            json.dumps({"queries": ["What are the ingredients for saffron rice?", ""], "stream": True}),
+            content_type="application/json",
+        )
+        response = await async_views.voice_assistant(request)
+        lines = [json.loads(line) async for line in response.streaming_content]
+        self.assertEqual([line["index"] for line in lines], [1, 0])
+
+
+class SuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_recipe("Zucchini Bread", "2 cups zucchini\n1 cup flour")
+        make_recipe("Zucchini Fritters", "1 zucchini\n1 cup zucchini noodles")
+
+    def setUp(self):
+        self.index = suggest.SuggestIndex.build()
+        self.snapshot = knowledge_snapshot(self, ["zucchini", "zucchini blossom"])
+
+    def suggest(self, query, limit=suggest.DEFAULT_LIMIT):
+        return [(item["type"], item["label"]) for item in self.index.suggest(query, limit, self.snapshot)]
+
+    def test_ranking(self):
+        self.assertEqual(self.suggest("zucc"), [
+            ("recipe", "Zucchini Bread"),
+            ("recipe", "Zucchini Fritters"),
+            # Used by both recipes, so before the longer name used by one.
+            ("ingredient", "zucchini"),
+            ("ingredient", "zucchini noodle"),
+            ("knowledge", "zucchini blossom"),
+        ])
+
+    def test_prefix_of_a_later_word(self):
+        self.assertEqual(self.suggest("fritt"), [("recipe", "Zucchini Fritters")])
+        self.assertEqual(self.suggest("noodl"), [("ingredient", "zucchini noodle")])
+        self.assertEqual(self.suggest("z"), [])
+
+    def test_labels_are_not_repeated_within_the_limit(self):
+        # "zucchini" is an ingredient and a knowledge key; it is offered once.
+        found = self.index.suggest("zucchini", 5, self.snapshot)
+        self.assertEqual([item["label"] for item in found], [
+            "Zucchini Bread", "Zucchini Fritters", "zucchini", "zucchini noodle", "zucchini blossom",
+        ])
+        self.assertEqual(found[2]["url"], reverse("recipes:search") + "?ingredient=zucchini")
+
+
+class JobQueueTests(TestCase):
+    def related_jobs(self, recipe):
+        return Job.objects.filter(idempotency_key=f"{tasks.UPDATE_RELATED}:{recipe.pk}")
+
+    def test_saves_share_a_waiting_job(self):
+        recipe = make_recipe("Apple Pie")
+        recipe.save()
+        recipe.save()
+        self.assertEqual(Job.objects.filter(task=tasks.UPDATE_RELATED, status=Job.Status.QUEUED).count(), 1)
+        self.assertEqual(Job.objects.filter(task=tasks.WARM_HOME, status=Job.Status.QUEUED).count(), 1)
+
+    def test_save_after_claim_queues_again(self):
+        recipe = make_recipe("Apple Pie")
+        claimed = [job for job in jobs.claim(10) if job.task == tasks.UPDATE_RELATED]
+        self.assertEqual(len(claimed), 1)
+        recipe.save()
+        queued = self.related_jobs(recipe).get()
+        self.assertNotEqual(queued.pk, claimed[0].pk)
+        self.assertEqual(queued.status, Job.Status.QUEUED)
+        self.assertEqual(jobs.execute(claimed[0].pk, claimed[0].lease), Job.Status.DONE)
+
+    def test_prune_deletes_old_done_jobs(self):
+        now = timezone.now()
+        old, recent, failed = (jobs.enqueue(tasks.REBUILD_RELATED) for _ in range(3))
+        Job.objects.filter(pk=old.pk).update(status=Job.Status.DONE, finished_at=now - timedelta(days=2))
+        Job.objects.filter(pk=recent.pk).update(status=Job.Status.DONE, finished_at=now)
+        Job.objects.filter(pk=failed.pk).update(status=Job.Status.FAILED, finished_at=now - timedelta(days=2))
+        self.assertEqual(jobs.prune(batch=1), 1)
+        remaining = Job.objects.filter(pk__in=[old.pk, recent.pk, failed.pk])
+        self.assertQuerySetEqual(remaining, [recent, failed], ordered=False)
+
+
+class BenchViewsTests(SimpleTestCase):
+    OPTIONS = {"threshold": 0.25, "noise_ms": 1.0}
+
+    def result(self, p50=10.0, p95=20.0, queries=3, peak_kb=100.0):
+        return {"p50_ms": p50, "p95_ms": p95, "mean_ms": p50, "queries": queries, "peak_kb": peak_kb}
+
+    def regressions(self, **changed):
+        baseline = {"views": {"home": self.result()}}
+        return bench_views.Command()._regressions({"home": self.result(**changed)}, baseline, self.OPTIONS)
+
+    def test_synthetic_recipes_are_deterministic(self):
+        rows = list(bench_views.synthetic_recipes(50, seed=7))
+        self.assertEqual(rows, list(bench_views.synthetic_recipes(50, seed=7)))
+        self.assertNotEqual(rows, list(bench_views.synthetic_recipes(50, seed=8)))
+        self.assertEqual(len({row["slug"] for row in rows}), 50)
+        for row in rows[:5]:
+            self.assertGreaterEqual(len(parse_lines(row["ingredients"])), 4)
+
+    def test_regressions(self):
+        self.assertEqual(self.regressions(p50=12.0, p95=24.0, peak_kb=120.0), [])
+        self.assertEqual(self.regressions(p50=14.0), ["home: p50 10.00 -> 14.00 ms"])
+        # Past the threshold, but within timer noise.
+        self.assertEqual(bench_views.Command()._regressions(
+            {"home": self.result(p50=0.9)}, {"views": {"home": self.result(p50=0.5)}}, self.OPTIONS
+        ), [])
+        # The tail gets twice the slack.
+        self.assertEqual(self.regressions(p95=29.0), [])
+        self.assertEqual(self.regressions(p95=31.0), ["home: p95 20.00 -> 31.00 ms"])
+        self.assertEqual(self.regressions(queries=4), ["home: queries 3 -> 4"])
+        self.assertEqual(self.regressions(peak_kb=130.0), ["home: peak memory 100 -> 130 KB"])
+
+    def test_baseline_must_match_the_settings(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as stream:
+            json.dump({"meta": {"recipes": 100, "seed": 7, "iterations": 50, "cold": False}, "views": {}}, stream)
+            stream.flush()
+            with self.assertRaisesMessage(CommandError, "recipes=100"):
+                call_command("bench_views", recipes=10, baseline=stream.name, stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, "Cannot read baseline"):
+            call_command("bench_views", baseline="/nonexistent/baseline.json", stdout=StringIO())
+
+    def test_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(bench_views.percentile(values, 0.5), 51)
+        self.assertEqual(bench_views.percentile(values, 0.95), 96)
+        self.assertEqual(bench_views.percentile([3.0], 0.95), 3.0)
+
+
+class StaticAssetTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        (Path(root.name) / "css").mkdir()
+        (Path(root.name) / "css" / "site.css").write_text("body{}")
+        (Path(root.name) / "css" / "site.css.gz").write_bytes(b"gzipped")
+        (Path(root.name) / "staticfiles.json").write_text("{}")
+        settings = override_settings(STATIC_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.middleware = StaticAssetMiddleware(lambda request: HttpResponse("app"))
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, **headers))
+
+    def test_compressed_sibling_is_sent_when_accepted(self):
+        response = self.get("/static/css/site.css", HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(b"".join(response.streaming_content), b"gzipped")
+        response = self.get("/static/css/site.css")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(b"".join(response.streaming_content), b"body{}")
+
+    def test_siblings_and_manifest_are_not_served(self):
+        for path in ("/static/css/site.css.gz", "/static/staticfiles.json"):
+            with self.subTest(path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+    def test_security_headers(self):
+        response = self.client.get("/static/css/site.css")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.titled = make_recipe("Saffron Rice", "1 cup rice")
+        cls.mentioned = make_recipe("Yellow Rice", "1 cup rice", "Tinted with saffron.")
+
+    def setUp(self):
+        # Counts are cached per recipes version, which rolls back between tests.
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def titles(self, query, **kwargs):
+        return [recipe.title for recipe in search.search_page(query, **kwargs)]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.titles("saffron"), ["Saffron Rice", "Yellow Rice"])
+        # The last term matches as a prefix.
+        self.assertEqual(self.titles("saffr"), ["Saffron Rice", "Yellow Rice"])
+        self.assertEqual(search.count("saffron rice"), 2)
+
+    def test_triggers_keep_the_index_in_sync(self):
+        self.mentioned.title = "Golden Pilaf"
+        self.mentioned.save()
+        self.assertEqual(self.titles("pilaf"), ["Golden Pilaf"])
+        self.titled.delete()
+        self.assertEqual(self.titles("saffron"), ["Golden Pilaf"])
+
+    def test_icontains_fallback(self):
+        with mock.patch.object(search, "index_exists", return_value=False):
+            self.assertEqual(sorted(self.titles("saffron")), ["Saffron Rice", "Yellow Rice"])
+            self.assertEqual(self.titles("saffron", sort="title"), ["Saffron Rice", "Yellow Rice"])
+
+    def test_dropped_triggers_are_restored(self):
+        self.assertFalse(search.ensure_triggers(connection))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {search.FTS_TABLE}_au")
+        Recipe.objects.filter(pk=self.titled.pk).update(title="Golden Pilaf")
+        self.assertTrue(search.ensure_triggers(connection))
+        self.assertEqual(self.titles("pilaf"), ["Golden Pilaf"])
+        Recipe.objects.filter(pk=self.titled.pk).update(title="Saffron Risotto")
+        self.assertEqual(self.titles("risotto"), ["Saffron Risotto"])
+
+    def test_knowledge_changes_move_the_etag(self):
+        url = reverse("recipes:search") + "?q=zaffron"
+        etag = self.client.get(url).headers["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # "Did you mean" also suggests ingredient keys.
+        ChangeStamp.bump(ChangeStamp.KNOWLEDGE)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("recipes:api_recipes"))
+        self.assertRegex(
+            response["Server-Timing"], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", tpl;dur=[\d.]+$'
+        )
+
+    def test_histograms(self):
+        request = metrics.RequestMetrics(queries=3, db_time=0.002)
+        metrics.observe("recipes:home", 200, 0.03, request, 2000)
+        metrics.observe("recipes:home", 304, 0.2, request, None)
+        lines = metrics.render().splitlines()
+        for line in (
+            'recipes_requests_total{view="recipes:home",status="2xx"} 1',
+            'recipes_requests_total{view="recipes:home",status="3xx"} 1',
+            'recipes_request_duration_seconds_bucket{view="recipes:home",le="0.025"} 0',
+            'recipes_request_duration_seconds_bucket{view="recipes:home",le="0.05"} 1',
+            'recipes_request_duration_seconds_bucket{view="recipes:home",le="+Inf"} 2',
+            'recipes_request_duration_seconds_count{view="recipes:home"} 2',
+            'recipes_request_db_queries_bucket{view="recipes:home",le="2"} 0',
+            'recipes_request_db_queries_bucket{view="recipes:home",le="5"} 2',
+            # Streaming bodies have no size.
+            'recipes_response_size_bytes_count{view="recipes:home"} 1',
+        ):
+            self.assertIn(line, lines)
+
+    def test_metrics_need_the_token(self):
+        url = reverse("recipes:metrics")
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(RECIPES_METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 404)
+            response = self.client.get(url, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "# TYPE recipes_request_duration_seconds histogram")
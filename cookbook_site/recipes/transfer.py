@@ -0,0 +1,169 @@
+"""Streaming recipe import and export in JSON Lines or CSV.
+
+Rows are read, converted and written one chunk at a time, so memory use
+depends on the chunk size rather than on the size of the file. Imports
+upsert on ``slug`` with one ``bulk_create`` per chunk, each chunk in its
+own transaction.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import jobs, tasks
+from .db import retry_on_locked
+from .ingredients import parse_lines
+from .models import DEFAULT_HERO_IMAGE, ChangeStamp, Recipe, RecipeIngredient
+
+FORMATS = ("jsonl", "csv")
+
+FIELDS = (
+    "slug",
+    "title",
+    "subtitle",
+    "short_description",
+    "prep_time",
+    "cook_time",
+    "servings",
+    "ingredients",
+    "directions",
+    "hero_image",
+    "uploaded_image",
+)
+REQUIRED_FIELDS = ("slug", "title")
+INTEGER_FIELDS = {"prep_time": 0, "cook_time": 0, "servings": 1}
+
+# Everything but the conflict target is overwritten on re-import.
+UPDATE_FIELDS = [field for field in FIELDS if field != "slug"]
+
+
+def guess_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(stream, fmt: str):
+    """Yield ``(line_number, row)`` pairs from an open text stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, ValueError(f"invalid JSON: {exc.msg}")
+
+
+def write_rows(stream, fmt: str, rows) -> int:
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+        return count
+    for count, row in enumerate(rows, 1):
+        stream.write(json.dumps(row, ensure_ascii=False))
+        stream.write("\n")
+    return count
+
+
+def export_rows(chunk_size: int = 2000):
+    for row in Recipe.objects.order_by("pk").values(*FIELDS).iterator(chunk_size=chunk_size):
+        row["uploaded_image"] = row["uploaded_image"] or ""
+        yield row
+
+
+def to_recipe(row) -> Recipe:
+    """Build an unsaved ``Recipe`` from an imported row; raises ``ValueError``.
+
+    The parsed ingredient lines are kept in ``parsed_ingredients``, so a line
+    the parser rejects fails its row here rather than the whole chunk later.
+    """
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("expected an object")
+    values = {field: row.get(field) for field in FIELDS}
+    for field in REQUIRED_FIELDS:
+        if not values[field]:
+            raise ValueError(f"missing {field}")
+    for field, default in INTEGER_FIELDS.items():
+        value = values[field]
+        try:
+            values[field] = default if value in (None, "") else int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a whole number, not {value!r}") from None
+        if values[field] < 0:
+            raise ValueError(f"{field} must not be negative")
+    for field in FIELDS:
+        if values[field] is None:
+            values[field] = ""
+        elif field not in INTEGER_FIELDS:
+            values[field] = str(values[field])
+    values["hero_image"] = values["hero_image"] or DEFAULT_HERO_IMAGE
+    values["uploaded_image"] = values["uploaded_image"] or None
+    recipe = Recipe(**values)
+    try:
+        # Enforce the same length and slug rules as the form would.
+        recipe.clean_fields(exclude=["created_at", "image_variants", "uploaded_image"])
+    except ValidationError as exc:
+        raise ValueError(
+            "; ".join(f"{field}: {' '.join(errors)}" for field, errors in exc.message_dict.items())
+        ) from None
+    try:
+        recipe.parsed_ingredients = parse_lines(recipe.ingredients)
+    except (ArithmeticError, ValueError) as exc:
+        raise ValueError(f"ingredients: {exc}") from None
+    return recipe
+
+
+def chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@retry_on_locked
+def import_chunk(recipes: list) -> int:
+    """Upsert a chunk of recipes from ``to_recipe`` and rebuild their ingredient rows."""
+    # A slug repeated within the chunk keeps its last row, as it would
+    # if the rows had been imported one at a time.
+    recipes = list({recipe.slug: recipe for recipe in recipes}.values())
+    for recipe in recipes:
+        # Keys handed out by a rolled-back attempt may be taken by now.
+        recipe.pk = None
+    with transaction.atomic():
+        # The upsert returns each row's primary key, inserted or updated.
+        Recipe.objects.bulk_create(
+            recipes,
+            update_conflicts=True,
+            unique_fields=["slug"],
+            update_fields=UPDATE_FIELDS + ["updated_at"],
+        )
+        RecipeIngredient.objects.filter(recipe__in=recipes).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient.from_parsed(recipe, position, parsed)
+            for recipe in recipes
+            for position, parsed in enumerate(recipe.parsed_ingredients)
+        )
+        for recipe in recipes:
+            if recipe.uploaded_image:
+                tasks.recipe_changed(recipe)
+        # Per chunk, so pages revalidate while a long import is running.
+        ChangeStamp.bump(ChangeStamp.RECIPES)
+    return len(recipes)
+
+
+def finish_import() -> None:
+    """Queue new related lists; ``bulk_create`` sends no save signals.
+
+    Cached home sections and counts need nothing: they are keyed on the
+    recipes stamp, which every chunk bumps.
+    """
+    jobs.enqueue(tasks.REBUILD_RELATED)
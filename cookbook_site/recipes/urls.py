@@ -1,14 +1,22 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# Under ASGI the read-only views run natively async; WSGI keeps the sync ones.
+read_views = async_views if settings.RECIPES_ASYNC_VIEWS else views
 
 app_name = "recipes"
 
 urlpatterns = [
-    path("", views.home, name="home"),
-    path("search/", views.search_recipes, name="search"),
-    path("api/voice-assistant/", views.voice_assistant, name="voice_assistant"),
+    path("", read_views.home, name="home"),
+    path("search/", read_views.search_recipes, name="search"),
+    path("api/voice-assistant/", read_views.voice_assistant, name="voice_assistant"),
+    path("api/suggest/", read_views.suggest_view, name="suggest"),
+    path("api/recipes/", read_views.recipe_list_api, name="api_recipes"),
+    path("api/recipes/<slug:slug>/", read_views.recipe_api, name="api_recipe"),
+    path("api/shopping-list/", read_views.shopping_list, name="shopping_list"),
     path("recipes/new/", views.create_recipe, name="create"),
-    path("recipes/<slug:slug>/", views.recipe_detail, name="detail"),
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("recipes/<slug:slug>/", read_views.recipe_detail, name="detail"),
 ]
-
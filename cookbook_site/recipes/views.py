@@ -1,44 +1,136 @@
-from django.http import JsonResponse
+import copy
+import json
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.shortcuts import get_object_or_404, redirect, render
-from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
-from .models import Recipe
+from . import api, conditional, detail_cache, home_cache, metrics, popularity, search, shopping, spelling, suggest, voice
+from .db import retry_on_locked
+from .models import ChangeStamp, Recipe, RelatedRecipe
 from .forms import RecipeForm
+from .pagination import InvalidCursor, Page, cached_count, page_size, paginate
+
+SUGGEST_MAX_AGE = 60
+
+SEARCH_SORTS = {
+    "relevance": "Best match",
+    "title": "A–Z",
+    "newest": "Newest",
+}
 
 
 def home(request):
-    recipes = Recipe.objects.all()
-    featured = recipes[:3]
-    latest_recipes = Recipe.objects.order_by("-created_at")[:4]
-    return render(
+    stamp = ChangeStamp.current(ChangeStamp.RECIPES)
+    trending = ChangeStamp.current(ChangeStamp.TRENDING)
+    page_validators = home_validators(stamp, trending)
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    cursor = request.GET.get("cursor")
+    size = page_size(request.GET.get("per_page"), default=home_cache.LATEST_PAGE_SIZE)
+    if cursor or size != home_cache.LATEST_PAGE_SIZE:
+        # Only the default first page of the latest grid is cached.
+        sections = home_cache.get_sections(("hero", "stats", "trending"), trending.version, stamp.version)
+        try:
+            sections["latest"] = home_cache.render_latest(home_cache.latest_page(cursor, size))
+        except InvalidCursor:
+            return redirect("recipes:home")
+    else:
+        sections = home_cache.get_sections(trending_version=trending.version, recipes_version=stamp.version)
+    response = render(
         request,
         "recipes/home.html",
         {
-            "recipes": recipes,
-            "featured": featured,
-            "latest_recipes": latest_recipes,
+            "sections": sections,
         },
     )
+    return conditional.cacheable(response, page_validators)
+
+
+def listing_stamp(stamp: ChangeStamp) -> tuple:
+    return stamp.changed_at, stamp.version
+
+
+def home_validators(recipes: ChangeStamp, trending: ChangeStamp) -> tuple:
+    """The home page also changes when view counts reorder the trending rail."""
+    last_modified = recipes.changed_at
+    if not trending._state.adding:
+        last_modified = max(last_modified, trending.changed_at)
+    return conditional.validators(last_modified, recipes.version, trending.version)
+
+
+def search_validators(recipes: ChangeStamp, knowledge: ChangeStamp) -> tuple:
+    """Search pages also change with the ingredient keys "Did you mean" suggests."""
+    last_modified = recipes.changed_at
+    if not knowledge._state.adding:
+        last_modified = max(last_modified, knowledge.changed_at)
+    return conditional.validators(last_modified, recipes.version, knowledge.version)
 
 
 def recipe_detail(request, slug: str):
     recipe = get_object_or_404(Recipe, slug=slug)
-    return render(
-        request,
+    popularity.record_view(recipe.pk)
+    page_validators = detail_validators(recipe)
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    page = detail_cache.get_page(slug, page_validators, lambda: render_detail(recipe, request))
+    return conditional.cacheable(HttpResponse(page["html"]), page["validators"])
+
+
+def detail_validators(recipe) -> tuple:
+    return conditional.validators(recipe.updated_at, recipe.pk)
+
+
+def render_detail(recipe, request=None) -> str:
+    """The detail page markup, which is the same for every visitor."""
+    # Only fetched when the page is actually rendered.
+    prefetch_related_objects([recipe], "ingredient_items")
+    related = list(RelatedRecipe.objects.for_recipe(recipe))
+    return render_to_string(
         "recipes/recipe_detail.html",
         {
             "recipe": recipe,
+            "related": related,
         },
+        request,
     )
 
 
+def save_recipe(form):
+    """Save a valid ``RecipeForm``, retrying the write while the database is locked."""
+    recipe = form.instance
+    image = recipe.uploaded_image
+    if image and not image._committed:
+        # Stored once up front, so a retried write does not upload it again.
+        image.save(image.name, image.file, save=False)
+    return _write_recipe(form, recipe)
+
+
+@retry_on_locked
+def _write_recipe(form, recipe):
+    # Each attempt saves a fresh copy: a rolled-back attempt leaves its pk and
+    # _state on the instance it saved.
+    form.instance = copy.copy(recipe)
+    with transaction.atomic():
+        return form.save()
+
+
 def create_recipe(request):
     if request.method == "POST":
         form = RecipeForm(request.POST, request.FILES)
         if form.is_valid():
-            recipe = form.save()
+            recipe = save_recipe(form)
             return redirect("recipes:detail", slug=recipe.slug)
     else:
         form = RecipeForm()
@@ -52,263 +144,231 @@ def create_recipe(request):
     )
 
 
-def search_recipes(request):
+def search_context(request) -> dict:
+    """Run a search request and return the results page template context."""
     query = request.GET.get("q", "").strip()
-    recipes = Recipe.objects.none()
-    
-    if query:
-        recipes = Recipe.objects.filter(
-            Q(title__icontains=query) |
-            Q(subtitle__icontains=query) |
-            Q(short_description__icontains=query) |
-            Q(ingredients__icontains=query) |
-            Q(directions__icontains=query)
-        ).distinct()
-    
-    return render(
-        request,
-        "recipes/search_results.html",
-        {
-            "query": query,
-            "recipes": recipes,
-            "results_count": recipes.count(),
-        },
-    )
+    ingredients = [name.strip() for name in request.GET.getlist("ingredient") if name.strip()]
+    sort = request.GET.get("sort", "relevance")
+    if sort not in SEARCH_SORTS or (ingredients and sort == "relevance"):
+        # Ingredient filters are joins, which have no relevance score.
+        sort = "title" if ingredients else "relevance"
+    cursor = request.GET.get("cursor")
+    size = page_size(request.GET.get("per_page"))
+    page = Page([])
+    results_count = 0
 
+    if ingredients:
+        recipes = search.match_queryset(query) if query else Recipe.objects.all()
+        recipes = recipes.with_ingredients(*ingredients)
+        try:
+            page = paginate(recipes, sort, cursor, size)
+        except InvalidCursor:
+            page = paginate(recipes, sort, size=size)
+        results_count = cached_count(f"ingredients:{query}:{sorted(ingredients)}", recipes.count)
+    elif query:
+        try:
+            page = search.search_page(query, sort=sort, cursor=cursor, size=size)
+        except InvalidCursor:
+            page = search.search_page(query, sort=sort, size=size)
+        results_count = search.count(query)
 
-# Ingredient knowledge base
-INGREDIENT_INFO = {
-    "tomato": {
-        "name": "Tomato",
-        "description": "Tomatoes are rich in vitamin C, potassium, and lycopene. They add acidity and umami to dishes.",
-        "storage": "Store at room temperature until ripe, then refrigerate.",
-        "uses": "Great in salads, sauces, soups, and as a base for many dishes.",
-    },
-    "garlic": {
-        "name": "Garlic",
-        "description": "Garlic is a powerful flavor enhancer with antimicrobial properties. It contains allicin, which provides health benefits.",
-        "storage": "Keep in a cool, dry place with good air circulation.",
-        "uses": "Essential in many cuisines. Use minced, crushed, or sliced for different flavor intensities.",
-    },
-    "onion": {
-        "name": "Onion",
-        "description": "Onions add sweetness and depth when cooked. They're rich in antioxidants and vitamin C.",
-        "storage": "Store in a cool, dry, well-ventilated area away from potatoes.",
-        "uses": "Base for many dishes. Can be caramelized, sautéed, or used raw in salads.",
-    },
-    "bell pepper": {
-        "name": "Bell Pepper",
-        "description": "Bell peppers are rich in vitamin C and come in various colors. They add crunch and sweetness.",
-        "storage": "Refrigerate in the crisper drawer for up to a week.",
-        "uses": "Great raw in salads, roasted, stuffed, or sautéed in stir-fries.",
-    },
-    "zucchini": {
-        "name": "Zucchini",
-        "description": "Zucchini is a summer squash low in calories and high in water content. It's rich in vitamin A and C.",
-        "storage": "Refrigerate in a plastic bag for up to a week.",
-        "uses": "Can be grilled, sautéed, baked, or spiralized into noodles.",
-    },
-    "salmon": {
-        "name": "Salmon",
-        "description": "Salmon is rich in omega-3 fatty acids, protein, and vitamin D. It's a heart-healthy fish.",
-        "storage": "Keep refrigerated and cook within 1-2 days of purchase.",
-        "uses": "Can be baked, grilled, pan-seared, or poached. Pairs well with citrus and herbs.",
-    },
-    "chicken": {
-        "name": "Chicken",
-        "description": "Chicken is a lean protein source rich in B vitamins and selenium. It's versatile and widely used.",
-        "storage": "Refrigerate and use within 1-2 days, or freeze for longer storage.",
-        "uses": "Can be roasted, grilled, sautéed, or braised. Works with many flavor profiles.",
-    },
-    "pasta": {
-        "name": "Pasta",
-        "description": "Pasta is a carbohydrate-rich food made from wheat. Whole grain versions offer more fiber.",
-        "storage": "Store in a cool, dry place in an airtight container.",
-        "uses": "Base for many dishes. Cook al dente for best texture.",
-    },
-    "basil": {
-        "name": "Basil",
-        "description": "Basil is an aromatic herb with a sweet, slightly peppery flavor. It's rich in antioxidants.",
-        "storage": "Keep fresh basil in water like flowers, or store in the refrigerator wrapped in damp paper towels.",
-        "uses": "Essential in Italian cuisine. Use fresh in salads, pesto, or as a garnish.",
-    },
-    "mango": {
-        "name": "Mango",
-        "description": "Mangoes are tropical fruits rich in vitamin C, vitamin A, and fiber. They're sweet and juicy.",
-        "storage": "Ripen at room temperature, then refrigerate to slow further ripening.",
-        "uses": "Great in smoothies, salads, desserts, or eaten fresh.",
-    },
-    "coconut": {
-        "name": "Coconut",
-        "description": "Coconut provides healthy fats, fiber, and minerals. Coconut milk adds creaminess to dishes.",
-        "storage": "Store coconut milk in the refrigerator after opening. Fresh coconut should be refrigerated.",
-        "uses": "Used in curries, desserts, smoothies, and as a dairy alternative.",
-    },
-    "yogurt": {
-        "name": "Yogurt",
-        "description": "Yogurt is rich in probiotics, protein, and calcium. Greek yogurt has more protein.",
-        "storage": "Keep refrigerated and check expiration date.",
-        "uses": "Great in smoothies, as a marinade, in dips, or eaten plain with fruit.",
-    },
-    "lemon": {
-        "name": "Lemon",
-        "description": "Lemons are rich in vitamin C and add bright acidity to dishes. The zest contains aromatic oils.",
-        "storage": "Store at room temperature or in the refrigerator for longer storage.",
-        "uses": "Adds flavor to dressings, marinades, desserts, and beverages.",
-    },
-    "butter": {
-        "name": "Butter",
-        "description": "Butter adds richness and flavor. It's made from cream and contains saturated fats.",
-        "storage": "Refrigerate butter, but let it soften at room temperature for baking.",
-        "uses": "Used for sautéing, baking, spreading, and finishing dishes.",
-    },
-    "olive oil": {
-        "name": "Olive Oil",
-        "description": "Olive oil is rich in monounsaturated fats and antioxidants. Extra virgin is the highest quality.",
-        "storage": "Store in a cool, dark place away from heat and light.",
-        "uses": "Used for cooking, dressings, marinades, and finishing dishes.",
-    },
-}
+    did_you_mean = []
+    if query and not results_count:
+        did_you_mean = [
+            {"text": text, "criteria": urlencode({"q": text, "ingredient": ingredients}, doseq=True)}
+            for text in spelling.did_you_mean(query)
+            if text.lower() != query.lower()
+        ]
 
+    return {
+        "query": query,
+        "did_you_mean": did_you_mean,
+        "ingredients": ingredients,
+        "criteria": urlencode({"q": query, "ingredient": ingredients}, doseq=True),
+        "sort": sort,
+        "sorts": SEARCH_SORTS,
+        "recipes": page,
+        "results_count": results_count,
+    }
 
-@csrf_exempt
-@require_http_methods(["GET", "POST"])
-def voice_assistant(request):
-    """Handle voice assistant queries about ingredients and recipe ingredients."""
+
+def search_recipes(request):
+    page_validators = search_validators(
+        ChangeStamp.current(ChangeStamp.RECIPES), ChangeStamp.current(ChangeStamp.KNOWLEDGE)
+    )
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    response = render(request, "recipes/search_results.html", search_context(request))
+    return conditional.cacheable(response, page_validators)
+
+
+def parse_voice_request(request):
+    """Read a voice request as ``(query, queries, stream)``.
+
+    ``queries`` is None for a single question; a malformed batch raises
+    ``ValueError``.
+    """
     if request.method == "POST":
-        import json
         try:
             data = json.loads(request.body)
-            query = data.get("query", "").strip().lower()
-        except:
-            query = ""
-    else:
-        query = request.GET.get("q", "").strip().lower()
-    
-    if not query:
-        return JsonResponse({
-            "success": False,
-            "message": "I didn't catch that. Could you please repeat your question?",
-            "type": "error",
-        })
-    
-    query_lower = query.lower()
-    
-    # Check if this is a recipe ingredients query
-    recipe_patterns = [
-        "what are the ingredients for",
-        "what ingredients for",
-        "ingredients for",
-        "what do i need for",
-        "what do you need for",
-        "ingredients needed for",
-        "ingredients required for",
-        "what are the ingredients to make",
-        "ingredients to make",
-        "what ingredients to make",
-    ]
-    
-    is_recipe_query = any(pattern in query_lower for pattern in recipe_patterns)
-    
-    if is_recipe_query:
-        # Extract recipe name
-        recipe_name = None
-        for pattern in recipe_patterns:
-            if pattern in query_lower:
-                recipe_name = query_lower.replace(pattern, "").strip()
-                break
-        
-        # Remove common words
-        common_words = ["the", "a", "an", "making", "to make", "recipe"]
-        words = recipe_name.split()
-        recipe_name = " ".join([w for w in words if w not in common_words]).strip()
-        
-        # Search for recipe
-        recipes = Recipe.objects.filter(
-            Q(title__icontains=recipe_name) |
-            Q(slug__icontains=recipe_name.replace(" ", "-"))
-        )[:1]
-        
-        if recipes.exists():
-            recipe = recipes.first()
-            ingredients_list = [ing.strip() for ing in recipe.ingredients.splitlines() if ing.strip()]
-            
-            if ingredients_list:
-                ingredients_text = ", ".join(ingredients_list)
-                response_text = (
-                    f"To make {recipe.title}, you'll need: {ingredients_text}."
-                )
-                return JsonResponse({
-                    "success": True,
-                    "type": "recipe_ingredients",
-                    "recipe": recipe.title,
-                    "recipe_slug": recipe.slug,
-                    "message": response_text,
-                    "ingredients": ingredients_list,
-                })
-            else:
-                return JsonResponse({
-                    "success": False,
-                    "type": "error",
-                    "message": f"I found {recipe.title}, but it doesn't have ingredients listed yet.",
-                })
-        else:
-            return JsonResponse({
-                "success": False,
-                "type": "error",
-                "message": f"I couldn't find a recipe called '{recipe_name}'. Try asking about recipes like 'Hearty Veggie Pasta', 'Citrus Herb Salmon', or 'Golden Mango Smoothie Bowl'.",
-            })
-    
-    # Otherwise, treat as ingredient information query
-    ingredient_name = None
-    question_patterns = [
-        "what is", "tell me about", "information about", "what about",
-        "explain", "describe", "know about", "learn about"
-    ]
-    
-    for pattern in question_patterns:
-        if pattern in query_lower:
-            ingredient_name = query_lower.replace(pattern, "").strip()
-            break
-    
-    # If no pattern found, try to find ingredient directly
-    if not ingredient_name:
-        ingredient_name = query_lower
-    
-    # Remove common words
-    common_words = ["the", "a", "an", "ingredient", "food"]
-    words = ingredient_name.split()
-    ingredient_name = " ".join([w for w in words if w not in common_words]).strip()
-    
-    # Search for ingredient in knowledge base
-    found_ingredient = None
-    for key, info in INGREDIENT_INFO.items():
-        if key in ingredient_name or ingredient_name in key:
-            found_ingredient = info
-            break
-        # Also check if any word matches
-        if any(word in key for word in ingredient_name.split() if len(word) > 3):
-            found_ingredient = info
-            break
-    
-    if found_ingredient:
-        response_text = (
-            f"{found_ingredient['name']}. {found_ingredient['description']} "
-            f"Storage tip: {found_ingredient['storage']} "
-            f"Common uses: {found_ingredient['uses']}"
-        )
-        return JsonResponse({
-            "success": True,
-            "type": "ingredient_info",
-            "ingredient": found_ingredient['name'],
-            "message": response_text,
-            "description": found_ingredient['description'],
-            "storage": found_ingredient['storage'],
-            "uses": found_ingredient['uses'],
-        })
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        query = data.get("query", "")
     else:
-        return JsonResponse({
-            "success": False,
-            "type": "error",
-            "message": f"I don't have information about '{ingredient_name}' yet. You can ask about ingredients like tomato, garlic, onion, or chicken. Or ask 'What are the ingredients for [recipe name]?' to get recipe ingredients.",
-        })
+        data = {}
+        query = request.GET.get("q", "")
+
+    queries = data.get("queries")
+    if queries is not None and (not isinstance(queries, list) or len(queries) > voice.MAX_BATCH_SIZE):
+        raise ValueError(f"Send a list of at most {voice.MAX_BATCH_SIZE} questions in 'queries'.")
+    stream = data.get("stream") is True or "application/x-ndjson" in request.headers.get("Accept", "")
+    return (query if isinstance(query, str) else ""), queries, stream
+
+
+def ndjson_line(index: int, answer: dict) -> str:
+    return json.dumps({"index": index, **answer}) + "\n"
+
+
+def batch_response(results: list) -> JsonResponse:
+    return JsonResponse({
+        "success": True,
+        "type": "batch",
+        "results": results,
+    })
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def voice_assistant(request):
+    """Handle voice assistant queries about ingredients and recipe ingredients.
+
+    POST ``{"query": "..."}`` (or GET ``?q=``) answers one question. POST
+    ``{"queries": [...]}`` answers a batch with a single recipe lookup, as
+    one JSON document or, with ``"stream": true`` or an
+    ``Accept: application/x-ndjson`` header, as one JSON line per answer
+    in the order the answers become ready.
+    """
+    try:
+        query, queries, stream = parse_voice_request(request)
+    except ValueError as exc:
+        return JsonResponse(voice.error(str(exc)), status=400)
+
+    if queries is None:
+        return JsonResponse(voice.answer(query))
+
+    if stream:
+        lines = (ndjson_line(index, answer) for index, answer in voice.answer_many(queries))
+        return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+
+    results = [None] * len(queries)
+    for index, answer in voice.answer_many(queries):
+        results[index] = answer
+    return batch_response(results)
+
+
+def parse_shopping_request(request) -> list:
+    """The meal plan in a shopping-list request; raises ``shopping.InvalidPlan``."""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise shopping.InvalidPlan("Send a JSON object with a 'recipes' list.")
+    return shopping.parse_plan(data.get("recipes"))
+
+
+@csrf_exempt
+@gzip_page
+@require_http_methods(["POST"])
+def shopping_list(request):
+    """Scale and combine recipes into one shopping list.
+
+    POST ``{"recipes": [{"slug": "...", "servings": 6}, ...]}``; a recipe
+    without ``servings`` is made for as many as it serves.
+    """
+    try:
+        plan = parse_shopping_request(request)
+    except shopping.InvalidPlan as exc:
+        return api.error_response(str(exc), 400)
+    return JsonResponse(shopping.shopping_list(plan))
+
+
+def suggest_limit(value) -> int:
+    try:
+        return max(1, min(int(value), suggest.MAX_LIMIT))
+    except (TypeError, ValueError):
+        return suggest.DEFAULT_LIMIT
+
+
+def suggest_response(query: str, suggestions: list) -> JsonResponse:
+    response = JsonResponse({"query": query, "suggestions": suggestions})
+    # Keystrokes repeat a lot; a minute-old answer is good enough.
+    patch_cache_control(response, public=True, max_age=SUGGEST_MAX_AGE)
+    return response
+
+
+@require_http_methods(["GET"])
+def suggest_view(request):
+    query = request.GET.get("q", "")
+    return suggest_response(query, suggest.suggest(query, suggest_limit(request.GET.get("limit"))))
+
+
+def recipe_list_validators(request, stamp: ChangeStamp) -> tuple:
+    return conditional.validators(*listing_stamp(stamp), api.API_VERSION, request.GET.urlencode())
+
+
+def recipe_validators(row: dict, fields) -> tuple:
+    return conditional.validators(row["updated_at"], row["id"], api.API_VERSION, ",".join(fields))
+
+
+@gzip_page
+@require_http_methods(["GET"])
+def recipe_list_api(request):
+    """A page of recipes as JSON; see ``recipes.api`` for the parameters."""
+    try:
+        fields, ordering, cursor, size = api.list_params(request)
+    except api.BadRequest as exc:
+        return api.error_response(str(exc), 400)
+    page_validators = recipe_list_validators(request, ChangeStamp.current(ChangeStamp.RECIPES))
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    try:
+        page = paginate(api.list_queryset(fields, ordering), ordering, cursor, size)
+    except InvalidCursor:
+        return api.error_response("Invalid cursor.", 400)
+    return conditional.cacheable(JsonResponse(api.page_payload(page, fields, request)), page_validators)
+
+
+@gzip_page
+@require_http_methods(["GET"])
+def recipe_api(request, slug: str):
+    """One recipe as JSON, with every field unless ``?fields=`` picks some."""
+    try:
+        fields = api.parse_fields(request.GET.get("fields"))
+    except api.BadRequest as exc:
+        return api.error_response(str(exc), 400)
+    row = api.detail_queryset(slug, fields).first()
+    if row is None:
+        return api.error_response("Recipe not found.", 404)
+    page_validators = recipe_validators(row, fields)
+    response = conditional.not_modified(request, page_validators)
+    if response is not None:
+        return response
+    return conditional.cacheable(JsonResponse(api.serialize([row], fields, request)[0]), page_validators)
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """This process's request metrics in the Prometheus text format.
+
+    Served only to requests carrying ``RECIPES_METRICS_TOKEN`` as a bearer token.
+    """
+    token = settings.RECIPES_METRICS_TOKEN
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if not token or scheme.lower() != "bearer" or not constant_time_compare(credentials.strip(), token):
+        raise Http404
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,425 @@
+"""Intent parsing for the voice assistant.
+
+The recipe-intent and question phrases are compiled once into an
+Aho-Corasick automaton, so a query is classified in a single scan.
+Ingredient keys are looked up in the knowledge snapshot's ``phrases`` and
+``words`` tables, written with the snapshot by ``knowledge_tables``, with a
+few binary searches per word of the query. Parsing cost depends on the
+query length, not on how many ingredients the knowledge base knows about,
+and no worker holds a copy of the keys.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass
+
+from django.db.models import Q
+
+from . import knowledge, spelling, voice_cache
+from .models import Recipe
+
+RECIPE_INGREDIENTS = "recipe_ingredients"
+INGREDIENT_INFO_INTENT = "ingredient_info"
+
+RECIPE_PHRASES = (
+    "what are the ingredients for",
+    "what ingredients for",
+    "ingredients for",
+    "what do i need for",
+    "what do you need for",
+    "ingredients needed for",
+    "ingredients required for",
+    "what are the ingredients to make",
+    "ingredients to make",
+    "what ingredients to make",
+)
+
+QUESTION_PHRASES = (
+    "what is",
+    "tell me about",
+    "information about",
+    "what about",
+    "explain",
+    "describe",
+    "know about",
+    "learn about",
+)
+
+MAX_BATCH_SIZE = 50
+
+# Trigram similarity above which a misheard name is answered as the
+# closest match; weaker matches are only offered as suggestions.
+AUTO_CORRECT = 0.4
+
+RECIPE_STOP_WORDS = frozenset({"the", "a", "an", "making", "recipe"})
+INGREDIENT_STOP_WORDS = frozenset({"the", "a", "an", "ingredient", "food"})
+
+_RECIPE = "recipe"
+_QUESTION = "question"
+_INGREDIENT = "ingredient"
+
+_NON_WORD_RE = re.compile(r"[^\w\s'-]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+
+class PhraseMatcher:
+    """An Aho-Corasick automaton over tagged phrases.
+
+    ``scan`` reports every ``(start, end, tag, phrase)`` occurrence in one
+    left-to-right pass over the text.
+    """
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for tag, phrase in phrases:
+            self._add(tag, phrase)
+        self._link()
+
+    def _add(self, tag, phrase):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((tag, phrase))
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def scan(self, text: str):
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for tag, phrase in output[state]:
+                end = index + 1
+                yield end - len(phrase), end, tag, phrase
+
+
+@dataclass(frozen=True)
+class Intent:
+    kind: str
+    entity: str
+    ingredient_key: str | None = None
+
+
+def _starts_word(text: str, start: int) -> bool:
+    return start == 0 or text[start - 1] == " "
+
+
+def _ends_word(text: str, end: int) -> bool:
+    return end == len(text) or text[end] == " "
+
+
+def _strip_words(text: str, stop_words) -> str:
+    return " ".join(word for word in text.split() if word not in stop_words)
+
+
+def knowledge_tables(keys: list) -> dict:
+    """The snapshot tables the parser reads, for the sorted knowledge ``keys``.
+
+    ``phrases`` maps each normalized key to its key's index, ``words`` the
+    whole words of multi-word keys, so "pepper" finds "bell pepper".
+    """
+    phrases = {}
+    for index, key in enumerate(keys):
+        phrase = normalize(key)
+        if phrase:
+            phrases[phrase] = index
+    words = {}
+    for phrase, index in phrases.items():
+        for word in phrase.split():
+            if len(word) > 3:
+                words.setdefault(word, index)
+    return {
+        "phrases": [(phrase, (index, 0)) for phrase, index in phrases.items()],
+        "words": [(word, (index, 0)) for word, index in words.items()],
+    }
+
+
+class IntentParser:
+    def __init__(self, snapshot, recipe_phrases=RECIPE_PHRASES, question_phrases=QUESTION_PHRASES):
+        self.snapshot = snapshot
+        self.matcher = PhraseMatcher(
+            [(_RECIPE, phrase) for phrase in recipe_phrases] + [(_QUESTION, phrase) for phrase in question_phrases]
+        )
+
+    def parse(self, query: str) -> Intent:
+        text = normalize(query)
+        recipe = question = None
+        for start, end, tag, phrase in self.matcher.scan(text):
+            if not _starts_word(text, start) or not _ends_word(text, end):
+                continue
+            span = (end - start, start, end)
+            if tag == _RECIPE and (recipe is None or span > recipe):
+                recipe = span
+            elif tag == _QUESTION and question is None:
+                question = span
+
+        if recipe is not None:
+            entity = _strip_words(text[recipe[2]:], RECIPE_STOP_WORDS)
+            return Intent(RECIPE_INGREDIENTS, entity)
+
+        entity_start = question[2] if question is not None else 0
+        entity = _strip_words(text[entity_start:], INGREDIENT_STOP_WORDS)
+        return Intent(INGREDIENT_INFO_INTENT, entity, self._ingredient_key(text, entity_start, entity))
+
+    def _ingredient_key(self, text, entity_start, entity):
+        phrases = self.snapshot.phrases
+        best = length = None
+        for start in range(entity_start, len(text)):
+            if not _starts_word(text, start):
+                continue
+            # Keys may end mid-word so "tomatoes" still finds "tomato".
+            found = phrases.prefixes_of(text[start:].encode("utf-8"))
+            if found and (best is None or len(phrases[found[0]]) > length):
+                best, length = found[0], len(phrases[found[0]])
+        if best is not None:
+            return self.snapshot.key(phrases.values(best)[0])
+        words = self.snapshot.words
+        for word in entity.split():
+            index = words.find(word.encode("utf-8"))
+            if index != -1:
+                return self.snapshot.key(words.values(index)[0])
+        return None
+
+
+_parser = None
+
+
+def get_parser(snapshot=None) -> IntentParser:
+    """The parser reading ``snapshot``'s tables."""
+    global _parser
+    if snapshot is None:
+        snapshot = knowledge.snapshot()
+    parser = _parser
+    if parser is None or parser.snapshot is not snapshot:
+        parser = _parser = IntentParser(snapshot)
+    return parser
+
+
+def _recipe_lookup(names):
+    names = {name for name in names if name}
+    condition = Q()
+    for name in names:
+        condition |= Q(title__icontains=name) | Q(slug__icontains=name.replace(" ", "-"))
+    # values() rather than values_list(): only the former iterates lazily
+    # under aiterator(), which lets the scan stop at the last needed row.
+    rows = Recipe.objects.filter(condition).order_by("title", "id").values("pk", "title", "slug")
+    return names, rows
+
+
+def _match_row(names, matches, row) -> bool:
+    """Assign a recipe row to the names it answers; True once all are done."""
+    for name in names - matches.keys():
+        if voice_cache.contains(name, row["title"], row["slug"]):
+            matches[name] = row["pk"]
+    return len(matches) == len(names)
+
+
+def _corrections(found: list, matches: dict, alternatives: dict, name: str) -> None:
+    if found and found[0][0] >= AUTO_CORRECT:
+        matches[name] = found[0][2][0]
+    elif found:
+        alternatives[name] = [title for _, title, _ in found]
+
+
+def find_recipes(names) -> tuple:
+    """Resolve several recipe names with one lookup query.
+
+    Each name maps to the first recipe in title order whose title or slug
+    contains it (the same rule as a single ``icontains`` lookup). A name
+    nothing contains maps to the closest title by trigram similarity when
+    that is close enough, and otherwise gets the near misses in
+    ``alternatives``. Returns ``(recipes, alternatives)``.
+    """
+    names, rows = _recipe_lookup(names)
+    if not names:
+        return {}, {}
+    matches = {}
+    for row in rows.iterator():
+        if _match_row(names, matches, row):
+            break
+    alternatives = {}
+    for name in names - matches.keys():
+        _corrections(spelling.recipe_corrections(name), matches, alternatives, name)
+    recipes = Recipe.objects.prefetch_related("ingredient_items").in_bulk(matches.values())
+    return {name: recipes.get(pk) for name, pk in matches.items()}, alternatives
+
+
+async def afind_recipes(names) -> tuple:
+    """Async variant of ``find_recipes``."""
+    names, rows = _recipe_lookup(names)
+    if not names:
+        return {}, {}
+    matches = {}
+    async for row in rows.aiterator(chunk_size=100):
+        if _match_row(names, matches, row):
+            break
+    alternatives = {}
+    for name in names - matches.keys():
+        _corrections(await spelling.arecipe_corrections(name), matches, alternatives, name)
+    recipes = await Recipe.objects.prefetch_related("ingredient_items").ain_bulk(matches.values())
+    return {name: recipes.get(pk) for name, pk in matches.items()}, alternatives
+
+
+def _or_list(items) -> str:
+    quoted = [f"'{item}'" for item in items]
+    return quoted[0] if len(quoted) == 1 else f"{', '.join(quoted[:-1])} or {quoted[-1]}"
+
+
+def error(message: str) -> dict:
+    return {
+        "success": False,
+        "type": "error",
+        "message": message,
+    }
+
+
+def recipe_answer(recipe_name: str, recipe, alternatives=()) -> dict:
+    if recipe is None:
+        if alternatives:
+            return error(f"I couldn't find a recipe called '{recipe_name}'. Did you mean {_or_list(alternatives)}?")
+        return error(
+            f"I couldn't find a recipe called '{recipe_name}'. Try asking about recipes like 'Hearty Veggie Pasta', 'Citrus Herb Salmon', or 'Golden Mango Smoothie Bowl'."
+        )
+    ingredients_list = recipe.ingredient_lines()
+    if not ingredients_list:
+        return error(f"I found {recipe.title}, but it doesn't have ingredients listed yet.")
+    ingredients_text = ", ".join(ingredients_list)
+    prefix = ""
+    if not voice_cache.contains(recipe_name, recipe.title, recipe.slug):
+        # A spelling correction rather than a match on what was said.
+        prefix = f"I think you meant {recipe.title}. "
+    return {
+        "success": True,
+        "type": "recipe_ingredients",
+        "recipe": recipe.title,
+        "recipe_slug": recipe.slug,
+        "message": f"{prefix}To make {recipe.title}, you'll need: {ingredients_text}.",
+        "ingredients": ingredients_list,
+    }
+
+
+def ingredient_answer(intent: Intent, snapshot=None) -> dict:
+    if snapshot is None:
+        snapshot = knowledge.snapshot()
+    key = intent.ingredient_key
+    corrected = False
+    if key not in snapshot and intent.entity:
+        found = spelling.ingredient_corrections(intent.entity, snapshot=snapshot)
+        if found and found[0][0] >= AUTO_CORRECT:
+            key, corrected = found[0][1], True
+        elif found:
+            return error(
+                f"I don't have information about '{intent.entity}' yet. Did you mean {_or_list(label for _, label, _ in found)}?"
+            )
+    found_ingredient = snapshot.get(key)
+    if not found_ingredient:
+        return error(
+            f"I don't have information about '{intent.entity}' yet. You can ask about ingredients like tomato, garlic, onion, or chicken. Or ask 'What are the ingredients for [recipe name]?' to get recipe ingredients."
+        )
+    return {
+        "success": True,
+        "type": "ingredient_info",
+        "ingredient": found_ingredient["name"],
+        "message": (
+            f"{'I think you meant ' if corrected else ''}{found_ingredient['name']}. {found_ingredient['description']} "
+            f"Storage tip: {found_ingredient['storage']} "
+            f"Common uses: {found_ingredient['uses']}"
+        ),
+        "description": found_ingredient["description"],
+        "storage": found_ingredient["storage"],
+        "uses": found_ingredient["uses"],
+    }
+
+
+def _immediate_answers(queries, pending: list, snapshot):
+    """Yield answers needing no database; queue recipe lookups in ``pending``."""
+    parser = get_parser(snapshot)
+    answers = voice_cache.answers
+    for index, query in enumerate(queries):
+        query = query.strip() if isinstance(query, str) else ""
+        if not query:
+            yield index, error("I didn't catch that. Could you please repeat your question?")
+            continue
+        intent = parser.parse(query)
+        kind = voice_cache.RECIPE if intent.kind == RECIPE_INGREDIENTS else voice_cache.INGREDIENT
+        cached = answers.get(kind, intent.entity)
+        if cached is not None:
+            yield index, cached
+        elif kind == voice_cache.RECIPE:
+            pending.append((index, intent.entity))
+        else:
+            result = ingredient_answer(intent, snapshot)
+            key = intent.ingredient_key
+            direct = result["success"] and key == intent.entity
+            answers.put(kind, intent.entity, result, direct, key, snapshot.get(key) if direct else None)
+            yield index, result
+
+
+def _recipe_answers(pending: list, recipes: dict, alternatives: dict):
+    for index, name in pending:
+        recipe = recipes.get(name)
+        result = recipe_answer(name, recipe, alternatives.get(name, ()))
+        direct = recipe is not None and voice_cache.contains(name, recipe.title, recipe.slug)
+        voice_cache.answers.put(voice_cache.RECIPE, name, result, direct, recipe and recipe.pk)
+        yield index, result
+
+
+def answer_many(queries):
+    """Yield ``(index, answer)`` for each query as soon as it is ready.
+
+    Answers that need no database, cached ones included, come first in
+    query order; recipe lookups for the whole batch are then resolved
+    together.
+    """
+    snapshot = knowledge.snapshot()
+    voice_cache.answers.refresh(snapshot)
+    pending = []
+    yield from _immediate_answers(queries, pending, snapshot)
+    if pending:
+        yield from _recipe_answers(pending, *find_recipes(name for _, name in pending))
+
+
+async def aanswer_many(queries):
+    """Async variant of ``answer_many``."""
+    snapshot = await knowledge.asnapshot()
+    await voice_cache.answers.arefresh(snapshot)
+    pending = []
+    for item in _immediate_answers(queries, pending, snapshot):
+        yield item
+    if pending:
+        for item in _recipe_answers(pending, *await afind_recipes(name for _, name in pending)):
+            yield item
+
+
+def answer(query: str) -> dict:
+    return next(answer_many([query]))[1]
+
+
+async def aanswer(query: str) -> dict:
+    async for _, result in aanswer_many([query]):
+        return result
@@ -0,0 +1,162 @@
+"""Per-process LRU cache of voice assistant answers.
+
+Answers are keyed on the parsed intent and its normalized entity, so "What
+is garlic?" and "tell me about garlic" share one entry. Entries expire
+after ``TTL`` and the least recently used go once there are more than
+``MAX_ENTRIES``; lookups and evictions are counted in ``metrics``.
+
+Invalidation follows what each answer was built from:
+
+* A recipe answer found by title is dropped when that recipe changes, or
+  when a saved recipe's title or slug now contains the entity too. Answers
+  that needed a spelling correction or found nothing are dropped on any
+  recipe change. When the recipes ``ChangeStamp`` moves for a change this
+  process was not told about (another worker, an import), every recipe
+  answer goes.
+* An ingredient answer for an exact knowledge-base key survives a new
+  knowledge snapshot as long as that key's record is unchanged; all other
+  ingredient answers go with the old snapshot.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from . import metrics
+from .models import ChangeStamp
+
+MAX_ENTRIES = 2048
+TTL = 10 * 60
+CHECK_INTERVAL = 1.0
+
+RECIPE = "recipe"
+INGREDIENT = "ingredient"
+
+
+def contains(name: str, title: str, slug: str) -> bool:
+    """Whether a recipe title or slug answers ``name`` without a correction."""
+    return name in title.lower() or name.replace(" ", "-") in slug.lower()
+
+
+@dataclass
+class Entry:
+    answer: dict
+    expires_at: float
+    # Answered by a title match or an exact knowledge-base key.
+    direct: bool
+    # The recipe pk or knowledge-base key the answer came from.
+    ref: object = None
+    # For ingredient answers, the knowledge-base record used.
+    record: dict | None = None
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (kind, entity) -> Entry, least recently used first.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.recipes_version = None
+        self.knowledge_version = None
+        self._checked_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, kind: str, entity: str) -> dict | None:
+        key = (kind, entity)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                metrics.increment("recipes_voice_cache_evictions_total", reason="expired")
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.increment("recipes_voice_cache_lookups_total", intent=kind, result="miss" if entry is None else "hit")
+        return None if entry is None else entry.answer
+
+    def put(self, kind: str, entity: str, answer: dict, direct: bool, ref=None, record=None) -> None:
+        entry = Entry(answer, time.monotonic() + self.ttl, direct, ref, record)
+        evicted = 0
+        with self._lock:
+            self._entries[(kind, entity)] = entry
+            self._entries.move_to_end((kind, entity))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.increment("recipes_voice_cache_evictions_total", evicted, reason="lru")
+
+    def _drop(self, test) -> None:
+        """Drop the entries ``test(kind, entity, entry)`` picks; call under the lock."""
+        stale = [key for key, entry in self._entries.items() if test(*key, entry)]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            metrics.increment("recipes_voice_cache_evictions_total", len(stale), reason="invalidated")
+
+    def recipe_changed(self, recipe, version: int | None = None) -> None:
+        def affected(kind, entity, entry):
+            if kind != RECIPE:
+                return False
+            return not entry.direct or entry.ref == recipe.pk or contains(entity, recipe.title, recipe.slug)
+
+        with self._lock:
+            self._drop(affected)
+            # Only when ours is the one change since the version we reflect.
+            if version is not None and self.recipes_version is not None and version == self.recipes_version + 1:
+                self.recipes_version = version
+
+    def _recipes_stamp(self, version: int) -> None:
+        with self._lock:
+            if self.recipes_version is not None and version != self.recipes_version:
+                self._drop(lambda kind, entity, entry: kind == RECIPE)
+            self.recipes_version = version
+
+    def _knowledge_snapshot(self, snapshot) -> None:
+        if snapshot.version == self.knowledge_version:
+            return
+
+        def affected(kind, entity, entry):
+            return kind == INGREDIENT and (not entry.direct or snapshot.get(entry.ref) != entry.record)
+
+        with self._lock:
+            if self.knowledge_version is not None:
+                self._drop(affected)
+            self.knowledge_version = snapshot.version
+
+    def _due(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        return True
+
+    def refresh(self, snapshot) -> None:
+        """Catch up with ``snapshot`` and, at most every ``CHECK_INTERVAL``, the recipes stamp."""
+        self._knowledge_snapshot(snapshot)
+        if self._due():
+            self._recipes_stamp(ChangeStamp.current(ChangeStamp.RECIPES).version)
+
+    async def arefresh(self, snapshot) -> None:
+        self._knowledge_snapshot(snapshot)
+        if self._due():
+            self._recipes_stamp((await ChangeStamp.acurrent(ChangeStamp.RECIPES)).version)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+answers = AnswerCache()
+
+
+def recipe_saved(recipe, version: int) -> None:
+    answers.recipe_changed(recipe, version)
+
+
+def recipe_deleted(recipe, version: int) -> None:
+    answers.recipe_changed(recipe, version)
@@ -0,0 +1,160 @@
+"""Warm a fresh worker before, or while, it takes its first requests.
+
+``run`` goes through ``STEPS`` in order and times each one: importing the
+URLconf and the views, compiling every template under ``recipes/templates``,
+reading the listing indexes into SQLite's and the OS page cache, mapping
+the knowledge snapshot and compiling the voice phrases, building the
+per-process recipe indexes, and rendering the home page sections and the
+detail pages and search counts of the ``top`` trending recipes into their
+caches. All of it would otherwise be built by the first requests that need
+it, so a step that fails only leaves that latency in place.
+
+Almost all of that is per process, so only ``RECIPES_WARMUP_ON_START``
+warms a server worker: ``RecipesConfig.ready`` then runs it in a background
+thread, so the worker can answer while it warms. ``manage.py warmup`` runs
+it in its own process and prints the timings, which shows what a cold
+worker pays; besides the OS page cache and the knowledge snapshot file,
+the only thing it leaves behind for the servers is what it stores in a
+cache backend they share, and the default ``LocMemCache`` is not one.
+"""
+
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import reverse
+
+from . import conditional, detail_cache, home_cache, indexing, knowledge
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+TOP_RECIPES = 20
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+
+@dataclass
+class StepResult:
+    name: str
+    seconds: float
+    detail: str = ""
+    error: str = ""
+
+
+# The modules the views pull in are imported inside the steps that use
+# them, so the imports step is what loads them and its time shows it.
+
+
+def import_views(top: int) -> str:
+    before = len(sys.modules)
+    import_module(settings.ROOT_URLCONF)
+    # Fills the resolver's reverse lookup tables.
+    reverse("recipes:home")
+    return f"{len(sys.modules) - before} new modules"
+
+
+def compile_templates(top: int) -> str:
+    names = sorted(path.relative_to(TEMPLATE_DIR).as_posix() for path in TEMPLATE_DIR.rglob("*.html"))
+    for name in names:
+        # The cached loader keeps each compiled template for the process.
+        get_template(name)
+    conditional.fingerprint()
+    return f"{len(names)} templates"
+
+
+def read_indexes(top: int) -> str:
+    count = 0
+    for ordering in (("title", "id"), ("-created_at", "-id")):
+        for _ in Recipe.objects.order_by(*ordering).values_list("id", flat=True).iterator(chunk_size=5000):
+            count += 1
+    return f"{count} recipes"
+
+
+def knowledge_base(top: int) -> str:
+    from . import voice
+
+    snapshot = knowledge.snapshot()
+    voice.get_parser(snapshot)
+    return f"{len(snapshot)} entries, version {snapshot.version}"
+
+
+def recipe_indexes(top: int) -> str:
+    return ", ".join(indexing.warm())
+
+
+def home_sections(top: int) -> str:
+    return f"{len(home_cache.get_sections())} sections"
+
+
+def detail_pages(top: int) -> str:
+    from .views import detail_validators, render_detail
+
+    recipes = list(Recipe.objects.trending()[:top])
+    for recipe in recipes:
+        detail_cache.get_page(recipe.slug, detail_validators(recipe), lambda: render_detail(recipe))
+    return f"{len(recipes)} pages"
+
+
+def search_counts(top: int) -> str:
+    from . import search
+
+    titles = list(Recipe.objects.trending().values_list("title", flat=True)[:top])
+    for title in titles:
+        search.search_page(title)
+        search.count(title)
+    return f"{len(titles)} queries"
+
+
+STEPS = (
+    ("imports", import_views),
+    ("templates", compile_templates),
+    ("database", read_indexes),
+    ("knowledge", knowledge_base),
+    ("indexes", recipe_indexes),
+    ("home", home_sections),
+    ("detail", detail_pages),
+    ("search", search_counts),
+)
+
+
+def run(top: int = TOP_RECIPES, skip=()) -> list:
+    """Run the warmup steps not in ``skip``; returns a ``StepResult`` per step."""
+    results = []
+    for name, step in STEPS:
+        if name in skip:
+            continue
+        started = time.perf_counter()
+        try:
+            detail, error = step(top), ""
+        except Exception as exc:
+            logger.exception("Warmup step %s failed.", name)
+            detail, error = "", str(exc) or type(exc).__name__
+        results.append(StepResult(name, time.perf_counter() - started, detail, error))
+    return results
+
+
+def _run_in_background() -> None:
+    started = time.perf_counter()
+    try:
+        results = run()
+    finally:
+        connections.close_all()
+    logger.info(
+        "Warmed up in %.0f ms: %s",
+        (time.perf_counter() - started) * 1000,
+        ", ".join(f"{result.name} {result.seconds * 1000:.0f} ms" for result in results),
+    )
+
+
+def start() -> threading.Thread:
+    """Run the warmup in a daemon thread."""
+    thread = threading.Thread(target=_run_in_background, name="recipes-warmup", daemon=True)
+    thread.start()
+    return thread